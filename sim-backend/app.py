@@ -1,18 +1,45 @@
-from flask import Flask, request, jsonify, send_from_directory, make_response
+from flask import Flask, Response, request, jsonify, send_file, make_response
 from flask_cors import CORS
+from werkzeug.security import safe_join
+from werkzeug.serving import is_running_from_reloader
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from socketio import ASGIApp
 import openai
 import os
 import bcrypt
 import jwt
+import copy
 import json
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import hashlib
+import math
+import mimetypes
+import re
 import threading
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from collections import deque, OrderedDict
+from bisect import bisect_right
 import time
+import numpy as np
+
+from voxel import rasterize_part, merge_parts, voxels_to_dicts, as_voxel_array, content_hash, BrickStore, MAX_PART_VOXELS
+from voxel.stream import VoxelStream, brick_chunks
+from voxel.mesh import encode_glb
+from voxel.region import Box, region_from_dict
+from voxel.extrude import extrude, stretch, clip_to_grid
+from voxel.delta import encode_delta, decode_delta, apply_delta, delta_hash, VoxelDeltaError, DELTA_EXT, DELTA_MEDIA_TYPE
+from voxel.codec import encode_scene, read_scene, VoxelCodecError, BINARY_EXT, BINARY_MEDIA_TYPE
+from voxel.lod import build_pyramid, DOWNSAMPLE_MODES
+from voxel.plan import supervisor_plan, plan_at_lod, scale_bbox, LOD_MODES
+from voxel.raster import part_colors
+from voxel.cache import ArtifactCache
+from voxel.workers import ProcessRasterizer
+from job_registry import JobRegistry, FINISHED_STATUSES
+from manifest_index import ManifestIndex
+from edit_sessions import EditSession, EditSessionManager, EditSessionClosed
+from artifact_writer import ArtifactWriter, atomic_write, ENCODING_EXT, ENCODERS
+import serializer
 
 # Import AI Agent system
 try:
@@ -31,6 +58,8 @@ except ImportError as e:
 # Configuration
 # -----------------------------
 app = Flask(__name__)
+# jsonify/get_json go through the fast serializer (orjson when installed)
+app.json = serializer.FastJSONProvider(app)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 # CORS for dev: explicitly allow frontend at :5050 (Next dev)
 frontend_origins = [
@@ -131,7 +160,8 @@ active_users = {}  # room_id -> {user_id: user_info}
 # Supervisor/Agent Orchestration (MVP)
 # -----------------------------
 
-ARTIFACT_ROOT = os.path.join(os.path.dirname(__file__), 'artifacts')
+# artifacts, the job log (JOB_DB) and the LOD cache index all live under ARTIFACT_ROOT
+ARTIFACT_ROOT = os.getenv('ARTIFACT_ROOT', os.path.join(os.path.dirname(__file__), 'artifacts'))
 MANIFEST_DIR = os.path.join(ARTIFACT_ROOT, 'manifests')
 VOXEL_DIR = os.path.join(ARTIFACT_ROOT, 'voxels')
 GLB_DIR = os.path.join(ARTIFACT_ROOT, 'glb')
@@ -145,92 +175,357 @@ for d in [ARTIFACT_ROOT, MANIFEST_DIR, VOXEL_DIR, GLB_DIR, VOX_DIR]:
 
 jobs: Dict[str, Dict[str, Any]] = {}
 jobs_lock = threading.Lock()
-executor = ThreadPoolExecutor(max_workers=max(4, os.cpu_count() or 4))
+# single-flight: normalized prompt key -> job id currently queued/running for it (guarded by jobs_lock)
+inflight_jobs: Dict[str, str] = {}
+# job id -> progressive voxel stream of its current run (guarded by jobs_lock)
+job_streams: Dict[str, VoxelStream] = {}
+# seconds without stream entries before a keepalive line
+STREAM_HEARTBEAT_S = float(os.getenv('STREAM_HEARTBEAT_S', '15'))
+
+
+# -----------------------------
+# Scheduling
+# -----------------------------
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+PART_WORKERS = int(os.getenv('PART_WORKERS', str(max(4, os.cpu_count() or 4))))
+JOB_QUEUE_LIMIT = int(os.getenv('JOB_QUEUE_LIMIT', '16'))
+
+
+class JobScheduler:
+    """
+    Runs jobs and part generation on separate pools, so a job blocked on its
+    part futures never holds the threads those parts need. Admission is bounded
+    to `workers` running plus `queue_limit` waiting jobs.
+    """
+
+    def __init__(self, workers: int, part_workers: int, queue_limit: int):
+        self.workers = workers
+        self.part_workers = part_workers
+        self.queue_limit = queue_limit
+        self.jobs = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.parts = ThreadPoolExecutor(max_workers=part_workers, thread_name_prefix='part')
+        self.waiting: deque = deque()
+        self.running: set = set()
+        self.admitted = 0
+        self.rejected = 0
+        self.finished = 0
+        self.max_depth = 0
+        # called (outside the lock) whenever a job leaves the pool, e.g. to admit deferred work
+        self.on_finish: Optional[Callable[[], Any]] = None
+        # part tasks submitted but not started yet
+        self.part_backlog = 0
+        self.lock = threading.Lock()
+
+    def _position(self, job_id: str) -> int:
+        # 0 = starts as soon as it reaches a free worker
+        free = self.workers - len(self.running)
+        idx = self.waiting.index(job_id)
+        return 0 if idx < free else idx - free + 1
+
+    def admit(self, job_id: str) -> Optional[int]:
+        """Reserve a slot for job_id; returns its queue position, or None when at capacity"""
+        with self.lock:
+            if len(self.running) + len(self.waiting) >= self.workers + self.queue_limit:
+                self.rejected += 1
+                return None
+            self.waiting.append(job_id)
+            self.admitted += 1
+            self.max_depth = max(self.max_depth, len(self.waiting))
+            return self._position(job_id)
+
+    def has_room(self) -> bool:
+        with self.lock:
+            return len(self.running) + len(self.waiting) < self.workers + self.queue_limit
+
+    def position(self, job_id: str) -> Optional[int]:
+        with self.lock:
+            return self._position(job_id) if job_id in self.waiting else None
+
+    def submit(self, job_id: str, fn, *args):
+        """Run an admitted job on the job pool"""
+        try:
+            self.jobs.submit(self._run, job_id, fn, *args)
+        except RuntimeError:
+            with self.lock:
+                self.waiting.remove(job_id)
+            raise
+
+    def _run(self, job_id: str, fn, *args):
+        with self.lock:
+            self.waiting.remove(job_id)
+            self.running.add(job_id)
+        try:
+            fn(*args)
+        finally:
+            with self.lock:
+                self.running.discard(job_id)
+                self.finished += 1
+            if self.on_finish is not None:
+                self.on_finish()
+
+    def submit_part(self, fn, *args):
+        with self.lock:
+            self.part_backlog += 1
+        try:
+            return self.parts.submit(self._run_part, fn, *args)
+        except RuntimeError:
+            with self.lock:
+                self.part_backlog -= 1
+            raise
+
+    def _run_part(self, fn, *args):
+        with self.lock:
+            self.part_backlog -= 1
+        return fn(*args)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'part_workers': self.part_workers,
+                'queue_limit': self.queue_limit,
+                'running': len(self.running),
+                'queued': len(self.waiting),
+                'max_queued': self.max_depth,
+                'part_backlog': self.part_backlog,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'finished': self.finished,
+            }
+
+
+scheduler = JobScheduler(JOB_WORKERS, PART_WORKERS, JOB_QUEUE_LIMIT)
+# Finished jobs leave `jobs` after JOB_TTL_S or beyond JOB_MAX_FINISHED; their state stays in the log
+job_registry = JobRegistry(
+    os.getenv('JOB_DB', os.path.join(ARTIFACT_ROOT, 'jobs.sqlite3')),
+    ttl_s=float(os.getenv('JOB_TTL_S', '3600')),
+    max_finished=int(os.getenv('JOB_MAX_FINISHED', '256')),
+    max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '2')),
+)
+JOB_LOG_RETENTION_S = float(os.getenv('JOB_LOG_RETENTION_S', str(7 * 24 * 3600)))
+# PART_BACKEND=process rasterizes procedural parts in worker processes (results via shared memory);
+# serve through server.py so the workers do not re-import this module
+PART_BACKEND = os.getenv('PART_BACKEND', 'thread')
+part_rasterizer = ProcessRasterizer(PART_WORKERS) if PART_BACKEND == 'process' else None
 
 
 def hash_dict(d: Dict[str, Any]) -> str:
     m = hashlib.sha256()
-    m.update(json.dumps(d, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    m.update(serializer.canonical(d))
     return m.hexdigest()
 
 
+# ARTIFACT_FSYNC=1 fsyncs every artifact/manifest before its atomic rename
+ARTIFACT_FSYNC = os.getenv('ARTIFACT_FSYNC', '0') == '1'
+# ARTIFACT_WRITER=inline keeps all writes on the calling thread
+artifact_writer = ArtifactWriter(fsync=ARTIFACT_FSYNC, background=os.getenv('ARTIFACT_WRITER', 'background') != 'inline')
+
+
+def json_bytes(data: Dict[str, Any]) -> bytes:
+    return serializer.dumps(data)
+
+
 def write_json(path: str, data: Dict[str, Any]):
-    with open(path, 'w') as f:
-        json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+    atomic_write(path, json_bytes(data), fsync=ARTIFACT_FSYNC)
 
 
 def read_json(path: str) -> Dict[str, Any]:
-    with open(path, 'r') as f:
-        return json.load(f)
-
-
-def supervisor_plan(prompt: Dict[str, Any]) -> Dict[str, Any]:
-    subject = prompt.get('subject', 'object')
-    mode = prompt.get('mode', 'voxel')
-    target_res = int(prompt.get('resolution', 64))
-    # staged LODs up to 2048; filter by requested target
-    cap_target = min(2048, max(32, target_res))
-    staged = [32, 64, 96, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048]
-    lods = [r for r in staged if r <= cap_target]
-    if not lods:
-        lods = [64]
-    res = lods[-1]
-    style = prompt.get('style', '')
-    pose = prompt.get('pose', '')
-    seed = int(prompt.get('seed', 12345))
-    quality = prompt.get('quality', 'high')
-    # simple template-driven decomposition for dragon
-    parts = [
-        {'id': 'head'}, {'id': 'neck'}, {'id': 'body'},
-        {'id': 'left_wing'}, {'id': 'right_wing'},
-        {'id': 'tail'}, {'id': 'left_leg'}, {'id': 'right_leg'},
-        {'id': 'horns'}, {'id': 'spikes'}
-    ] if 'dragon' in subject.lower() else [ {'id': 'body'} ]
-
-    # allocate bounding boxes within res^3 (coarse layout)
-    # coordinates are inclusive min,max in grid space [0,res)
-    def bbox(x0,y0,z0,x1,y1,z1):
-        return {'min':[x0,y0,z0],'max':[x1,y1,z1]}
-
-    if 'dragon' in subject.lower():
-        r = res
-        layout = {
-            # Broader Y coverage to avoid flat mid-slice look
-            'body': bbox(int(0.25*r), int(0.2*r), int(0.25*r), int(0.75*r), int(0.8*r), int(0.75*r)),
-            'head': bbox(int(0.72*r), int(0.6*r), int(0.42*r), int(0.92*r), int(0.92*r), int(0.58*r)),
-            'neck': bbox(int(0.62*r), int(0.5*r), int(0.42*r), int(0.72*r), int(0.75*r), int(0.58*r)),
-            'left_wing': bbox(int(0.05*r), int(0.45*r), int(0.15*r), int(0.35*r), int(0.75*r), int(0.85*r)),
-            'right_wing': bbox(int(0.65*r), int(0.45*r), int(0.15*r), int(0.95*r), int(0.75*r), int(0.85*r)),
-            'tail': bbox(int(0.02*r), int(0.25*r), int(0.45*r), int(0.28*r), int(0.55*r), int(0.55*r)),
-            'left_leg': bbox(int(0.38*r), int(0.02*r), int(0.45*r), int(0.46*r), int(0.28*r), int(0.55*r)),
-            'right_leg': bbox(int(0.54*r), int(0.02*r), int(0.45*r), int(0.62*r), int(0.28*r), int(0.55*r)),
-            'horns': bbox(int(0.78*r), int(0.85*r), int(0.46*r), int(0.92*r), int(0.98*r), int(0.54*r)),
-            'spikes': bbox(int(0.28*r), int(0.72*r), int(0.48*r), int(0.72*r), int(0.86*r), int(0.52*r)),
-        }
-    else:
-        layout = {'body': {'min':[0,0,0],'max':[res-1,res-1,res-1]}}
-
-    return {
-        'mode': mode,
-        'target_resolution': target_res,
-        'resolution': res,
-        'lods': lods,
-        'subject': subject,
-        'style': style,
-        'pose': pose,
-        'seed': seed,
-        'quality': quality,
-        'parts': [{ 'id': p['id'], 'bbox': layout[p['id']] } for p in parts if p['id'] in layout]
+    with open(path, 'rb') as f:
+        return serializer.loads(f.read())
+
+
+# Compression for binary voxel artifacts: zlib (default), zstd (if installed) or none
+VOXEL_COMPRESSION = os.getenv('VOXEL_COMPRESSION', 'zlib')
+# VOXEL_GLB=0 skips the greedy-meshed GLB export of voxel LODs
+VOXEL_GLB = os.getenv('VOXEL_GLB', '1') == '1'
+
+
+def write_voxel_artifact_async(scene_hash: str, voxel_scene: Dict[str, Any]):
+    """
+    Queue the JSON and .bvox files of a voxel artifact on the artifact writer.
+    Returns (artifact entry, futures); each future resolves to that file's write ms.
+    The scene must not be mutated until the futures are done.
+    """
+    # JSON stays the default/fallback format; the .bvox sibling is served on request
+    writes = [
+        artifact_writer.submit(os.path.join(VOXEL_DIR, f'{scene_hash}.json'), lambda: json_bytes(voxel_scene),
+                               precompress=True),
+        artifact_writer.submit(os.path.join(VOXEL_DIR, f'{scene_hash}{BINARY_EXT}'),
+                               lambda: encode_scene(voxel_scene, compression=VOXEL_COMPRESSION)),
+    ]
+    artifact = {
+        'path': f'/artifacts/voxels/{scene_hash}.json',
+        'binary': f'/artifacts/voxels/{scene_hash}{BINARY_EXT}',
+        'hash': scene_hash,
     }
+    return artifact, writes
+
+
+def write_voxel_artifact(scene_hash: str, voxel_scene: Dict[str, Any]) -> Dict[str, Any]:
+    artifact, writes = write_voxel_artifact_async(scene_hash, voxel_scene)
+    for fut in writes:
+        fut.result()
+    return artifact
+
+
+def _scene_meta(voxel_scene: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in voxel_scene.items() if k != 'voxels'}
+
+
+def load_voxel_artifact(artifact: Dict[str, Any]) -> Dict[str, Any]:
+    """Read a voxel artifact entry back into a scene; the compact .bvox sibling is preferred"""
+    if artifact.get('binary'):
+        try:
+            return read_scene(_artifact_file(artifact['binary']))
+        except (OSError, VoxelCodecError):
+            pass
+    return read_json(_artifact_file(artifact['path']))
+
+
+# Content-addressed LOD cache: identical plans reuse the artifact already on disk.
+# Bump VOXEL_CACHE_VERSION whenever generation output changes for the same plan.
+VOXEL_CACHE_VERSION = 1
+
+
+# artifact/state hash -> BrickStore of that (immutable) voxel state, so repeat edits skip decoding and indexing
+EDIT_INDEX_MAX = int(os.getenv('EDIT_INDEX_MAX', '8'))
+edit_indexes: 'OrderedDict[str, BrickStore]' = OrderedDict()
+edit_indexes_lock = threading.Lock()
+
+
+def _indexed(key: str, build) -> BrickStore:
+    """Pristine store cached under key (LRU), made by build() on a miss; callers must not mutate it"""
+    with edit_indexes_lock:
+        store = edit_indexes.get(key)
+        if store is not None:
+            edit_indexes.move_to_end(key)
+            return store
+    store = build()
+    _remember_index(key, store)
+    return store
+
+
+def _remember_index(key: str, store: BrickStore):
+    with edit_indexes_lock:
+        edit_indexes[key] = store
+        edit_indexes.move_to_end(key)
+        while len(edit_indexes) > EDIT_INDEX_MAX:
+            edit_indexes.popitem(last=False)
 
 
-def generate_part_voxels_with_openai(part: Dict[str, Any], plan: Dict[str, Any]) -> List[List[int]]:
+def _artifact_key(artifact: Dict[str, Any]) -> str:
+    return artifact.get('hash') or artifact['path']
+
+
+def indexed_artifact(artifact: Dict[str, Any]) -> BrickStore:
+    """Private, editable brick store of a voxel artifact; the pristine index stays cached (LRU)"""
+    return _indexed(_artifact_key(artifact), lambda: BrickStore.from_scene(load_voxel_artifact(artifact))).copy()
+
+
+# Edit history: every job edit is stored as a .vdelta against the previous state of
+# the same LOD artifact; every EDIT_KEYFRAME_EVERY-th edit also writes a full artifact
+# so rebuilding any state replays fewer than that many deltas
+EDIT_KEYFRAME_EVERY = max(1, int(os.getenv('EDIT_KEYFRAME_EVERY', '16')))
+
+
+def edit_chain(manifest: Dict[str, Any], base: Dict[str, Any], upto: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Delta edit entries on top of a base LOD artifact, oldest first (manifest edits[:upto])"""
+    key = _artifact_key(base)
+    return [e for e in (manifest.get('edits') or [])[:upto] if e.get('delta') and e.get('base') == key]
+
+
+def _base_artifact(manifest: Dict[str, Any], key: str) -> Optional[Dict[str, Any]]:
+    artifacts = manifest.get('artifacts') or {}
+    for artifact in [artifacts.get('voxel_json')] + list((artifacts.get('lods') or {}).values()):
+        if artifact and _artifact_key(artifact) == key:
+            return artifact
+    return None
+
+
+def _read_delta(entry: Dict[str, Any]):
+    with open(_artifact_file(entry['delta']['path']), 'rb') as f:
+        return decode_delta(f.read())
+
+
+def edit_state(base: Dict[str, Any], chain: List[Dict[str, Any]]) -> BrickStore:
+    """
+    Pristine store of base after every delta in chain: replayed from the
+    latest keyframe (or the base artifact) and cached by state hash.
+    Callers must copy() before editing. Raises OSError/VoxelDeltaError when a
+    file of the chain is missing or corrupt.
+    """
+    if not chain:
+        return _indexed(_artifact_key(base), lambda: BrickStore.from_scene(load_voxel_artifact(base)))
+
+    def build() -> BrickStore:
+        start = max((i for i, e in enumerate(chain) if e.get('keyframe')), default=-1)
+        if start >= 0:
+            store = BrickStore.from_scene(load_voxel_artifact(chain[start]['keyframe']))
+        else:
+            store = edit_state(base, []).copy()
+        for entry in chain[start + 1:]:
+            apply_delta(store, *_read_delta(entry))
+        store.compact()
+        store.mark_clean()
+        return store
+
+    return _indexed(chain[-1]['hash'], build)
+
+
+def _artifact_file(url_path: str) -> str:
+    # '/artifacts/voxels/<file>' -> filesystem path under VOXEL_DIR (glb/vox likewise)
+    parts = url_path.strip('/').split('/')
+    base = {'glb': GLB_DIR, 'vox': VOX_DIR}.get(parts[-2] if len(parts) > 1 else '', VOXEL_DIR)
+    return os.path.join(base, os.path.basename(url_path))
+
+
+def _remove_artifact_file(path: str):
+    """Delete an evicted artifact file with the copies derived from it (.bvox, precompressed)"""
+    stem, ext = os.path.splitext(path)
+    derived = [stem + BINARY_EXT] if ext == '.json' else []
+    for p in [path] + derived:
+        for variant in [p] + [p + e for e in ENCODING_EXT.values()]:
+            try:
+                os.remove(variant)
+            except FileNotFoundError:
+                pass
+
+
+# every manifest write goes through the index, so lookups never probe MANIFEST_DIR
+manifest_index = ManifestIndex(MANIFEST_DIR, writer=artifact_writer)
+
+
+def _referenced_artifacts():
+    # job manifests (LODs, edit deltas and keyframes) keep their files past cache eviction
+    return manifest_index.referenced_paths()
+
+
+artifact_cache = ArtifactCache(
+    os.path.join(ARTIFACT_ROOT, 'cache_index.json'),
+    max_entries=int(os.getenv('VOXEL_CACHE_MAX_ENTRIES', '512')),
+    max_bytes=int(os.getenv('VOXEL_CACHE_MAX_BYTES', str(2 * 1024 ** 3))),
+    resolve=_artifact_file,
+    remove=_remove_artifact_file,
+    referenced=_referenced_artifacts,
+)
+
+
+def lod_cache_key(stage_plan: Dict[str, Any], glb: bool = False) -> str:
+    # glb: whether the entry carries a meshed GLB; with and without are separate entries
+    generator = 'openai' if os.getenv('USE_OPENAI_VOXELS', '0') == '1' else 'procedural'
+    return hash_dict({'cache': VOXEL_CACHE_VERSION, 'generator': generator, 'plan': stage_plan, 'glb': bool(glb)})
+
+
+def _use_openai_voxels(plan: Dict[str, Any]) -> bool:
+    return os.getenv('USE_OPENAI_VOXELS', '0') == '1' and ('dragon' not in plan['subject'].lower())
+
+
+def generate_part_voxels_with_openai(part: Dict[str, Any], plan: Dict[str, Any]) -> np.ndarray:
     # Dense, chunky procedural fill for dragons and by default; optionally allow OpenAI path via env
     bbox = part['bbox']
     res = plan['resolution']
     subject = plan['subject']
-    use_openai = os.getenv('USE_OPENAI_VOXELS', '0') == '1' and ('dragon' not in subject.lower())
-    if use_openai:
+    if _use_openai_voxels(plan):
         sys = (
             "You generate voxel coordinates for a 3D model part. "
             "Output STRICT JSON: {\"voxels\": Array<{x:int,y:int,z:int,c:int}>}. "
@@ -260,78 +555,11 @@ def generate_part_voxels_with_openai(part: Dict[str, Any], plan: Dict[str, Any])
                 for v in vox:
                     x = int(v.get('x', 0)); y = int(v.get('y', 0)); z = int(v.get('z', 0)); c = int(v.get('c', 0))
                     out.append([x,y,z,max(0,min(7,c))])
-                return out[:200000]
+                return np.asarray(out[:MAX_PART_VOXELS], dtype=np.int32).reshape(-1, 4)
         except Exception:
             pass
-    # Procedural dense fill: shape by part id
-    mn = bbox['min']; mx = bbox['max']
-    cx = (mn[0]+mx[0])/2; cy = (mn[1]+mx[1])/2; cz = (mn[2]+mx[2])/2
-    sx = max(1, mx[0]-mn[0]); sy = max(1, mx[1]-mn[1]); sz = max(1, mx[2]-mn[2])
-    rx = max(1, sx/2); ry = max(1, sy/2); rz = max(1, sz/2)
-    vox = []
-    # Choose stride based on LOD to keep it chunky at <=1024 and thin out only at the very high LODs
-    step = max(1, int(res/512))  # 32..512 => 1, 1024 => 2, 1536 => 3, 2048 => 4
-
-    pid = part['id']
-    def add_if(x,y,z,c):
-        vox.append([int(x),int(y),int(z),int(c%8)])
-
-    if pid == 'body':
-        # Solid ellipsoid torso (dense fill)
-        for x in range(mn[0], mx[0], step):
-            for y in range(mn[1], mx[1], step):
-                for z in range(mn[2], mx[2], step):
-                    dx=(x-cx)/rx; dy=(y-cy)/ry; dz=(z-cz)/rz
-                    if dx*dx + dy*dy + dz*dz <= 1.0:
-                        add_if(x,y,z,2)
-                        if len(vox)>=200000: return vox
-    elif pid in ('left_wing','right_wing'):
-        # thicker slab wings to appear solid
-        thickness = max(2, int(0.25*sy))
-        for x in range(mn[0], mx[0], step):
-            for z in range(mn[2], mx[2], step):
-                for y in range(int(cy - thickness/2), int(cy + thickness/2)+1, max(1, step)):
-                    add_if(x,y,z,4)
-                    if (x - mn[0]) % max(step*3, 3) == 0:
-                        add_if(x,y,z,5)
-                    if len(vox)>=200000: return vox
-    elif pid in ('left_leg','right_leg','neck'):
-        # vertical cylinder (dense)
-        r_cyl = max(2, int(min(rx, rz)*0.45))
-        for y in range(mn[1], mx[1], step):
-            for x in range(mn[0], mx[0], step):
-                for z in range(mn[2], mx[2], step):
-                    if (x-cx)**2 + (z-cz)**2 <= r_cyl*r_cyl:
-                        add_if(x,y,z,6)
-                        if len(vox)>=200000: return vox
-    elif pid == 'tail':
-        # tapered cone along +x (denser radius)
-        length = max(1, sx)
-        for x in range(mn[0], mx[0], step):
-            t = (x - mn[0]) / max(1, length)
-            r_now = max(2, int(rz * (1.0 - 0.6*t)))
-            for y in range(mn[1], mx[1], step):
-                for z in range(mn[2], mx[2], step):
-                    if (z-cz)**2 + (y-cy)**2 <= r_now*r_now:
-                        add_if(x,y,z,1)
-                        if len(vox)>=200000: return vox
-    elif pid in ('horns','spikes'):
-        # spikes along a ridge (denser)
-        for x in range(mn[0], mx[0], max(1, step*2)):
-            ry_local = max(1, int(ry*0.15))
-            for y in range(int(cy), mx[1], max(1, step)):
-                add_if(x,y,int(cz),3)
-                if len(vox)>=200000: return vox
-    else:
-        # default ellipsoid (dense)
-        for x in range(mn[0], mx[0], step):
-            for y in range(mn[1], mx[1], step):
-                for z in range(mn[2], mx[2], step):
-                    dx=(x-cx)/rx; dy=(y-cy)/ry; dz=(z-cz)/rz
-                    if dx*dx + dy*dy + dz*dz <= 1.0:
-                        add_if(x,y,z,2)
-                        if len(vox)>=200000: return vox
-    return vox
+    # Procedural dense fill: shape by part id (vectorized, see voxel.raster)
+    return rasterize_part(part, plan)
 
 
 # -----------------------------
@@ -400,6 +628,7 @@ def generate_shapee_model(prompt: Dict[str, Any], on_progress=None) -> Dict[str,
             # If the API exposes save_glb or similar; fall back to Voxel if not.
             if hasattr(model, 'save_glb'):
                 model.save_glb(output, glb_path)
+                artifact_writer.precompress_file(glb_path)
                 if on_progress:
                     try: on_progress('Exported GLB')
                     except: pass
@@ -428,39 +657,255 @@ def generate_shapee_model(prompt: Dict[str, Any], on_progress=None) -> Dict[str,
         raise RuntimeError(str(e))
 
 
-def assemble_and_optimize(parts_voxels: Dict[str, List[List[int]]], plan: Dict[str, Any]) -> Dict[str, Any]:
-    # Merge voxel lists; no smoothing for MVP; dedupe by xyz keep first color
-    seen = set()
-    merged = []
-    for pid, vox in parts_voxels.items():
-        for v in vox:
-            key = (v[0],v[1],v[2])
-            if key in seen:
-                continue
-            seen.add(key)
-            merged.append({'x': int(v[0]), 'y': int(v[1]), 'z': int(v[2]), 'c': int(v[3])})
-    palette = ['#c62828','#ef4444','#f59e0b','#facc15','#22c55e','#60a5fa','#a78bfa','#9ca3af']
-    return {
-        'res': plan['resolution'],
+VOXEL_PALETTE = ['#c62828','#ef4444','#f59e0b','#facc15','#22c55e','#60a5fa','#a78bfa','#9ca3af']
+
+
+def build_voxel_scene(vox: np.ndarray, res: int, scale: float = 1.0) -> Dict[str, Any]:
+    scene = {
+        'res': res,
         'origin': [0,0,0],
-        'palette': palette,
-        'voxels': merged
+        'palette': list(VOXEL_PALETTE),
+        'voxels': voxels_to_dicts(vox)
     }
+    if scale != 1.0:
+        # world size of one voxel relative to the top LOD (pyramid-derived LODs)
+        scene['scale'] = round(scale, 6)
+    return scene
+
+
+class JobStages:
+    """
+    Runs the named pipeline stages of a job and records per-stage wall-clock
+    timing in jobs[job_id]['stages']. Stages with nothing to do are recorded
+    as skipped instead of being simulated.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def _record(self, name: str, status: str, ms: float, lod: int = None, **extra):
+        entry = {'stage': name, 'status': status, 'ms': round(ms, 2)}
+        if lod is not None:
+            entry['lod'] = lod
+        entry.update(extra)
+        with jobs_lock:
+            job = jobs[self.job_id]
+            job.setdefault('stages', []).append(entry)
+            totals = job.setdefault('stage_ms', {})
+            totals[name] = round(totals.get(name, 0.0) + ms, 2)
+
+    def run(self, name: str, fn, *args, lod: int = None, **kwargs):
+        with jobs_lock:
+            jobs[self.job_id]['stage'] = {'name': name, 'lod': lod}
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._record(name, 'failed', (time.perf_counter() - t0) * 1000, lod, error=str(e))
+            raise
+        self._record(name, 'done', (time.perf_counter() - t0) * 1000, lod)
+        return result
+
+    def record(self, name: str, ms: float, lod: int = None, **extra):
+        """Record a stage timed elsewhere (e.g. on the artifact writer thread)"""
+        self._record(name, 'done', ms, lod, **extra)
+
+    def skip(self, name: str, reason: str, lod: int = None):
+        self._record(name, 'skipped', 0.0, lod, reason=reason)
+
+
+# -----------------------------
+# Job events
+# -----------------------------
+# Progress entries carry a per-job seq; anything that is not a plain progress
+# message names its Socket.IO event in 'event' so replays use the same name.
+JOB_EVENTS = {'progress': 'job_progress', 'lod_ready': 'job_lod_ready', 'status': 'job_status'}
+
+
+def job_room(job_id: str) -> str:
+    return f'job:{job_id}'
+
+
+def _job_event_payload(job_id: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(entry, jobId=job_id)
+
+
+def job_progress(job_id: str, msg: str, event: str = 'progress', **fields) -> Dict[str, Any]:
+    """Append a numbered progress entry and push it to the job's Socket.IO room"""
+    entry = {'t': datetime.utcnow().isoformat(), 'msg': msg, **fields}
+    if event != 'progress':
+        entry['event'] = event
+    with jobs_lock:
+        job = jobs[job_id]
+        job['seq'] = entry['seq'] = job.get('seq', 0) + 1
+        job['progress'].append(entry)
+    socketio.emit(JOB_EVENTS[event], _job_event_payload(job_id, entry), room=job_room(job_id))
+    return entry
+
+
+def set_job_status(job_id: str, status: str, **fields):
+    """Update a job's status (plus e.g. error/completed_at), log it and announce it"""
+    with jobs_lock:
+        job = jobs[job_id]
+        job['status'] = status
+        job.update(fields)
+        persisted = dict(fields)
+        if status == 'running':
+            job['attempt'] = persisted['attempt'] = job.get('attempt', 0) + 1
+        elif status in FINISHED_STATUSES:
+            persisted.update({k: job[k] for k in ('artifacts', 'plan', 'stage_ms', 'seq', 'ttfv_ms') if k in job})
+    job_registry.record(job_id, status, **persisted)
+    job_progress(job_id, f'Job {status}', event='status', status=status, **fields)
+    if status in FINISHED_STATUSES:
+        # readers already following the stream drain it; new ones replay the artifact
+        with jobs_lock:
+            stream = job_streams.pop(job_id, None)
+        if stream is not None:
+            stream.close(status)
+        job_registry.mark_finished(job_id)
+        evict_finished_jobs()
+
+
+def evict_finished_jobs():
+    """Drop finished jobs past their TTL/LRU bound from memory; GET falls back to the log"""
+    expired = job_registry.expired()
+    if expired:
+        with jobs_lock:
+            for job_id in expired:
+                jobs.pop(job_id, None)
+
+
+# recovered jobs waiting for room in the job queue, oldest first (guarded by jobs_lock)
+recovery_backlog: deque = deque()
+recovery_lock = threading.Lock()
+recovered_once = False
+
+
+def recover_jobs() -> Dict[str, int]:
+    """
+    Re-queue jobs a restart interrupted (queued or running in the log).
+    Jobs that already used JOB_MAX_ATTEMPTS runs are marked failed instead;
+    jobs beyond the queue's capacity stay queued and are admitted as running
+    jobs finish.
+    """
+    job_registry.purge(JOB_LOG_RETENTION_S)
+    counts = {'requeued': 0, 'deferred': 0, 'failed': 0}
+    for state in job_registry.interrupted():
+        job_id, prompt = state['id'], state.get('prompt')
+        key = prompt_key(prompt) if prompt else None
+        exhausted = not prompt or state.get('attempt', 0) >= job_registry.max_attempts
+        with jobs_lock:
+            if job_id in jobs:
+                continue
+            jobs[job_id] = {'id': job_id, 'status': 'queued', 'created_at': state.get('created_at'), 'progress': [],
+                            'attempt': state.get('attempt', 0), 'prompt_key': key, 'subscribers': 1, 'recovered': True}
+            if not exhausted:
+                inflight_jobs.setdefault(key, job_id)
+                recovery_backlog.append((job_id, prompt))
+        if exhausted:
+            set_job_status(job_id, 'failed', error='interrupted by server restart')
+            counts['failed'] += 1
+        else:
+            job_registry.record(job_id, 'queued', recovered=True)
+    started, failed = resume_recovered_jobs()
+    counts['requeued'] += started
+    counts['failed'] += failed
+    with jobs_lock:
+        counts['deferred'] = len(recovery_backlog)
+    return counts
+
+
+def recover_jobs_once() -> Optional[Dict[str, int]]:
+    """
+    recover_jobs() on the first call in this process; None afterwards.
+    Concurrent callers wait until that first recovery is done.
+    """
+    global recovered_once
+    with recovery_lock:
+        if recovered_once:
+            return None
+        try:
+            return recover_jobs()
+        finally:
+            recovered_once = True
+
+
+@app.before_request
+def recover_jobs_on_first_request():
+    # WSGI hosts (gunicorn, uwsgi, ...) import app without running main();
+    # their first request recovers interrupted jobs instead
+    if not recovered_once:
+        counts = recover_jobs_once()
+        if counts is not None:
+            print(f"[LOG] Job recovery: {counts}")
+
+
+def resume_recovered_jobs() -> Tuple[int, int]:
+    """Submit recovered jobs while the queue has room; returns (started, failed to submit)"""
+    started = failed = 0
+    while True:
+        with jobs_lock:
+            if not recovery_backlog or not scheduler.has_room():
+                break
+            job_id, prompt = recovery_backlog[0]
+            if scheduler.admit(job_id) is None:
+                break
+            recovery_backlog.popleft()
+        if _submit_job(job_id, prompt):
+            started += 1
+        else:
+            failed += 1
+    return started, failed
+
+
+scheduler.on_finish = resume_recovered_jobs
+
+
+def prompt_key(prompt: Dict[str, Any]) -> str:
+    # Case/whitespace-insensitive key for coalescing identical submissions
+    norm = {k: (' '.join(v.split()).lower() if isinstance(v, str) else v) for k, v in prompt.items()}
+    return hash_dict(norm)
+
+
+def _release_inflight(job_id: str):
+    with jobs_lock:
+        key = (jobs.get(job_id) or {}).get('prompt_key')
+        if key and inflight_jobs.get(key) == job_id:
+            del inflight_jobs[key]
+
+
+def _submit_job(job_id: str, prompt: Dict[str, Any]) -> bool:
+    """Hand an admitted job to the scheduler; when its pool is shut down the job fails instead"""
+    try:
+        scheduler.submit(job_id, run_job, job_id, prompt)
+        return True
+    except RuntimeError as e:
+        _release_inflight(job_id)
+        set_job_status(job_id, 'failed', error=f'job scheduler unavailable: {e}')
+        return False
 
 
 def run_job(job_id: str, prompt: Dict[str, Any]):
     with jobs_lock:
-        jobs[job_id] = {'id': job_id, 'status': 'running', 'created_at': datetime.utcnow().isoformat(), 'progress': [], 'artifacts': {}}
+        # keep fields set at submission (created_at, prompt_key, subscribers)
+        job = jobs.setdefault(job_id, {'id': job_id, 'created_at': datetime.utcnow().isoformat()})
+        job.update({'progress': [], 'seq': 0, 'artifacts': {}, 'stages': [], 'stage_ms': {}})
+        job.pop('ttfv_ms', None)
+        # time-to-first-voxel counts from here; readers attached while queued stay attached
+        stream = job_streams.setdefault(job_id, VoxelStream())
+        stream.started = time.perf_counter()
+    set_job_status(job_id, 'running')
+    stages = JobStages(job_id)
+    # set once per LOD when its queued writes finished (see _when_written)
+    pending_lods: List[threading.Event] = []
     try:
         # Prefer Shap-E when available (default), or explicitly requested via mode='shapee'
         if _shapee_available() or (str(prompt.get('mode') or '').lower() in ('shapee','voxel','mesh')):
-            with jobs_lock:
-                jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': 'Shap-E generation started'})
+            job_progress(job_id, 'Shap-E generation started')
             try:
                 def _prog(msg: str):
-                    with jobs_lock:
-                        jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': msg})
-                artifact = generate_shapee_model(prompt, on_progress=_prog)
+                    job_progress(job_id, msg)
+                artifact = stages.run('shapee', generate_shapee_model, prompt, on_progress=_prog)
                 manifest = {
                     'jobId': job_id,
                     'prompt': prompt,
@@ -468,27 +913,22 @@ def run_job(job_id: str, prompt: Dict[str, Any]):
                     'artifacts': {'shapee': artifact},
                     'created_at': datetime.utcnow().isoformat(),
                 }
-                manifest_path = os.path.join(MANIFEST_DIR, f'{job_id}.json')
-                write_json(manifest_path, manifest)
+                manifest_index.write(job_id, manifest)
                 with jobs_lock:
                     jobs[job_id]['artifacts'] = manifest['artifacts']
-                    jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': 'Shap-E export complete', 'artifact': artifact})
-                    jobs[job_id]['status'] = 'completed'
-                    jobs[job_id]['completed_at'] = datetime.utcnow().isoformat()
+                job_progress(job_id, 'Shap-E export complete', artifact=artifact)
+                set_job_status(job_id, 'completed', completed_at=datetime.utcnow().isoformat())
                 return
             except Exception as e:
-                with jobs_lock:
-                    jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': 'Shap-E generation failed', 'error': str(e)})
+                job_progress(job_id, 'Shap-E generation failed', error=str(e))
                 # Fall back to existing pipeline
 
-        plan = supervisor_plan(prompt)
+        plan = stages.run('plan', supervisor_plan, prompt)
         with jobs_lock:
             jobs[job_id]['plan'] = plan
-            jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': 'Planned decomposition', 'parts': [p['id'] for p in plan['parts']]})
-        # Stage: Reference collection (simulated)
-        time.sleep(0.2)
-        with jobs_lock:
-            jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': 'Collected references'})
+        job_progress(job_id, 'Planned decomposition', parts=[p['id'] for p in plan['parts']])
+        # No reference source is wired up yet; the layout comes from the plan template
+        stages.skip('references', 'no reference source configured')
 
         manifest = {
             'jobId': job_id,
@@ -497,89 +937,211 @@ def run_job(job_id: str, prompt: Dict[str, Any]):
             'artifacts': {},
             'created_at': datetime.utcnow().isoformat(),
         }
-        manifest_path = os.path.join(MANIFEST_DIR, f'{job_id}.json')
-
-        # Process each LOD progressively
-        for lod in plan.get('lods', [plan['resolution']]):
-            stage_plan = dict(plan)
-            stage_plan['resolution'] = lod
-            with jobs_lock:
-                jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': f'Generating parts at LOD {lod}'})
 
+        def _generate_parts(stage_plan: Dict[str, Any], lod: int) -> Dict[str, np.ndarray]:
             # Parallel part generation
             futures = {}
-            start_t = time.time()
+            in_process = part_rasterizer is not None and not _use_openai_voxels(stage_plan)
             for part in stage_plan['parts']:
-                futures[executor.submit(generate_part_voxels_with_openai, part, stage_plan)] = part['id']
+                if in_process:
+                    fut = part_rasterizer.submit(part, stage_plan)
+                else:
+                    fut = scheduler.submit_part(generate_part_voxels_with_openai, part, stage_plan)
+                futures[fut] = part['id']
 
-            parts_voxels: Dict[str, List[List[int]]] = {}
+            parts_voxels: Dict[str, np.ndarray] = {}
             for fut in as_completed(futures):
                 pid = futures[fut]
                 try:
                     vox = fut.result()
                 except Exception:
-                    vox = []
+                    vox = np.empty((0, 4), dtype=np.int32)
                 parts_voxels[pid] = vox
-                with jobs_lock:
-                    jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': f'Part {pid} generated (LOD {lod})', 'voxels': len(vox)})
-                time.sleep(0.05)
-
-            # Stage: Assembler
+                ttfv = stream.add_voxels(lod, pid, vox)
+                if ttfv is not None:
+                    _first_voxel(ttfv)
+                job_progress(job_id, f'Part {pid} generated (LOD {lod})', voxels=len(vox))
+            return parts_voxels
+
+        def _assemble(parts_voxels: Dict[str, np.ndarray], lod: int) -> np.ndarray:
+            # Bulk merge, dedupe by xyz keep first color
+            job_progress(job_id, f'Assembling (LOD {lod})')
+            merged, stats = merge_parts(parts_voxels.values())
+            job_progress(job_id, f'Merged {stats["voxels"]} voxels (LOD {lod})', **stats)
+            return merged
+
+        def _validate(voxel_scene: Dict[str, Any], lod: int) -> bool:
+            ok = len(voxel_scene.get('voxels', [])) > 0
+            job_progress(job_id, f'Validation {"passed" if ok else "failed"} (LOD {lod})')
+            return ok
+
+        # LOD files are written on the artifact writer thread while the next LOD is prepared;
+        # a LOD is published (job artifacts, cache, lod_ready) only once its files are on disk
+        published: Dict[str, Dict[str, Any]] = {}
+        write_errors: List[BaseException] = []
+
+        def _first_voxel(ttfv_ms: float):
             with jobs_lock:
-                jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': f'Assembling (LOD {lod})'})
-            voxel_scene = assemble_and_optimize(parts_voxels, stage_plan)
-            time.sleep(0.1)
+                jobs[job_id]['ttfv_ms'] = ttfv_ms
+            job_progress(job_id, 'First voxels streamed', ttfv_ms=ttfv_ms)
 
-            # Stage: Geometry Optimizer (simulated smoothing)
+        def _publish_lod(lod: int, artifact: Dict[str, Any]):
             with jobs_lock:
-                jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': f'Optimizing geometry (LOD {lod})'})
-            time.sleep(0.1)
-
-            # Stage: Texturing (palette already present; simulated)
-            with jobs_lock:
-                jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': f'Applying materials (LOD {lod})'})
-            time.sleep(0.05)
-
-            # Stage: Validator
-            ok = True
-            if len(voxel_scene.get('voxels', [])) == 0:
-                ok = False
-            with jobs_lock:
-                jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': f'Validation {"passed" if ok else "failed"} (LOD {lod})'})
-            if not ok:
-                with jobs_lock:
-                    jobs[job_id]['status'] = 'failed'
-                    jobs[job_id]['error'] = 'Empty geometry after generation'
-                return
-
-            # Export artifact for this LOD
-            scene_hash = hash_dict({'plan': stage_plan, 'voxels': voxel_scene})
-            voxel_path = os.path.join(VOXEL_DIR, f'{scene_hash}.json')
-            write_json(voxel_path, voxel_scene)
-            manifest['artifacts'].setdefault('lods', {})[str(lod)] = {
-                'path': f'/artifacts/voxels/{scene_hash}.json',
-                'hash': scene_hash,
-                'res': lod
-            }
-            write_json(manifest_path, manifest)
-
+                published[str(lod)] = artifact
+                jobs[job_id]['artifacts'] = {'lods': dict(published)}
+            stream.add({'type': 'lod_ready', 'lod': lod, 'artifact': artifact})
+            # fully cached jobs never stream parts; their first voxels are the artifact
+            ttfv = stream.mark_first_voxel()
+            if ttfv is not None:
+                _first_voxel(ttfv)
+            job_progress(job_id, f'LOD {lod} ready', event='lod_ready', lod=lod, artifact=artifact)
+
+        def _export(stage_plan: Dict[str, Any], voxel_scene: Dict[str, Any], vox: np.ndarray, mesh=None):
+            # content address from the packed buffer, not a JSON dump of the voxel dicts
+            scene_hash = content_hash(vox, stage_plan, _scene_meta(voxel_scene))
+            lod_artifact, writes = write_voxel_artifact_async(scene_hash, voxel_scene)
+            lod_artifact['res'] = stage_plan['resolution']
+            if mesh is not None:
+                # greedy-meshed GLB next to the voxel files, under the same content address
+                glb, mesh_stats = mesh
+                lod_artifact['glb'] = f'/artifacts/glb/{scene_hash}.glb'
+                lod_artifact['triangles'] = mesh_stats['triangles']
+                writes.append(artifact_writer.submit(os.path.join(GLB_DIR, f'{scene_hash}.glb'), lambda: glb,
+                                                     precompress=True))
+            manifest['artifacts'].setdefault('lods', {})[str(stage_plan['resolution'])] = lod_artifact
+            writes.append(manifest_index.write(job_id, manifest))
+            return lod_artifact, writes
+
+        def _when_written(stage_plan: Dict[str, Any], lod_artifact: Dict[str, Any], writes: list, start_t: float):
+            lod = stage_plan['resolution']
+            done = threading.Event()
+            pending_lods.append(done)
+            remaining = [len(writes)]
+            count_lock = threading.Lock()
+
+            def _written(_fut):
+                with count_lock:
+                    remaining[0] -= 1
+                    if remaining[0]:
+                        return
+                try:
+                    failed = [f.exception() for f in writes if f.exception() is not None]
+                    if failed:
+                        write_errors.append(failed[0])
+                        return
+                    with jobs_lock:
+                        running = (jobs.get(job_id) or {}).get('status') == 'running'
+                    if not running:
+                        return
+                    write_ms = round(sum(f.result() for f in writes), 2)
+                    stages.record('write', write_ms, lod=lod)
+                    if use_cache:
+                        artifact_cache.put(lod_cache_key(stage_plan, export_glb), lod_artifact)
+                    job_progress(job_id, f'Exported LOD {lod}', duration_s=round(time.time()-start_t,2), write_ms=write_ms)
+                    _publish_lod(lod, lod_artifact)
+                finally:
+                    done.set()
+
+            for fut in writes:
+                fut.add_done_callback(_written)
+
+        def _stage_plan(lod: int) -> Dict[str, Any]:
+            # part bboxes in the LOD's own grid, so regenerated LODs are written at their res
+            return plan_at_lod(plan, lod)
+
+        def _lookup_cached(lods: List[int]) -> Dict[int, Dict[str, Any]]:
+            found = {}
+            for lod in lods:
+                artifact = artifact_cache.get(lod_cache_key(_stage_plan(lod), export_glb))
+                if artifact is not None:
+                    found[lod] = artifact
+            return found
+
+        def _reuse_lod(lod: int, artifact: Dict[str, Any]):
+            artifact['cached'] = True
+            manifest['artifacts'].setdefault('lods', {})[str(lod)] = artifact
+            manifest_index.write(job_id, manifest)
+            job_progress(job_id, f'Reused cached LOD {lod}', hash=artifact.get('hash'))
+            _publish_lod(lod, artifact)
+
+        def _finish_lod(stage_plan: Dict[str, Any], vox: np.ndarray, start_t: float, scale: float = 1.0):
+            lod = stage_plan['resolution']
+            # No smoothing pass exists yet; record it rather than pretending
+            stages.skip('optimize', 'no geometry optimizer configured', lod=lod)
+            # Materials: palette + scene layout for the artifact
+            voxel_scene = stages.run('materials', build_voxel_scene, vox, lod, scale=scale, lod=lod)
+            if not stages.run('validate', _validate, voxel_scene, lod, lod=lod):
+                raise ValueError('Empty geometry after generation')
+            mesh = None
+            if export_glb:
+                mesh = stages.run('mesh', encode_glb, vox, voxel_scene['palette'], scale, lod=lod)
+                job_progress(job_id, f'Meshed LOD {lod}', **mesh[1])
+            else:
+                stages.skip('mesh', 'disabled by request', lod=lod)
+            lod_artifact, writes = stages.run('export', _export, stage_plan, voxel_scene, vox, mesh, lod=lod)
+            _when_written(stage_plan, lod_artifact, writes, start_t)
+
+        lods = plan.get('lods', [plan['resolution']])
+        use_cache = bool(prompt.get('cache', True))
+        export_glb = VOXEL_GLB and bool(prompt.get('glb', True))
+        if use_cache:
+            cached = stages.run('cache', _lookup_cached, lods)
             with jobs_lock:
-                jobs[job_id]['artifacts'] = manifest['artifacts']
-                jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': f'Exported LOD {lod}', 'duration_s': round(time.time()-start_t,2)})
+                jobs[job_id]['cache'] = {'hits': len(cached), 'misses': len(lods) - len(cached)}
+        else:
+            cached = {}
+            stages.skip('cache', 'disabled by request')
+
+        if len(cached) == len(lods):
+            # Every LOD of this exact plan already exists on disk
+            for lod in sorted(cached, reverse=True):
+                _reuse_lod(lod, cached[lod])
+        elif plan.get('lod_mode', 'pyramid') == 'pyramid':
+            # Generate once at the top LOD, derive the lower LODs by downsampling
+            top = max(lods)
+            stage_plan = _stage_plan(top)
+            start_t = time.time()
+            job_progress(job_id, f'Generating parts at LOD {top}')
+            parts_voxels = stages.run('generate', _generate_parts, stage_plan, top, lod=top)
+            merged = stages.run('assemble', _assemble, parts_voxels, top, lod=top)
+            pyramid = stages.run('downsample', build_pyramid, merged, lods, mode=plan.get('lod_downsample', 'majority'))
+            for lod in sorted(pyramid, reverse=True):
+                if lod in cached:
+                    _reuse_lod(lod, cached[lod])
+                    continue
+                _finish_lod(_stage_plan(lod), pyramid[lod], start_t, scale=top / lod)
+        else:
+            # Regenerate every LOD from scratch, smallest first
+            stages.skip('downsample', 'lod_mode=regenerate')
+            for lod in lods:
+                if lod in cached:
+                    _reuse_lod(lod, cached[lod])
+                    continue
+                stage_plan = _stage_plan(lod)
+                start_t = time.time()
+                job_progress(job_id, f'Generating parts at LOD {lod}')
+                parts_voxels = stages.run('generate', _generate_parts, stage_plan, lod, lod=lod)
+                merged = stages.run('assemble', _assemble, parts_voxels, lod, lod=lod)
+                _finish_lod(stage_plan, merged, start_t, scale=max(lods) / lod)
 
         # If target_res >> internal lod, note upscale intent
         if plan.get('target_resolution', plan['resolution']) > plan['resolution']:
-            with jobs_lock:
-                jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': f'Ready for upscale to {plan["target_resolution"]} (deferred)'})
-
-        with jobs_lock:
-            jobs[job_id]['status'] = 'completed'
-            jobs[job_id]['completed_at'] = datetime.utcnow().isoformat()
-            jobs[job_id]['progress'].append({'t': datetime.utcnow().isoformat(), 'msg': 'Assembly complete'})
+            job_progress(job_id, f'Ready for upscale to {plan["target_resolution"]} (deferred)')
+
+        # completion waits for every LOD (and the manifest) to reach disk
+        for done in pending_lods:
+            done.wait()
+        if write_errors:
+            raise write_errors[0]
+        job_progress(job_id, 'Assembly complete')
+        set_job_status(job_id, 'completed', completed_at=datetime.utcnow().isoformat())
     except Exception as e:
-        with jobs_lock:
-            jobs[job_id]['status'] = 'failed'
-            jobs[job_id]['error'] = str(e)
+        # LODs whose writes were already queued publish before the job turns terminal
+        for done in pending_lods:
+            done.wait()
+        set_job_status(job_id, 'failed', error=str(e))
+    finally:
+        _release_inflight(job_id)
 
 
 # -----------------------------
@@ -836,11 +1398,34 @@ def generate_scene():
 # Orchestration Endpoints
 # -----------------------------
 
+_FLAG_VALUES = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False}
+
+
+def _flag_arg(value: Any, default: bool) -> bool:
+    """Boolean request field: JSON booleans, 0/1 or true/false/yes/no strings; ValueError otherwise"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in _FLAG_VALUES:
+        return _FLAG_VALUES[value.strip().lower()]
+    raise ValueError(f'expected a boolean, got {value!r}')
+
+
 @app.route('/jobs', methods=['POST'])
 def create_job():
     """
     Create a 3D generation job. Expected JSON:
     {"mode":"voxel","resolution":64,"subject":"dragon","style":"cartoony","pose":"flying","seed":123}
+    Optional: "lod_mode": "pyramid"|"regenerate", "lod_downsample": "majority"|"first",
+              "cache": false to bypass the LOD artifact cache,
+              "glb": false to skip the greedy-meshed GLB of each LOD
+    Identical prompts submitted while a job for them is in flight share that job
+    (same jobId, progress and artifacts; response carries "coalesced": true).
+    Returns 429 with Retry-After when the job queue is full; otherwise the
+    response carries "queuePosition" (0 = starts immediately).
     """
     data = request.json or {}
     mode = data.get('mode', 'voxel')
@@ -849,39 +1434,325 @@ def create_job():
     style = data.get('style', '')
     pose = data.get('pose', '')
     seed = int(data.get('seed', 12345))
-    prompt = { 'mode': mode, 'resolution': resolution, 'subject': subject, 'style': style, 'pose': pose, 'seed': seed }
-    job_id = f"job_{int(datetime.utcnow().timestamp()*1000)}_{hashlib.sha1(json.dumps(prompt).encode()).hexdigest()[:6]}"
-    # launch in background
-    executor.submit(run_job, job_id, prompt)
+    lod_mode = data.get('lod_mode', 'pyramid')
+    lod_downsample = data.get('lod_downsample', 'majority')
+    if lod_mode not in LOD_MODES:
+        return jsonify({'error': f'lod_mode must be one of {", ".join(LOD_MODES)}'}), 400
+    if lod_downsample not in DOWNSAMPLE_MODES:
+        return jsonify({'error': f'lod_downsample must be one of {", ".join(DOWNSAMPLE_MODES)}'}), 400
+    try:
+        use_cache = _flag_arg(data.get('cache'), True)
+        export_glb = _flag_arg(data.get('glb'), True)
+    except ValueError as e:
+        return jsonify({'error': f'cache/glb: {e}'}), 400
+    prompt = { 'mode': mode, 'resolution': resolution, 'subject': subject, 'style': style, 'pose': pose, 'seed': seed,
+               'lod_mode': lod_mode, 'lod_downsample': lod_downsample, 'cache': use_cache, 'glb': export_glb }
+    key = prompt_key(prompt)
     with jobs_lock:
-        jobs[job_id] = jobs.get(job_id, {'id': job_id, 'status': 'queued', 'created_at': datetime.utcnow().isoformat()})
-    return jsonify({'jobId': job_id, 'status': 'queued'})
+        # Identical prompt already queued/running: attach to it instead of generating twice
+        leader = inflight_jobs.get(key)
+        if leader and jobs.get(leader, {}).get('status') in ('queued', 'running'):
+            jobs[leader]['subscribers'] = jobs[leader].get('subscribers', 1) + 1
+            resp = {'jobId': leader, 'status': jobs[leader]['status'], 'coalesced': True}
+            position = scheduler.position(leader)
+            if position is not None:
+                resp['queuePosition'] = position
+            return jsonify(resp)
+        job_id = f"job_{int(datetime.utcnow().timestamp()*1000)}_{hashlib.sha1(json.dumps(prompt).encode()).hexdigest()[:6]}"
+        position = scheduler.admit(job_id)
+        if position is None:
+            stats = scheduler.stats()
+            resp = jsonify({'error': 'job queue full', 'queued': stats['queued'], 'queueLimit': stats['queue_limit']})
+            resp.headers['Retry-After'] = '5'
+            return resp, 429
+        jobs[job_id] = {'id': job_id, 'status': 'queued', 'created_at': datetime.utcnow().isoformat(), 'progress': [],
+                        'prompt_key': key, 'subscribers': 1}
+        inflight_jobs[key] = job_id
+    job_registry.record(job_id, 'queued', prompt=prompt, created_at=jobs[job_id]['created_at'])
+    evict_finished_jobs()
+    # launch in background
+    if not _submit_job(job_id, prompt):
+        resp = jsonify({'error': 'job scheduler unavailable', 'jobId': job_id})
+        resp.headers['Retry-After'] = '5'
+        return resp, 503
+    return jsonify({'jobId': job_id, 'status': 'queued', 'queuePosition': position})
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    Jobs with a manifest, newest first.
+    Query: subject (substring, case-insensitive), since/until (ISO timestamps), limit (default 50)
+    """
+    return jsonify({'jobs': manifest_index.list(
+        subject=request.args.get('subject'),
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+        limit=request.args.get('limit', default=50, type=int),
+    )})
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(artifact_cache.stats())
+
+
+@app.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    return jsonify(scheduler.stats())
+
+
+def _progress_since(progress: List[Dict[str, Any]], since: int) -> List[Dict[str, Any]]:
+    # entries are appended in seq order, so this is O(log n + new)
+    return progress[bisect_right(progress, since, key=lambda e: e.get('seq', 0)):]
+
+
+def _latest_lod_artifact(job: Dict[str, Any]):
+    # the finest published LOD; the pyramid publishes top-down, so event order would give the coarsest
+    lods = (job.get('artifacts') or {}).get('lods') or {}
+    if lods:
+        return lods[max(lods, key=int)]
+    ready = [e for e in job.get('progress', []) if e.get('event') == 'lod_ready' and e.get('artifact')]
+    if ready:
+        return max(ready, key=lambda e: int(e.get('lod') or 0))['artifact']
+    return (job.get('artifacts') or {}).get('shapee')
+
+
+def _job_percent(job: Dict[str, Any]) -> int:
+    if job.get('status') == 'completed':
+        return 100
+    lods = (job.get('plan') or {}).get('lods') or []
+    done = len((job.get('artifacts') or {}).get('lods') or {})
+    # stays below 100 until the job reports completion
+    return min(99, int(100 * done / len(lods))) if lods else 0
+
+
+def job_summary(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact, fixed-size view of a job for polling clients"""
+    out = {
+        'id': job.get('id'),
+        'status': job.get('status'),
+        'stage': job.get('stage'),
+        'percent': _job_percent(job),
+        'seq': job.get('seq', 0),
+        'artifact': _latest_lod_artifact(job),
+    }
+    if job.get('ttfv_ms') is not None:
+        out['ttfv_ms'] = job['ttfv_ms']
+    if job.get('error'):
+        out['error'] = job['error']
+    return out
+
+
+# job fields GET /jobs/<id> returns; the rest (prompt_key, subscribers, ...) is bookkeeping
+JOB_PUBLIC_FIELDS = ('id', 'status', 'created_at', 'completed_at', 'error', 'attempt', 'recovered', 'stage', 'seq',
+                     'plan', 'artifacts', 'cache', 'stages', 'stage_ms', 'ttfv_ms')
+# progress entries in the default view; older ones are fetched with since=<seq>
+JOB_PROGRESS_TAIL = int(os.getenv('JOB_PROGRESS_TAIL', '200'))
 
 
 @app.route('/jobs/<job_id>', methods=['GET'])
 def get_job(job_id):
+    """
+    Job state: the public fields plus the last JOB_PROGRESS_TAIL progress entries. Query options:
+      since=<seq>    only progress entries with a larger seq (plus the latest seq)
+      view=summary   status, current stage, percent and latest artifact only;
+                     combined with since it also carries the new progress entries
+    """
+    since = request.args.get('since', type=int)
+    summary = request.args.get('view') == 'summary'
+
+    def _view(job: Dict[str, Any]) -> Dict[str, Any]:
+        progress = job.get('progress', [])
+        if summary:
+            out = job_summary(job)
+        else:
+            out = {k: job[k] for k in JOB_PUBLIC_FIELDS if k in job}
+            out['progress'] = progress[-JOB_PROGRESS_TAIL:]
+        if since is not None:
+            out['progress'] = _progress_since(progress, since)
+        # the job thread keeps mutating progress, stages, stage_ms and artifacts in place,
+        # and jsonify runs after jobs_lock is released
+        return copy.deepcopy(out)
+
     with jobs_lock:
         info = jobs.get(job_id)
-    if not info:
-        # Try manifest on disk
-        manifest_path = os.path.join(MANIFEST_DIR, f'{job_id}.json')
-        if os.path.exists(manifest_path):
-            manifest = read_json(manifest_path)
-            return jsonify({'id': job_id, 'status': 'completed', 'artifacts': manifest.get('artifacts', {}), 'plan': manifest.get('plan')})
-        return jsonify({'error': 'job not found'}), 404
+        if info is not None:
+            info = _view(info)
+    if info is not None:
+        job_registry.touch(job_id)
+    else:
+        # evicted from memory or from before a restart: the log, then the manifest
+        info = job_registry.state(job_id)
+        if info is None:
+            manifest = manifest_index.get(job_id)
+            if manifest is None:
+                return jsonify({'error': 'job not found'}), 404
+            info = {'id': job_id, 'status': 'completed', 'artifacts': manifest.get('artifacts', {}), 'plan': manifest.get('plan')}
+        info = _view(info)
+    if info.get('status') == 'queued':
+        position = scheduler.position(job_id)
+        if position is not None:
+            info['queuePosition'] = position
     return jsonify(info)
 
 
+def _stream_line(payload: Dict[str, Any]) -> bytes:
+    if isinstance(payload.get('voxels'), np.ndarray):
+        payload = dict(payload, voxels=payload['voxels'].tolist())
+    return serializer.dumps(payload) + b'\n'
+
+
+def _replay_artifact_stream(job_id: str, lod: Optional[int]):
+    """Stream lines for a job that is no longer running: its final LOD artifact, chunked"""
+    artifact = manifest_index.voxel_artifact(job_id, lod)
+    if artifact is None:
+        return None
+    scene = load_voxel_artifact(artifact)
+    res = artifact.get('res') or scene.get('res')
+
+    def _lines():
+        yield _stream_line({'type': 'meta', 'jobId': job_id, 'palette': scene.get('palette', []), 'replay': True})
+        seq = 0
+        for chunk in brick_chunks(as_voxel_array(scene.get('voxels', []))):
+            seq += 1
+            yield _stream_line({'type': 'voxels', 'seq': seq, 'lod': res, 'voxels': chunk})
+        yield _stream_line({'type': 'lod_ready', 'seq': seq + 1, 'lod': res, 'artifact': artifact})
+        yield _stream_line({'type': 'end', 'status': 'completed'})
+    return _lines()
+
+
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """
+    Progressive NDJSON stream of a job's voxels. Each part's voxels are sent
+    in brick-ordered chunks as soon as the part is generated, well before the
+    LOD artifact is merged and written. Lines:
+      {"type":"meta","jobId":...,"palette":[...]}
+      {"type":"voxels","seq":n,"lod":64,"part":"body","voxels":[[x,y,z,c],...]}
+      {"type":"lod_ready","seq":n,"lod":64,"artifact":{...}}
+      {"type":"ping"}                 keepalive while nothing new happened
+      {"type":"end","status":"completed"|"failed"}
+    Query options: lod=<res> only that LOD, since=<seq> resume after a seq.
+    Finished jobs replay their final artifact in the same format.
+    """
+    try:
+        lod = _lod_arg(request.args.get('lod'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    since = request.args.get('since', 0, type=int)
+    with jobs_lock:
+        job = jobs.get(job_id)
+        stream = job_streams.get(job_id)
+        if stream is None and job is not None and job.get('status') in ('queued', 'running'):
+            # attach before the run starts; run_job picks this stream up
+            stream = job_streams.setdefault(job_id, VoxelStream())
+    if stream is None:
+        lines = _replay_artifact_stream(job_id, lod)
+        if lines is None:
+            return jsonify({'error': 'job not found'}), 404
+    else:
+        def _follow():
+            yield _stream_line({'type': 'meta', 'jobId': job_id, 'palette': VOXEL_PALETTE})
+            for seq, entry in stream.follow(since, timeout=STREAM_HEARTBEAT_S):
+                if entry is None:
+                    yield _stream_line({'type': 'ping'})
+                elif lod is None or entry.get('lod') == lod:
+                    yield _stream_line(dict(entry, seq=seq))
+            yield _stream_line({'type': 'end', 'status': stream.status})
+        lines = _follow()
+    return Response(lines, mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _wants_binary_voxels() -> bool:
+    # Only when the client names the binary type explicitly; */* keeps getting JSON
+    accept = request.accept_mimetypes
+    return any(mt == BINARY_MEDIA_TYPE and q > 0 for mt, q in accept) and \
+        accept[BINARY_MEDIA_TYPE] >= accept['application/json']
+
+
+# Artifact files named by a content/asset hash never change once written
+HASHED_ARTIFACT = re.compile(r'^(?:shapee_)?[0-9a-f]{12,64}$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ARTIFACT_MEDIA_TYPES = {BINARY_EXT: BINARY_MEDIA_TYPE, DELTA_EXT: DELTA_MEDIA_TYPE, '.glb': 'model/gltf-binary',
+                        '.vox': 'application/octet-stream'}
+# .bvox/.vdelta are zlib-compressed already; these get .gz/.br siblings
+PRECOMPRESSED_EXTS = ('.json', '.glb', '.vox')
+
+
+def _accepted_encoding(path: str, immutable: bool) -> Optional[str]:
+    """Best precompressed sibling of path the client accepts (br before gzip)"""
+    # Ranges address the identity bytes; never mix them with a Content-Encoding
+    if 'Range' in request.headers:
+        return None
+    accept = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding not in ENCODERS or not accept[encoding]:
+            continue
+        if os.path.exists(path + ENCODING_EXT[encoding]):
+            return encoding
+        if immutable:
+            # older artifact without siblings: serve identity now, compress in the background
+            artifact_writer.precompress_file(path)
+    return None
+
+
+def _send_artifact(directory: str, fname: str, vary: str = 'Accept-Encoding'):
+    """
+    Send an artifact file with a strong ETag, a precompressed sibling when the
+    client accepts one, and long-lived immutable caching for hashed names.
+    Conditional (If-None-Match -> 304) and Range (-> 206) requests are
+    answered by send_file.
+    """
+    path = safe_join(directory, fname)
+    if path is None or not os.path.isfile(path):
+        return jsonify({'error': 'artifact not found'}), 404
+    stem, ext = os.path.splitext(fname)
+    immutable = bool(HASHED_ARTIFACT.match(stem))
+    encoding = _accepted_encoding(path, immutable) if ext in PRECOMPRESSED_EXTS else None
+    mimetype = ARTIFACT_MEDIA_TYPES.get(ext) or mimetypes.guess_type(fname)[0] or 'application/octet-stream'
+    send_path = path + ENCODING_EXT[encoding] if encoding else path
+    # hashed names make the ETag a pure function of the name and representation;
+    # anything else falls back to werkzeug's mtime/size/path tag
+    etag = f'{fname}+{encoding}' if immutable and encoding else (fname if immutable else True)
+    resp = send_file(send_path, mimetype=mimetype, etag=etag, conditional=True)
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache'
+    resp.headers['Vary'] = vary
+    return resp
+
+
+def _serve_voxel_artifact(fname: str):
+    stem, ext = os.path.splitext(fname)
+    if ext == '.json' and _wants_binary_voxels():
+        ext = BINARY_EXT
+    if ext == BINARY_EXT:
+        bin_path = safe_join(VOXEL_DIR, f'{stem}{BINARY_EXT}')
+        json_path = safe_join(VOXEL_DIR, f'{stem}.json')
+        if bin_path is None or json_path is None:
+            return jsonify({'error': 'artifact not found'}), 404
+        if not os.path.exists(bin_path) and os.path.exists(json_path):
+            # Artifacts from before the binary format: convert once and keep the sibling
+            try:
+                atomic_write(bin_path, encode_scene(read_json(json_path), compression=VOXEL_COMPRESSION),
+                             fsync=ARTIFACT_FSYNC)
+            except Exception:
+                ext = '.json'
+    return _send_artifact(VOXEL_DIR, f'{stem}{ext}', vary='Accept, Accept-Encoding')
+
+
 @app.route('/artifacts/<path:subpath>', methods=['GET'])
 def serve_artifact(subpath):
-    # subpath like 'voxels/<file>.json' or others later
+    # subpath like 'voxels/<file>.json' (or .bvox), 'glb/<file>.glb', 'vox/<file>.vox'
     base, _, fname = subpath.partition('/')
     if base == 'voxels':
-        return send_from_directory(VOXEL_DIR, fname)
+        return _serve_voxel_artifact(fname)
     if base == 'glb':
-        return send_from_directory(GLB_DIR, fname)
+        return _send_artifact(GLB_DIR, fname)
     if base == 'vox':
-        return send_from_directory(VOX_DIR, fname)
+        return _send_artifact(VOX_DIR, fname)
     return jsonify({'error': 'unknown artifact type'}), 404
 
 
@@ -924,103 +1795,191 @@ def _palette_index_for_color(palette: List[str], color: str) -> int:
     return int(names.get(c, 0))
 
 
-def _apply_voxel_edit(voxel_scene: Dict[str, Any], instruction: str, plan: Dict[str, Any] = None) -> Dict[str, Any]:
-    voxels = voxel_scene.get('voxels', [])
-    palette = voxel_scene.get('palette', [])
-    res = int(voxel_scene.get('res', 64))
-    text = (instruction or '').lower()
+_COORD = r"(-?\d+)\s*,?\s*(-?\d+)\s*,?\s*(-?\d+)"
+_COLOR = r"(?:\s+colou?r\s+([#a-z0-9]+))?"
 
-    # Index for quick lookups
-    occupied = {(int(v.get('x')), int(v.get('y')), int(v.get('z'))): i for i,v in enumerate(voxels)}
-
-    def add_block(x:int,y:int,z:int,cidx:int):
-        key = (x,y,z)
-        if key in occupied:
-            voxels[occupied[key]]['c'] = cidx
-            return
-        voxels.append({'x': x, 'y': y, 'z': z, 'c': cidx})
-        occupied[key] = len(voxels)-1
-
-    def remove_block(x:int,y:int,z:int):
-        key = (x,y,z)
-        idx = occupied.get(key)
-        if idx is None:
-            return
-        voxels[idx] = voxels[-1]
-        moved = voxels[idx]
-        occupied[(int(moved['x']), int(moved['y']), int(moved['z']))] = idx
-        voxels.pop()
-        occupied.pop(key, None)
-
-    def extend_along(axis:int, direction:int, steps:int):
-        # Duplicate edge voxels along axis
-        coords = [(int(v['x']), int(v['y']), int(v['z']), int(v['c'])) for v in voxels]
-        if not coords:
-            return
-        minv = min(c[axis] for c in coords)
-        maxv = max(c[axis] for c in coords)
-        target_edge = minv if direction < 0 else maxv
-        edge = [c for c in coords if c[axis] == target_edge]
-        for s in range(1, steps+1):
-            for (x,y,z,c) in edge:
-                newc = [x,y,z]
-                newc[axis] = newc[axis] + s*direction
-                if 0 <= newc[axis] < res:
-                    add_block(int(newc[0]), int(newc[1]), int(newc[2]), c)
-
-    # 1) explicit add/remove block
-    import re
-    m = re.search(r"add\s+(?:a\s+)?block\s+at\s+(-?\d+)\s*,?\s*(-?\d+)\s*,?\s*(-?\d+)(?:\s+color\s+([#a-z0-9]+))?", text)
+
+def parse_voxel_edit(instruction: str, palette: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Natural-language voxel edit -> structured op (see apply_voxel_op), or None
+    when nothing matches. Understood:
+      add block at X,Y,Z [color C] / remove block at X,Y,Z
+      paint|erase|fill box X,Y,Z to X,Y,Z [color C]
+      paint|erase|fill sphere at X,Y,Z [color C] [radius R]
+      paint|erase|fill near X,Y,Z [color C] [radius R]   (Manhattan distance)
+      make the tail|neck|left wing|... [much] longer [tapered]
+      stretch|scale the tail|... by F | Fx | xF | F times | P%
+    """
+    text = (instruction or '').lower()
+    m = re.search(rf"add\s+(?:a\s+)?block\s+at\s+{_COORD}{_COLOR}", text)
     if m:
-        x,y,z = int(m.group(1)), int(m.group(2)), int(m.group(3))
-        color = m.group(4) or '#ff0000'
-        cidx = _palette_index_for_color(palette, color)
-        add_block(x,y,z,cidx)
-        voxel_scene['voxels'] = voxels
-        return voxel_scene
-    m = re.search(r"remove\s+(?:a\s+)?block\s+at\s+(-?\d+)\s*,?\s*(-?\d+)\s*,?\s*(-?\d+)", text)
+        return {'op': 'add', 'at': [int(g) for g in m.groups()[:3]],
+                'c': _palette_index_for_color(palette, m.group(4) or '#ff0000')}
+    m = re.search(rf"remove\s+(?:a\s+)?block\s+at\s+{_COORD}", text)
     if m:
-        x,y,z = int(m.group(1)), int(m.group(2)), int(m.group(3))
-        remove_block(x,y,z)
-        voxel_scene['voxels'] = voxels
-        return voxel_scene
+        return {'op': 'remove', 'at': [int(g) for g in m.groups()[:3]]}
 
-    # 2) recolor region: "paint near x,y,z color blue" (simple radius)
-    m = re.search(r"paint\s+near\s+(-?\d+)\s*,?\s*(-?\d+)\s*,?\s*(-?\d+)\s+color\s+([#a-z0-9]+)\s*(?:r(?:adius)?\s*(\d+))?", text)
+    m = re.search(rf"(paint|erase|fill)\s+box\s+(?:from\s+)?{_COORD}\s+to\s+{_COORD}{_COLOR}", text)
     if m:
-        cx,cy,cz = int(m.group(1)), int(m.group(2)), int(m.group(3))
-        color = m.group(4)
-        rad = int(m.group(5) or 2)
-        cidx = _palette_index_for_color(palette, color)
-        for v in voxels:
-            if (abs(int(v['x'])-cx) + abs(int(v['y'])-cy) + abs(int(v['z'])-cz)) <= rad:
-                v['c'] = cidx
-        voxel_scene['voxels'] = voxels
-        return voxel_scene
+        region = {'shape': 'box', 'min': [int(g) for g in m.groups()[1:4]], 'max': [int(g) for g in m.groups()[4:7]]}
+        color = m.group(8)
+    else:
+        m = re.search(rf"(paint|erase|fill)\s+(sphere|near)\s+(?:at\s+)?{_COORD}{_COLOR}\s*(?:r(?:adius)?\s*(\d+))?", text)
+        region = color = None
+        if m:
+            region = {'shape': m.group(2), 'center': [int(g) for g in m.groups()[2:5]], 'radius': int(m.group(7) or 2)}
+            color = m.group(6)
+    if region is not None and (m.group(1) == 'erase' or color):
+        op = {'op': m.group(1), 'region': region}
+        if color:
+            op['c'] = _palette_index_for_color(palette, color)
+        return op
+
+    part = _part_from_text(text)
+    factor = _scale_factor(text) if _SCALE_VERB.search(text) else None
+    if factor is not None and part:
+        return {'op': 'scale', 'part': part, 'factor': factor}
+    if 'longer' in text and part:
+        op = {'op': 'extend', 'part': part, 'steps': 3 if 'much' in text or 'very' in text else 2}
+        if 'taper' in text:
+            op['taper'] = 0.5
+        return op
+    return None
+
+
+_PART_WORDS = ('tail', 'neck', 'head', 'nose', 'horns', 'spikes', 'body')
+# whole words only: "ahead" is not the head, "somebody" not the body
+_PART_PATTERNS = [(word, re.compile(rf'\b{word}\b')) for word in _PART_WORDS]
+_LIMB_PATTERNS = [(f'{side}_{limb}', re.compile(rf'\b{side}[ _]{limb}s?\b'))
+                  for side in ('left', 'right') for limb in ('wing', 'leg')]
+_WING = re.compile(r'\bwings?\b')
+_LEG = re.compile(r'\blegs?\b')
+
+
+_SCALE_VERB = re.compile(r'\b(?:stretch|scale)\b')
+# only numbers marked as a factor count: "stretch the tail 2 blocks" has none
+_SCALE_FACTOR = re.compile(r'\bby\s+(\d+(?:\.\d+)?)\s*(%|x\b|times\b)?'
+                           r'|(?<![\w.])(\d+(?:\.\d+)?)\s*(%|x\b|times\b)'
+                           r'|\bx\s*(\d+(?:\.\d+)?)\b')
+
+
+def _scale_factor(text: str) -> Optional[float]:
+    m = _SCALE_FACTOR.search(text)
+    if not m:
+        return None
+    value = float(m.group(1) or m.group(3) or m.group(5))
+    return value / 100.0 if (m.group(2) or m.group(4)) == '%' else value
 
-    # 3) semantic extension: "make tail longer"; if plan present, extend bbox for 'tail' along x+
-    if 'longer' in text and ('tail' in text or 'nose' in text or 'wing' in text):
-        axis = 0
-        direction = 1
-        steps = 2
-        if plan and plan.get('parts'):
-            target = 'tail' if 'tail' in text else ('left_wing' if 'left' in text else 'right_wing' if 'wing' in text else None)
-            if target:
-                # extend near bbox max along x for tail and wings
-                steps = 3 if 'much' in text or 'very' in text else 2
-                # naive: just extend whole model edge; future: filter to bbox
-        extend_along(axis, direction, steps)
-        voxel_scene['voxels'] = voxels
-        return voxel_scene
 
-    # Default no-op: return unchanged
+def _part_from_text(text: str) -> Optional[str]:
+    for part, pattern in _LIMB_PATTERNS + _PART_PATTERNS:
+        if pattern.search(text):
+            return part
+    if _WING.search(text):
+        return 'right_wing'
+    if _LEG.search(text):
+        return 'right_leg'
+    return None
+
+
+def _part_target(store: BrickStore, op: Dict[str, Any], plan: Optional[Dict[str, Any]]):
+    """
+    (voxels, axis, direction) an extend/scale op works on. The part's voxels
+    are the cells in its plan bbox (rescaled to the artifact's LOD) painted
+    with the part's palette colors, so neighbours reaching into the bbox stay
+    put; axis/direction default to pointing away from the model center.
+    Without a matching plan part the whole grid along +x is used, as edits
+    always did.
+    """
+    res = int(store.meta.get('res', 64))
+    bbox = next((p.get('bbox') for p in (plan or {}).get('parts') or [] if p.get('id') == op.get('part')), None)
+    if bbox is None:
+        box, axis, direction, colors = Box([0, 0, 0], [res - 1] * 3), 0, 1, None
+    else:
+        scaled = scale_bbox(bbox, int((plan or {}).get('resolution') or res), res)
+        mn, mx = scaled['min'], scaled['max']
+        box = Box(mn, mx)
+        offset = [(a + b) / 2.0 - res / 2.0 for a, b in zip(mn, mx)]
+        axis = int(np.argmax(np.abs(offset)))
+        direction = 1 if offset[axis] >= 0 else -1
+        colors = part_colors(op.get('part'))
+    if op.get('axis') is not None:
+        axis = int(op['axis'])
+    if op.get('direction') is not None:
+        direction = 1 if int(op['direction']) >= 0 else -1
+    voxels = store.query(box)
+    if colors is not None:
+        voxels = voxels[np.isin(voxels[:, 3], colors)]
+    return voxels, axis, direction
+
+
+# upper bound on the bbox cells of one fill op, after clipping to the grid
+EDIT_REGION_MAX_CELLS = int(os.getenv('EDIT_REGION_MAX_CELLS', str(1 << 22)))
+
+
+def apply_voxel_op(store: BrickStore, op: Dict[str, Any], plan: Dict[str, Any] = None) -> int:
+    """
+    Apply one structured edit op to a brick store; returns the number of cells
+    touched. Region ops only read the bricks their region overlaps.
+    Colors are palette indices ('c') or names/hex ('color'). Raises ValueError
+    for malformed ops.
+    """
+    kind = op.get('op')
+    palette = store.meta.get('palette', [])
+    try:
+        c = int(op['c']) if op.get('c') is not None else _palette_index_for_color(palette, str(op.get('color') or '#ff0000'))
+        res = int(store.meta.get('res', 64))
+        if kind == 'add':
+            at = [int(v) for v in op['at'][:3]]
+            if len(at) != 3 or not all(0 <= v < res for v in at):
+                raise ValueError(f'add at {at} is outside the {res}^3 grid')
+            store.set(*at, c)
+            return 1
+        if kind == 'remove':
+            return int(store.remove(*[int(v) for v in op['at'][:3]]))
+        if kind in ('paint', 'erase', 'fill'):
+            # nothing lives outside the grid, and fill must not write there
+            region = region_from_dict(op['region']).clip(res)
+            if kind == 'fill' and region.volume > EDIT_REGION_MAX_CELLS:
+                raise ValueError(f'fill region spans {region.volume} cells (at most {EDIT_REGION_MAX_CELLS})')
+            if kind == 'erase':
+                return store.erase(region)
+            return store.paint(region, c) if kind == 'paint' else store.fill(region, c)
+        if kind in ('extend', 'scale'):
+            part, axis, direction = _part_target(store, op, plan)
+            if kind == 'extend':
+                grown = clip_to_grid(extrude(part, axis, direction, int(op.get('steps', 2)),
+                                             float(op.get('taper', 0.0)), res=res), res)
+                store.set_many(grown, overwrite=True)
+                return len(grown)
+            factor = float(op['factor'])
+            if not (math.isfinite(factor) and factor > 0):
+                raise ValueError(f'scale factor must be a positive number, got {op["factor"]}')
+            scaled = clip_to_grid(stretch(part, axis, direction, factor, res=res), res)
+            store.remove_many(part)
+            store.set_many(scaled, overwrite=True)
+            return len(scaled)
+    except (KeyError, TypeError, IndexError) as e:
+        raise ValueError(f'malformed {kind} op: {e}') from e
+    raise ValueError(f'unknown edit op: {kind}')
+
+
+def _apply_voxel_edit(voxel_scene: Dict[str, Any], instruction: str, plan: Dict[str, Any] = None) -> Dict[str, Any]:
+    op = parse_voxel_edit(instruction, voxel_scene.get('palette', []))
+    if op is None:
+        # Default no-op: return unchanged
+        return voxel_scene
+    # Sparse brick store gives O(1) lookups and region queries; built only once an instruction matches
+    store = BrickStore.from_scene(voxel_scene)
+    apply_voxel_op(store, op, plan)
+    voxel_scene['voxels'] = voxels_to_dicts(store.to_array())
     return voxel_scene
 
 
 def _apply_primitive_edit(scene: Dict[str, Any], instruction: str) -> Dict[str, Any]:
     # Minimal edits to primitive-based scenes
     try:
-        s = json.loads(json.dumps(scene))
+        s = serializer.loads(serializer.dumps(scene))
     except Exception:
         return scene
     text = (instruction or '').lower()
@@ -1059,51 +2018,471 @@ def _apply_primitive_edit(scene: Dict[str, Any], instruction: str) -> Dict[str,
     return s
 
 
+# upper bound on ops per batch edit request
+EDIT_BATCH_MAX = int(os.getenv('EDIT_BATCH_MAX', '256'))
+
+
+def apply_voxel_ops(store: BrickStore, ops: List[Any], plan: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """
+    Apply an ordered list of edits to one store: op dicts (see apply_voxel_op)
+    or natural-language instructions. Instructions that parse to nothing are
+    reported as not applied. Raises ValueError naming the first bad op; the
+    store may then be partly edited, so callers pass a private copy.
+    """
+    palette = store.meta.get('palette', [])
+    results = []
+    for i, raw in enumerate(ops):
+        op = parse_voxel_edit(raw, palette) if isinstance(raw, str) else raw
+        if op is None:
+            results.append({'index': i, 'applied': False})
+            continue
+        if not isinstance(op, dict):
+            raise ValueError(f'op {i}: expected an instruction string or an op object')
+        try:
+            cells = apply_voxel_op(store, op, plan)
+        except ValueError as e:
+            raise ValueError(f'op {i}: {e}') from e
+        results.append({'index': i, 'applied': True, 'op': op.get('op'), 'cells': cells})
+    return results
+
+
+def _batch_ops(data: Dict[str, Any]):
+    ops = data.get('ops')
+    if not isinstance(ops, list) or not ops:
+        return None, (jsonify({'error': 'ops must be a non-empty list'}), 400)
+    if len(ops) > EDIT_BATCH_MAX:
+        return None, (jsonify({'error': f'at most {EDIT_BATCH_MAX} ops per batch'}), 400)
+    return ops, None
+
+
+def _wants_voxels() -> bool:
+    # Edit responses inline the whole edited scene only on request; it is O(model)
+    return request.args.get('voxels') == '1'
+
+
+def _edit_changes(removed: np.ndarray, upserts: np.ndarray) -> Dict[str, Any]:
+    """Cells an edit removed ([x, y, z]) and set (voxel dicts), for clients patching their copy"""
+    return {'removed': np.asarray(removed).tolist(), 'set': voxels_to_dicts(upserts)}
+
+
 @app.route('/edit', methods=['POST'])
 def generic_edit():
+    """
+    Edit an inline scene: {"voxel": {...}, "instruction": "..."} or, for a
+    batch, {"voxel": {...}, "ops": [...]}; {"scene": {...}} edits primitives.
+    Batches answer with the changed cells; ?voxels=1 adds the edited scene.
+    """
     data = request.json or {}
     instruction = data.get('instruction') or data.get('prompt') or ''
     if 'voxel' in data or 'voxels' in (data.get('voxel') or {}):
         voxel_scene = data.get('voxel') or data
         plan = data.get('plan')
-        updated = _apply_voxel_edit(voxel_scene, instruction, plan)
-        return jsonify({'voxel': updated})
+        if 'ops' not in data:
+            try:
+                updated = _apply_voxel_edit(voxel_scene, instruction, plan)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({'voxel': updated})
+        ops, error = _batch_ops(data)
+        if error:
+            return error
+        store = BrickStore.from_scene(voxel_scene)
+        try:
+            results = apply_voxel_ops(store, ops, plan)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        body = {'results': results, 'changes': _edit_changes(*store.diff())}
+        if _wants_voxels():
+            body['voxel'] = dict(store.meta, voxels=voxels_to_dicts(store.to_array()))
+        return jsonify(body)
     if 'scene' in data:
         updated = _apply_primitive_edit(data['scene'], instruction)
         return jsonify({'scene': updated})
     return jsonify({'error': 'nothing to edit'}), 400
 
 
+# serializes edit-history appends (requests, edit sessions and their idle sweeper)
+edit_history_lock = threading.RLock()
+
+
+def _record_edit(job_id: str, manifest: Dict[str, Any], base: Dict[str, Any], chain: List[Dict[str, Any]],
+                 store: BrickStore, removed: np.ndarray, upserts: np.ndarray, entry: Dict[str, Any],
+                 scene: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Append an edit that moved base's chain to `store`: write its .vdelta (and
+    a keyframe artifact every EDIT_KEYFRAME_EVERY-th edit), index `store` as
+    the new state and write the manifest. `store` must not be edited
+    afterwards. Returns the manifest edit entry.
+    """
+    data = encode_delta(removed, upserts)
+    parent = chain[-1]['hash'] if chain else _artifact_key(base)
+    state = delta_hash(parent, data)
+    artifact_writer.submit(os.path.join(VOXEL_DIR, f'{state}{DELTA_EXT}'), lambda: data).result()
+    keyframe = None
+    if (len(chain) + 1) % EDIT_KEYFRAME_EVERY == 0:
+        keyframe = write_voxel_artifact(state, scene or dict(store.meta, voxels=voxels_to_dicts(store.to_array())))
+    store.compact()
+    store.mark_clean()
+    # the edited store is the pristine index of the new state: the next edit starts from it
+    _remember_index(state, store)
+    edits = list(manifest.get('edits') or [])
+    record = dict(entry, base=_artifact_key(base), parent=parent, hash=state,
+                  delta={'path': f'/artifacts/voxels/{state}{DELTA_EXT}', 'bytes': len(data),
+                         'removed': int(len(removed)), 'set': int(len(upserts))},
+                  keyframe=keyframe, artifact={'path': f'/jobs/{job_id}/edits/{len(edits)}/voxels', 'hash': state},
+                  at=datetime.utcnow().isoformat())
+    manifest_index.write(job_id, dict(manifest, edits=edits + [record]))
+    return record
+
+
+def _lod_arg(value: Any) -> Optional[int]:
+    """LOD resolution from a request field (None when absent); ValueError unless a positive integer"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'invalid lod: {value!r}')
+    try:
+        lod = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'invalid lod: {value!r}') from None
+    if lod <= 0:
+        raise ValueError(f'invalid lod: {value!r}')
+    return lod
+
+
+def _edit_job(job_id: str, ops: List[Any], lod: Any, entry: Dict[str, Any]):
+    """
+    Apply ops to the latest state of a job's voxel artifact (the given LOD,
+    else the default one) and append one entry to the manifest's edits. The
+    entry stores a .vdelta of the changed cells against the previous state;
+    every EDIT_KEYFRAME_EVERY-th edit of a chain also writes a full artifact.
+    The response carries only the changed cells; the edited state is served
+    from /jobs/<id>/edits/<n>/voxels (or inlined with ?voxels=1).
+    """
+    try:
+        lod = _lod_arg(lod)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with edit_history_lock:
+        manifest = manifest_index.get(job_id)
+        if manifest is None:
+            return jsonify({'error': 'job not found'}), 404
+        plan = manifest.get('plan')
+        vox_info = manifest_index.voxel_artifact(job_id, lod)
+        if not vox_info:
+            return jsonify({'error': 'no voxel artifact'}), 400
+        chain = edit_chain(manifest, vox_info)
+        try:
+            store = edit_state(vox_info, chain).copy()
+        except (OSError, VoxelDeltaError):
+            return jsonify({'error': 'artifact missing'}), 404
+        try:
+            results = apply_voxel_ops(store, ops, plan)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        removed, upserts = store.diff()
+        updated = dict(store.meta, voxels=voxels_to_dicts(store.to_array())) if _wants_voxels() else None
+        record = _record_edit(job_id, manifest, vox_info, chain, store, removed, upserts, entry, updated)
+    body = {'artifact': record['artifact'], 'delta': record['delta'], 'results': results,
+            'res': store.meta.get('res'), 'changes': _edit_changes(removed, upserts)}
+    if updated is not None:
+        body['voxel'] = updated
+    return jsonify(body)
+
+
+@app.route('/jobs/<job_id>/edits/<int:n>/voxels', methods=['GET'])
+def edited_voxels(job_id, n):
+    """
+    Voxel scene after manifest edit n, rebuilt on demand from the nearest
+    keyframe and the deltas after it (JSON, or .bvox when the client asks
+    for it). States are immutable, so the state hash is a strong ETag.
+    """
+    manifest = manifest_index.get(job_id)
+    edits = (manifest or {}).get('edits') or []
+    if not 0 <= n < len(edits) or not edits[n].get('delta'):
+        return jsonify({'error': 'edit not found'}), 404
+    base = _base_artifact(manifest, edits[n]['base'])
+    if base is None:
+        return jsonify({'error': 'artifact missing'}), 404
+    binary = _wants_binary_voxels()
+    etag = edits[n]['hash'] + (BINARY_EXT if binary else '.json')
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        try:
+            store = edit_state(base, edit_chain(manifest, base, n + 1))
+        except (OSError, VoxelDeltaError):
+            return jsonify({'error': 'artifact missing'}), 404
+        if binary:
+            body = encode_scene(dict(store.meta, voxels=store.to_array()), compression=VOXEL_COMPRESSION)
+            resp = Response(body, mimetype=BINARY_MEDIA_TYPE)
+        else:
+            resp = Response(json_bytes(dict(store.meta, voxels=voxels_to_dicts(store.to_array()))),
+                            mimetype='application/json')
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    resp.headers['Vary'] = 'Accept'
+    return resp
+
+
 @app.route('/jobs/<job_id>/edit', methods=['POST'])
 def edit_job_artifact(job_id):
     # Load manifest and voxel artifact, apply instruction, write new artifact
     data = request.json or {}
     instruction = data.get('instruction') or ''
-    manifest_path = os.path.join(MANIFEST_DIR, f'{job_id}.json')
-    if not os.path.exists(manifest_path):
+    return _edit_job(job_id, [instruction], data.get('lod'), {'instruction': instruction})
+
+
+@app.route('/jobs/<job_id>/edits', methods=['POST'])
+def batch_edit_job_artifact(job_id):
+    """
+    Apply an ordered batch of edits in one request:
+    {"ops": ["add block at 1,2,3 color red",
+             {"op": "fill", "region": {"shape": "box", "min": [0,0,0], "max": [3,3,3]}, "color": "blue"},
+             {"op": "extend", "part": "tail", "steps": 4, "taper": 0.5}],
+     "lod": 64}
+    The ops share one indexed working copy and produce one artifact and one
+    manifest edit entry; a malformed op rejects the whole batch with 400.
+    """
+    data = request.json or {}
+    ops, error = _batch_ops(data)
+    if error:
+        return error
+    return _edit_job(job_id, ops, data.get('lod'), {'ops': ops})
+
+# -----------------------------
+# Edit Sessions
+# -----------------------------
+# A session pins the latest state of one job LOD as a working copy; edits apply in
+# place and broadcast only the changed cells. Pending edits are committed as one
+# history entry on request, after EDIT_SESSION_IDLE_S without edits, or when the
+# pinned working copies exceed EDIT_SESSION_MAX_BYTES (least recently used first).
+EDIT_SESSION_IDLE_S = float(os.getenv('EDIT_SESSION_IDLE_S', '120'))
+EDIT_SESSION_MAX_BYTES = int(os.getenv('EDIT_SESSION_MAX_BYTES', str(256 * 1024 ** 2)))
+EDIT_SESSION_SWEEP_S = float(os.getenv('EDIT_SESSION_SWEEP_S', '5'))
+edit_session_open_lock = threading.Lock()
+
+
+def edit_session_room(session_id: str) -> str:
+    return f'edit:{session_id}'
+
+
+def _commit_session(session: EditSession, reason: str = 'commit') -> Optional[Dict[str, Any]]:
+    """
+    Append a session's pending edits to the job's edit history as one entry
+    and continue the session from the new state. If other edits landed on the
+    chain since the session's parent, its ops are replayed on top of them and
+    the difference to the old working copy goes out as a resync 'edit_delta'.
+    Returns the edit entry, or None when nothing was pending.
+    """
+    resync = None
+    with session.lock, edit_history_lock:
+        manifest = manifest_index.get(session.job_id)
+        if not session.ops or manifest is None:
+            return None
+        chain = edit_chain(manifest, session.base)
+        head = chain[-1]['hash'] if chain else _artifact_key(session.base)
+        if head == session.parent:
+            store = session.store
+            removed, upserts = store.diff(session.head, keys=session.touched)
+        else:
+            old = session.store
+            store = edit_state(session.base, chain).copy()
+            apply_voxel_ops(store, session.ops, manifest.get('plan'))
+            removed, upserts = store.diff()
+            # clients hold the old working copy; the other edits may have touched any brick
+            keys = set(old.bricks) | set(old.tiles) | set(store.bricks) | set(store.tiles)
+            resync = store.diff(old, keys=keys)
+        record = _record_edit(session.job_id, manifest, session.base, chain, store, removed, upserts,
+                              {'ops': list(session.ops), 'session': session.id})
+        session.rebase(record['hash'], store)
+        if resync is not None:
+            session.version += 1
+            resync = {'sessionId': session.id, 'jobId': session.job_id, 'version': session.version,
+                      'removed': resync[0].tolist(), 'set': resync[1].tolist(), 'resync': True}
+    if resync is not None:
+        socketio.emit('edit_delta', resync, room=edit_session_room(session.id))
+    socketio.emit('edit_session_committed', {'sessionId': session.id, 'jobId': session.job_id, 'reason': reason,
+                                             'edit': record}, room=edit_session_room(session.id))
+    return record
+
+
+def _close_session(session: EditSession, reason: str):
+    """
+    EditSessionManager close hook: commit what is pending, then tell the
+    session's clients. A failed commit is reported to them and re-raised so
+    the session stays open with its edits.
+    """
+    room = edit_session_room(session.id)
+    try:
+        record = _commit_session(session, reason)
+    except (OSError, VoxelDeltaError, ValueError) as e:
+        socketio.emit('edit_session_error', {'sessionId': session.id, 'jobId': session.job_id, 'reason': reason,
+                                             'message': f'commit failed: {e}'}, room=room)
+        raise
+    socketio.emit('edit_session_closed', {'sessionId': session.id, 'jobId': session.job_id, 'reason': reason,
+                                          'edit': record}, room=room)
+
+
+def _is_indexed(store: BrickStore) -> bool:
+    with edit_indexes_lock:
+        return any(indexed is store for indexed in edit_indexes.values())
+
+
+edit_sessions = EditSessionManager(idle_s=EDIT_SESSION_IDLE_S, max_bytes=EDIT_SESSION_MAX_BYTES,
+                                   close=_close_session, shared=_is_indexed)
+
+
+def _session_ops(data: Dict[str, Any]):
+    if 'ops' in data:
+        return _batch_ops(data)
+    instruction = data.get('instruction')
+    if not isinstance(instruction, str) or not instruction:
+        return None, (jsonify({'error': 'instruction or ops required'}), 400)
+    return [instruction], None
+
+
+def apply_session_ops(session: EditSession, ops: List[Any]) -> Dict[str, Any]:
+    """
+    Apply ops to a session's working copy and broadcast the changed cells to
+    its room as 'edit_delta'. Raises ValueError (nothing applied) or
+    EditSessionClosed.
+    """
+    plan = (manifest_index.get(session.job_id) or {}).get('plan')
+    t0 = time.perf_counter()
+    results, removed, upserts, version = session.apply(ops, lambda store, batch: apply_voxel_ops(store, batch, plan))
+    apply_ms = round((time.perf_counter() - t0) * 1000, 3)
+    delta = {'sessionId': session.id, 'jobId': session.job_id, 'version': version,
+             'removed': removed.tolist(), 'set': upserts.tolist()}
+    socketio.emit('edit_delta', delta, room=edit_session_room(session.id))
+    return dict(delta, results=results, apply_ms=apply_ms)
+
+
+@app.route('/sessions/stats', methods=['GET'])
+def edit_session_stats():
+    return jsonify(edit_sessions.stats())
+
+
+def _job_session(job_id: str, session_id: str) -> Optional[EditSession]:
+    session = edit_sessions.get(session_id)
+    return session if session is not None and session.job_id == job_id else None
+
+
+def _state_artifact(manifest: Dict[str, Any], base: Dict[str, Any], state: str) -> Dict[str, Any]:
+    """Artifact entry of a committed state: its edit's reconstruction, or the base LOD itself"""
+    for entry in reversed((manifest or {}).get('edits') or []):
+        if entry.get('hash') == state:
+            return entry['artifact']
+    return base
+
+
+@app.route('/jobs/<job_id>/sessions', methods=['POST'])
+def open_edit_session(job_id):
+    """
+    Open (or join the already open) edit session on a job LOD: {"lod": 64}.
+    Join the session's Socket.IO room, fetch `voxels` (the working copy as of
+    `version`, pending edits included), then apply 'edit_delta' events with a
+    higher version. `artifact` is the last committed state.
+    """
+    data = request.json or {}
+    try:
+        lod = _lod_arg(data.get('lod'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    manifest = manifest_index.get(job_id)
+    if manifest is None:
         return jsonify({'error': 'job not found'}), 404
-    manifest = read_json(manifest_path)
-    plan = manifest.get('plan')
-    vox_info = (manifest.get('artifacts') or {}).get('voxel_json')
+    vox_info = manifest_index.voxel_artifact(job_id, lod)
     if not vox_info:
         return jsonify({'error': 'no voxel artifact'}), 400
-    vox_file = vox_info['path'].split('/')[-1]
-    vox_path = os.path.join(VOXEL_DIR, vox_file)
-    if not os.path.exists(vox_path):
-        return jsonify({'error': 'artifact missing'}), 404
-    voxel_scene = read_json(vox_path)
-    updated = _apply_voxel_edit(voxel_scene, instruction, plan)
-    new_hash = hash_dict({'updated_from': vox_info.get('hash'), 'voxels': updated})
-    new_path = os.path.join(VOXEL_DIR, f'{new_hash}.json')
-    write_json(new_path, updated)
-    # update manifest with new derivative
-    manifest.setdefault('edits', []).append({
-        'instruction': instruction,
-        'artifact': {'path': f'/artifacts/voxels/{new_hash}.json', 'hash': new_hash},
-        'at': datetime.utcnow().isoformat()
-    })
-    write_json(manifest_path, manifest)
-    return jsonify({'voxel': updated, 'artifact': {'path': f'/artifacts/voxels/{new_hash}.json', 'hash': new_hash}})
+    with edit_session_open_lock:
+        session = edit_sessions.find(job_id, _artifact_key(vox_info))
+        if session is None:
+            chain = edit_chain(manifest, vox_info)
+            try:
+                head = edit_state(vox_info, chain)
+            except (OSError, VoxelDeltaError):
+                return jsonify({'error': 'artifact missing'}), 404
+            parent = chain[-1]['hash'] if chain else _artifact_key(vox_info)
+            session = edit_sessions.add(EditSession(job_id, vox_info, parent, head))
+            edit_sessions.start(EDIT_SESSION_SWEEP_S)
+    with session.lock:
+        artifact = _state_artifact(manifest_index.get(job_id), vox_info, session.parent)
+        return jsonify(dict(session.info(), artifact=artifact, res=session.store.meta.get('res'),
+                            voxels={'path': f'/jobs/{job_id}/sessions/{session.id}/voxels'}))
+
+
+@app.route('/jobs/<job_id>/sessions/<session_id>', methods=['GET', 'DELETE'])
+def edit_session(job_id, session_id):
+    """GET: session info. DELETE: commit pending edits (unless ?discard=1) and close"""
+    session = _job_session(job_id, session_id)
+    if session is None:
+        return jsonify({'error': 'session not found'}), 404
+    if request.method == 'GET':
+        return jsonify(session.info())
+    with session.lock:
+        if request.args.get('discard') == '1':
+            session.ops = []
+        try:
+            record = _commit_session(session, 'closed')
+            edit_sessions.close(session_id, 'closed')
+        except (OSError, VoxelDeltaError, ValueError) as e:
+            return jsonify({'error': f'commit failed: {e}'}), 409
+    return jsonify({'sessionId': session_id, 'closed': True, 'edit': record})
+
+
+@app.route('/jobs/<job_id>/sessions/<session_id>/voxels', methods=['GET'])
+def edit_session_voxels(job_id, session_id):
+    """
+    A session's working copy, pending edits included (JSON, or .bvox when
+    asked for). X-Edit-Session-Version is the last 'edit_delta' it contains.
+    """
+    session = _job_session(job_id, session_id)
+    if session is None:
+        return jsonify({'error': 'session not found'}), 404
+    with session.lock:
+        version = session.version
+        scene = dict(session.store.meta, voxels=session.store.to_array())
+    if _wants_binary_voxels():
+        resp = Response(encode_scene(scene, compression=VOXEL_COMPRESSION), mimetype=BINARY_MEDIA_TYPE)
+    else:
+        scene['voxels'] = voxels_to_dicts(scene['voxels'])
+        resp = Response(json_bytes(scene), mimetype='application/json')
+    resp.headers['X-Edit-Session-Version'] = str(version)
+    resp.headers['Cache-Control'] = 'no-store'
+    resp.headers['Vary'] = 'Accept'
+    return resp
+
+
+@app.route('/jobs/<job_id>/sessions/<session_id>/ops', methods=['POST'])
+def edit_session_apply(job_id, session_id):
+    """Apply {"instruction": "..."} or {"ops": [...]} to the session's working copy"""
+    session = _job_session(job_id, session_id)
+    if session is None:
+        return jsonify({'error': 'session not found'}), 404
+    ops, error = _session_ops(request.json or {})
+    if error:
+        return error
+    try:
+        return jsonify(apply_session_ops(session, ops))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except EditSessionClosed:
+        return jsonify({'error': 'session closed'}), 409
+
+
+@app.route('/jobs/<job_id>/sessions/<session_id>/commit', methods=['POST'])
+def edit_session_commit(job_id, session_id):
+    """Write pending edits to the job's edit history now; the session stays open"""
+    session = _job_session(job_id, session_id)
+    if session is None:
+        return jsonify({'error': 'session not found'}), 404
+    try:
+        record = _commit_session(session)
+    except (OSError, VoxelDeltaError, ValueError) as e:
+        return jsonify({'error': f'commit failed: {e}'}), 409
+    return jsonify(dict(session.info(), edit=record))
+
 
 # -----------------------------
 # WebSocket Events
@@ -1125,6 +2504,84 @@ def handle_disconnect():
             del users_in_room[request.sid]
             socketio.emit('user_left', {'user_id': request.sid}, room=room_id)
 
+@socketio.on('subscribe_job')
+def handle_subscribe_job(data):
+    """
+    Stream a job's events to this client: {"job_id": ..., "since": <seq>}.
+    Entries after `since` are replayed first, then live events arrive through
+    the job room. Replay and live delivery can overlap by a few entries;
+    clients drop anything with seq <= the last one they applied.
+    """
+    data = data or {}
+    job_id = data.get('job_id')
+    try:
+        since = int(data.get('since') or 0)
+    except (TypeError, ValueError):
+        since = 0
+    # join before snapshotting so nothing falls between replay and live events
+    join_room(job_room(job_id))
+    with jobs_lock:
+        job = jobs.get(job_id)
+        missed = [e for e in job.get('progress', []) if e.get('seq', 0) > since] if job else []
+        status = job.get('status') if job else None
+        seq = job.get('seq', 0) if job else 0
+    if job is None:
+        leave_room(job_room(job_id))
+        if job_id and job_id in manifest_index:
+            emit('job_subscribed', {'jobId': job_id, 'status': 'completed', 'seq': 0})
+        else:
+            emit('error', {'message': 'Job not found'})
+        return
+    for entry in missed:
+        emit(JOB_EVENTS[entry.get('event', 'progress')], _job_event_payload(job_id, entry))
+    emit('job_subscribed', {'jobId': job_id, 'status': status, 'seq': seq, 'replayed': len(missed)})
+
+
+@socketio.on('unsubscribe_job')
+def handle_unsubscribe_job(data):
+    leave_room(job_room((data or {}).get('job_id')))
+
+
+@socketio.on('join_edit_session')
+def handle_join_edit_session(data):
+    """Receive a session's 'edit_delta' events: {"session_id": ...}"""
+    session = edit_sessions.get((data or {}).get('session_id'))
+    if session is None:
+        emit('error', {'message': 'Edit session not found'})
+        return
+    join_room(edit_session_room(session.id))
+    emit('edit_session_joined', session.info())
+
+
+@socketio.on('leave_edit_session')
+def handle_leave_edit_session(data):
+    leave_room(edit_session_room((data or {}).get('session_id')))
+
+
+@socketio.on('edit_session_ops')
+def handle_edit_session_ops(data):
+    """
+    Apply edits over the socket: {"session_id": ..., "ops": [...]} or
+    {"session_id": ..., "instruction": "..."}. The sender gets
+    'edit_session_applied' with per-op results; the room gets 'edit_delta'.
+    """
+    data = data or {}
+    session = edit_sessions.get(data.get('session_id'))
+    if session is None:
+        emit('error', {'message': 'Edit session not found'})
+        return
+    ops = data.get('ops') if 'ops' in data else [data.get('instruction') or '']
+    if not isinstance(ops, list) or not ops or len(ops) > EDIT_BATCH_MAX:
+        emit('error', {'message': f'ops must be a list of 1 to {EDIT_BATCH_MAX} edits'})
+        return
+    try:
+        out = apply_session_ops(session, ops)
+    except (ValueError, EditSessionClosed) as e:
+        emit('error', {'message': f'edit rejected: {e}', 'sessionId': session.id})
+        return
+    emit('edit_session_applied', {k: out[k] for k in ('sessionId', 'version', 'results', 'apply_ms')})
+
+
 @socketio.on('join_scene')
 def handle_join_scene(data):
     token = data.get('token')
@@ -1270,10 +2727,26 @@ else:
 # -----------------------------
 # Main
 # -----------------------------
-if __name__ == "__main__":
+def main():
+    """
+    Run the development server (launched through server.py). Hosts that
+    import app recover interrupted jobs on their first request instead.
+    """
     print("[LOG] Starting Flask-SocketIO server on http://0.0.0.0:5069")
+    # FLASK_DEBUG=0 serves without the debugger and the reloader
+    debug = os.getenv('FLASK_DEBUG', '1') == '1'
+    # with the reloader this process only watches files and the child it starts serves
+    if not debug or is_running_from_reloader():
+        print(f"[LOG] Job recovery: {recover_jobs_once()}")
     try:
-        socketio.run(app, debug=True, host='0.0.0.0', port=5069, allow_unsafe_werkzeug=True)
+        socketio.run(app, debug=debug, use_reloader=debug, host='0.0.0.0', port=5069, allow_unsafe_werkzeug=True)
     finally:
+        artifact_cache.flush()
         if AGENT_SYSTEM_AVAILABLE:
             shutdown_agents()
+
+
+if __name__ == "__main__":
+    # prefer `python server.py`: PART_BACKEND=process workers re-import the launching
+    # script, and importing this module repeats all of the startup above in each of them
+    main()
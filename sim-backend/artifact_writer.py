@@ -0,0 +1,181 @@
+"""
+Artifact writer
+Crash-safe file writes (temp file in the target directory, optional fsync,
+atomic rename) and a background writer thread that takes serialization and
+disk I/O off the job thread. Writes submitted with coalesce=True replace a
+still-pending write of the same path, so a manifest updated after every LOD
+hits the disk once per flush instead of once per update. Writes submitted
+with precompress=True also get .gz (and .br, with brotli installed) siblings
+for HTTP serving; siblings land before the file itself.
+"""
+
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from concurrent.futures import Future
+import gzip
+import os
+import queue
+import tempfile
+import threading
+import time
+
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+# Content-Encoding -> sibling suffix
+ENCODING_EXT = {'br': '.br', 'gzip': '.gz'}
+# below this, compression is not worth a second request path
+PRECOMPRESS_MIN_BYTES = 1024
+
+
+# mtime=0 keeps the .gz bytes a pure function of the content
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {
+    'gzip': lambda data: gzip.compress(data, compresslevel=6, mtime=0),
+}
+if brotli is not None:
+    ENCODERS['br'] = lambda data: brotli.compress(data, quality=5)
+
+
+def precompressed(data: bytes) -> Dict[str, bytes]:
+    """Content-Encoding -> compressed payload for every available encoder"""
+    if len(data) < PRECOMPRESS_MIN_BYTES:
+        return {}
+    return {encoding: encode(data) for encoding, encode in ENCODERS.items()}
+
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def atomic_write(path: str, data: bytes, fsync: bool = False):
+    """Write bytes so readers see either the old file or the complete new one"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        # persist the rename itself
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+
+class ArtifactWriter:
+    """
+    Single background thread draining a queue of (path, render) writes.
+    render() returns the bytes and runs on the writer thread; each submit
+    returns a Future resolving to that write's wall time in ms.
+    background=False writes inline (tests, tooling).
+    """
+
+    def __init__(self, fsync: bool = False, background: bool = True):
+        self.fsync = fsync
+        self.background = background
+        self._queue: 'queue.Queue[str]' = queue.Queue()
+        # key -> (render, precompress, future) for writes not yet picked up
+        self._pending: Dict[str, Tuple[Callable[[], bytes], bool, Future]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+        self.coalesced = 0
+        self.bytes = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def _write(self, path: str, render: Callable[[], bytes], precompress: bool = False) -> float:
+        t0 = time.perf_counter()
+        data = render()
+        written = len(data)
+        if precompress:
+            for encoding, blob in precompressed(data).items():
+                atomic_write(path + ENCODING_EXT[encoding], blob, fsync=self.fsync)
+                written += len(blob)
+        atomic_write(path, data, fsync=self.fsync)
+        ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self.writes += 1
+            self.bytes += written
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+        return round(ms, 2)
+
+    def submit(self, path: str, render: Callable[[], bytes], coalesce: bool = False,
+               precompress: bool = False) -> Future:
+        if not self.background:
+            fut: Future = Future()
+            fut.set_result(self._write(path, render, precompress))
+            return fut
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='artifact-writer', daemon=True)
+                self._thread.start()
+            if coalesce and path in self._pending:
+                _, _, fut = self._pending[path]
+                self._pending[path] = (render, precompress, fut)
+                self.coalesced += 1
+                return fut
+            key = path if coalesce else f'{path}\0{id(render)}'
+            fut = Future()
+            self._pending[key] = (render, precompress, fut)
+        self._queue.put(key)
+        return fut
+
+    def _loop(self):
+        while True:
+            key = self._queue.get()
+            try:
+                with self._lock:
+                    render, precompress, fut = self._pending.pop(key)
+                try:
+                    fut.set_result(self._write(key.split('\0', 1)[0], render, precompress))
+                except BaseException as e:
+                    fut.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def precompress_file(self, path: str) -> List[Future]:
+        """Queue .gz/.br siblings of a file written elsewhere (exporter libraries, older artifacts)"""
+        try:
+            if os.path.getsize(path) < PRECOMPRESS_MIN_BYTES:
+                return []
+        except OSError:
+            return []
+        return [self.submit(path + ENCODING_EXT[encoding], lambda encode=encode: encode(_read(path)), coalesce=True)
+                for encoding, encode in ENCODERS.items()]
+
+    def flush(self):
+        """Block until every write submitted so far is on disk"""
+        if self.background:
+            self._queue.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'writes': self.writes,
+                'coalesced': self.coalesced,
+                'pending': len(self._pending),
+                'bytes': self.bytes,
+                'avg_ms': round(self.total_ms / self.writes, 2) if self.writes else 0.0,
+                'max_ms': round(self.max_ms, 2),
+                'fsync': self.fsync,
+            }
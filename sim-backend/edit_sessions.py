@@ -0,0 +1,228 @@
+"""
+Interactive voxel edit sessions
+A session pins an editable working copy of one job LOD's latest voxel state
+in memory, so each edit is applied in place and only the cells it changed
+go back to clients. Pending edits reach the job's edit history when the
+session is committed: explicitly, after idle_s without edits, or when memory
+pressure evicts it (least recently used first).
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from voxel.store import BrickStore
+
+
+class EditSessionClosed(RuntimeError):
+    """Raised when editing a session that was committed and closed meanwhile"""
+
+
+class EditSession:
+    """
+    Working copy of a job LOD plus the state it started from. `head` is the
+    pristine store of state `parent` (shared with the edit index, never
+    mutated); `store` is the working copy and `ops` the edits applied to it
+    since `parent`.
+    """
+
+    def __init__(self, job_id: str, base: Dict[str, Any], parent: str, head: BrickStore):
+        self.id = uuid.uuid4().hex
+        self.job_id = job_id
+        self.base = base
+        self.parent = parent
+        self.head = head
+        self.store = head.copy()
+        self.ops: List[Any] = []
+        # bricks written since parent; the commit diff only looks at these
+        self.touched = set()
+        self.version = 0
+        self.closed = False
+        self.lock = threading.RLock()
+        self.opened = self.last_used = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        """Working copy, its brick pre-images and the head state (see EditSessionManager.pinned)"""
+        before = sum(c.nbytes for c in self.store.dirty.values() if isinstance(c, np.ndarray))
+        return self.store.nbytes + before + self.head.nbytes
+
+    def apply(self, ops: List[Any],
+              apply_ops: Callable[[BrickStore, List[Any]], Any]) -> Tuple[Any, np.ndarray, np.ndarray, int]:
+        """
+        Run apply_ops(store, ops) on the working copy and return (its result,
+        removed cells, set voxels, new version). When apply_ops raises, the
+        working copy is rolled back and the error propagates.
+        """
+        with self.lock:
+            if self.closed:
+                raise EditSessionClosed(self.id)
+            try:
+                result = apply_ops(self.store, ops)
+            except Exception:
+                self.store.revert()
+                raise
+            removed, upserts = self.store.diff()
+            self.touched.update(self.store.dirty)
+            self.store.mark_clean()
+            self.ops.extend(ops)
+            self.version += 1
+            self.last_used = time.monotonic()
+            return result, removed, upserts, self.version
+
+    def rebase(self, parent: str, head: BrickStore, store: Optional[BrickStore] = None):
+        """Start over from state parent (after a commit); store defaults to a copy of head"""
+        self.parent = parent
+        self.head = head
+        self.store = store if store is not None else head.copy()
+        self.ops = []
+        self.touched = set()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'sessionId': self.id,
+            'jobId': self.job_id,
+            'parent': self.parent,
+            'version': self.version,
+            'pending': len(self.ops),
+            'voxels': len(self.store),
+            'bytes': self.nbytes,
+            'idle_s': round(time.monotonic() - self.last_used, 3),
+        }
+
+
+class EditSessionManager:
+    """
+    Open sessions, at most one per (job, base artifact), in least recently
+    used order. close(session, reason) is called with reason 'idle', 'memory'
+    or 'closed' before a session is dropped and is expected to commit pending
+    edits; if it raises, the session stays open. shared(store) tells whether
+    a session's head is still held elsewhere (the edit index), in which case
+    it is not counted against max_bytes.
+    """
+
+    def __init__(self, idle_s: float = 120, max_bytes: int = 512 * 1024 ** 2,
+                 close: Optional[Callable[[EditSession, str], Any]] = None,
+                 shared: Optional[Callable[[BrickStore], bool]] = None):
+        self.idle_s = idle_s
+        self.max_bytes = max_bytes
+        self.close_fn = close
+        self.shared = shared
+        self.sessions: 'OrderedDict[str, EditSession]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = {'idle': 0, 'memory': 0}
+        self.failed_closes = 0
+        self._sweeper: Optional[threading.Thread] = None
+
+    def pinned(self, session: EditSession) -> int:
+        """Bytes only this session keeps alive"""
+        shared = self.shared is not None and self.shared(session.head)
+        return session.nbytes - (session.head.nbytes if shared else 0)
+
+    def find(self, job_id: str, base_key: str) -> Optional[EditSession]:
+        with self.lock:
+            for session in self.sessions.values():
+                if session.job_id == job_id and (session.base.get('hash') or session.base['path']) == base_key:
+                    return session
+        return None
+
+    def add(self, session: EditSession) -> EditSession:
+        """Register a new session, then evict others if the memory budget is exceeded"""
+        with self.lock:
+            self.sessions[session.id] = session
+        self.sweep(keep=session.id)
+        return session
+
+    def get(self, session_id: str) -> Optional[EditSession]:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+        return session
+
+    def close(self, session_id: str, reason: str = 'closed') -> Optional[EditSession]:
+        """
+        Run the close hook, then drop the session. Returns the session, or
+        None if it was not open. Errors from the hook propagate and leave the
+        session open with its pending edits.
+        """
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        with session.lock:
+            if session.closed:
+                return None
+            if self.close_fn is not None:
+                self.close_fn(session, reason)
+            session.closed = True
+        with self.lock:
+            self.sessions.pop(session_id, None)
+        return session
+
+    @property
+    def nbytes(self) -> int:
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return sum(self.pinned(s) for s in sessions)
+
+    def sweep(self, now: Optional[float] = None, keep: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Close sessions idle for idle_s, then least recently used ones (other
+        than `keep`) while the pinned working copies exceed max_bytes.
+        Returns the [(session id, reason)] actually closed.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            by_use = sorted(self.sessions.values(), key=lambda s: s.last_used)
+        idle = {s.id for s in by_use if now - s.last_used >= self.idle_s}
+        victims = [(s.id, 'idle') for s in by_use if s.id in idle]
+        sizes = {s.id: self.pinned(s) for s in by_use}
+        total = sum(sizes[s.id] for s in by_use if s.id not in idle)
+        for s in by_use:
+            if total <= self.max_bytes:
+                break
+            if s.id == keep or s.id in idle:
+                continue
+            victims.append((s.id, 'memory'))
+            total -= sizes[s.id]
+        closed = []
+        for session_id, reason in victims:
+            try:
+                if self.close(session_id, reason) is None:
+                    continue
+            except Exception as e:
+                # the session keeps its edits; the next sweep retries
+                self.failed_closes += 1
+                print(f"[ERROR] closing edit session {session_id} ({reason}) failed: {e}")
+                continue
+            self.evicted[reason] += 1
+            closed.append((session_id, reason))
+        return closed
+
+    def start(self, interval_s: float = 5.0):
+        """Run sweep() every interval_s on a daemon thread (idempotent)"""
+        with self.lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, args=(interval_s,),
+                                             name='edit-session-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def _sweep_loop(self, interval_s: float):
+        while True:
+            time.sleep(interval_s)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[ERROR] edit session sweep failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            count = len(self.sessions)
+        return {'sessions': count, 'bytes': self.nbytes, 'max_bytes': self.max_bytes,
+                'idle_s': self.idle_s, 'evicted': dict(self.evicted), 'failed_closes': self.failed_closes}
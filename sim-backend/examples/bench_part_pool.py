@@ -0,0 +1,62 @@
+"""
+Benchmark: dragon part generation on the thread pool vs. the process pool
+
+Usage: python examples/bench_part_pool.py [lod ...]
+Runs every dragon part at each LOD (default 256 512 1024) with 1..N workers
+and prints wall time and speedup over a single worker.
+"""
+
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voxel.raster import rasterize_part
+from voxel.workers import ProcessRasterizer
+from voxel.plan import supervisor_plan
+
+
+def dragon_plan(res):
+    plan = supervisor_plan({'subject': 'dragon', 'resolution': res})
+    plan['resolution'] = res
+    return plan
+
+
+def run(submit, plan):
+    t0 = time.perf_counter()
+    futures = [submit(part, plan) for part in plan['parts']]
+    wait(futures)
+    total = sum(len(f.result()) for f in futures)
+    return time.perf_counter() - t0, total
+
+
+def main():
+    lods = [int(a) for a in sys.argv[1:]] or [256, 512, 1024]
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    print(f'cores: {cores}')
+    print(f"{'lod':>5} {'backend':>8} {'workers':>7} {'voxels':>9} {'ms':>9} {'speedup':>7}")
+    for lod in lods:
+        plan = dragon_plan(lod)
+        for backend in ('thread', 'process'):
+            base = None
+            for n in counts:
+                if backend == 'thread':
+                    pool = ThreadPoolExecutor(max_workers=n)
+                    submit = lambda part, plan: pool.submit(rasterize_part, part, plan)
+                    stop = pool.shutdown
+                else:
+                    pool = ProcessRasterizer(n)
+                    run(pool.submit, plan)  # warm up worker processes
+                    submit = pool.submit
+                    stop = pool.shutdown
+                elapsed, total = run(submit, plan)
+                stop()
+                base = base or elapsed
+                print(f'{lod:>5} {backend:>8} {n:>7} {total:>9} {elapsed * 1000:>9.1f} {base / elapsed:>7.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: stdlib json vs. the serializer module on the voxel artifacts
+
+Usage: python examples/bench_serializer.py [artifact_dir]
+Decodes, encodes and canonically hashes every JSON file under
+artifacts/voxels (or the given directory) with both backends, checks that
+the canonical bytes are identical and prints the totals.
+"""
+
+import sys
+import os
+import glob
+import json
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serializer
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'artifacts', 'voxels')
+    files = sorted(glob.glob(os.path.join(root, '*.json')))
+    if not files:
+        print(f'no JSON artifacts under {root}')
+        return
+    print(f'backend: {serializer.BACKEND}, files: {len(files)}')
+    totals = {k: [0.0, 0.0] for k in ('decode', 'encode', 'canonical')}
+    size = 0
+    for path in files:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        size += len(raw)
+        data, ms_std = timed(json.loads, raw)
+        _, ms_fast = timed(serializer.loads, raw)
+        totals['decode'][0] += ms_std
+        totals['decode'][1] += ms_fast
+        _, ms_std = timed(lambda d: json.dumps(d, separators=(',', ':'), ensure_ascii=False).encode('utf-8'), data)
+        _, ms_fast = timed(serializer.dumps, data)
+        totals['encode'][0] += ms_std
+        totals['encode'][1] += ms_fast
+        ref, ms_std = timed(lambda d: json.dumps(d, sort_keys=True, separators=(',', ':')).encode('utf-8'), data)
+        out, ms_fast = timed(serializer.canonical, data)
+        totals['canonical'][0] += ms_std
+        totals['canonical'][1] += ms_fast
+        if out != ref:
+            raise SystemExit(f'canonical bytes differ for {path}')
+    print(f'{size / 1e6:.1f} MB, canonical output identical for every file')
+    print(f"{'op':>10} {'json ms':>10} {'fast ms':>10} {'speedup':>8}")
+    for op, (std, fast) in totals.items():
+        print(f'{op:>10} {std:>10.1f} {fast:>10.1f} {std / fast if fast else 0:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Persistent job registry
+Every job state transition is appended to a SQLite (WAL) log. Finished jobs
+can then be dropped from the in-memory table, still answer GET /jobs/<id>
+from disk, and jobs cut off by a restart can be found and recovered.
+"""
+
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+class JobRegistry:
+    """
+    Append-only log of (job_id, status, data) rows plus in-memory bookkeeping
+    of finished jobs for TTL/LRU eviction. A job's state is the merge of the
+    data of all its rows, in order.
+    """
+
+    def __init__(self, path: str, ttl_s: float = 3600, max_finished: int = 256, max_attempts: int = 2):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_finished = max_finished
+        self.max_attempts = max_attempts
+        # job_id -> last access (monotonic), oldest first
+        self.finished: 'OrderedDict[str, float]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS job_log ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' job_id TEXT NOT NULL,'
+            ' ts REAL NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' data TEXT NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS job_log_job ON job_log (job_id, seq)')
+
+    # ---- log ----
+
+    def record(self, job_id: str, status: str, **data):
+        """Append a state transition"""
+        row = (job_id, time.time(), status, json.dumps(data, separators=(',', ':'), default=str))
+        with self.lock:
+            self.conn.execute('INSERT INTO job_log (job_id, ts, status, data) VALUES (?, ?, ?, ?)', row)
+
+    def state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Latest persisted state of a job, or None if it was never logged"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT status, data FROM job_log WHERE job_id = ? ORDER BY seq', (job_id,)).fetchall()
+        if not rows:
+            return None
+        out: Dict[str, Any] = {'id': job_id}
+        for status, data in rows:
+            out.update(json.loads(data))
+            out['status'] = status
+        return out
+
+    def interrupted(self) -> List[Dict[str, Any]]:
+        """States of jobs whose last logged status is still queued or running"""
+        with self.lock:
+            ids = [r[0] for r in self.conn.execute(
+                'SELECT job_id FROM job_log WHERE seq IN (SELECT MAX(seq) FROM job_log GROUP BY job_id)'
+                ' AND status IN (?, ?) ORDER BY seq', ACTIVE_STATUSES).fetchall()]
+        return [s for s in (self.state(i) for i in ids) if s]
+
+    def purge(self, older_than_s: float) -> int:
+        """Drop the log of finished jobs whose last transition is older than older_than_s"""
+        cutoff = time.time() - older_than_s
+        with self.lock:
+            cur = self.conn.execute(
+                'DELETE FROM job_log WHERE job_id IN ('
+                ' SELECT job_id FROM job_log WHERE seq IN (SELECT MAX(seq) FROM job_log GROUP BY job_id)'
+                ' AND status IN (?, ?) AND ts < ?)', (*FINISHED_STATUSES, cutoff))
+            return cur.rowcount
+
+    # ---- in-memory eviction ----
+
+    def mark_finished(self, job_id: str):
+        with self.lock:
+            self.finished[job_id] = time.monotonic()
+            self.finished.move_to_end(job_id)
+
+    def touch(self, job_id: str):
+        with self.lock:
+            if job_id in self.finished:
+                self.finished[job_id] = time.monotonic()
+                self.finished.move_to_end(job_id)
+
+    def expired(self) -> List[str]:
+        """Pop and return finished jobs past the TTL or beyond the LRU bound"""
+        out = []
+        now = time.monotonic()
+        with self.lock:
+            while self.finished:
+                job_id, seen = next(iter(self.finished.items()))
+                if len(self.finished) <= self.max_finished and now - seen < self.ttl_s:
+                    break
+                self.finished.popitem(last=False)
+                out.append(job_id)
+        return out
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,135 @@
+"""
+In-memory manifest index
+Job manifests are loaded once at startup and kept current by routing every
+manifest write through the index, so job lookups, listings and artifact
+path resolution never probe the manifests directory on the hot path.
+"""
+
+from typing import Dict, Any, List, Optional, Set
+from concurrent.futures import Future
+import copy
+import os
+import threading
+
+from artifact_writer import ArtifactWriter
+import serializer
+from voxel.cache import ARTIFACT_FILE_KEYS
+
+
+class ManifestIndex:
+    """
+    job_id -> manifest dict for every manifest under `directory`.
+    get() hands out the indexed dict itself; callers that change a manifest
+    copy it and go through write().
+    """
+
+    def __init__(self, directory: str, writer: Optional[ArtifactWriter] = None):
+        self.directory = directory
+        # manifest writes for the same job coalesce on the writer while still pending
+        self.writer = writer or ArtifactWriter(background=False)
+        self.manifests: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def load(self) -> int:
+        """(Re)scan the manifests directory; returns the number of manifests indexed"""
+        found = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'rb') as f:
+                    found[entry.name[:-len('.json')]] = serializer.loads(f.read())
+            except (OSError, ValueError):
+                continue
+        with self.lock:
+            self.manifests = found
+        return len(found)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.manifests.get(job_id)
+
+    def __contains__(self, job_id: str) -> bool:
+        with self.lock:
+            return job_id in self.manifests
+
+    def write(self, job_id: str, manifest: Dict[str, Any]) -> Future:
+        """
+        Index a snapshot of a manifest now and persist it (atomically) through
+        the writer; the returned Future resolves once it is on disk.
+        """
+        snapshot = copy.deepcopy(manifest)
+        with self.lock:
+            self.manifests[job_id] = snapshot
+        render = lambda: serializer.dumps(snapshot)
+        return self.writer.submit(self._path(job_id), render, coalesce=True)
+
+    def voxel_artifact(self, job_id: str, lod: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Voxel artifact entry of a job: the given LOD, else the legacy single
+        'voxel_json' artifact, else the highest LOD.
+        """
+        manifest = self.get(job_id)
+        if not manifest:
+            return None
+        artifacts = manifest.get('artifacts') or {}
+        lods = artifacts.get('lods') or {}
+        if lod is not None:
+            return lods.get(str(lod))
+        if artifacts.get('voxel_json'):
+            return artifacts['voxel_json']
+        if lods:
+            return lods[max(lods, key=int)]
+        return None
+
+    def referenced_paths(self) -> Set[str]:
+        """Artifact URL paths (/artifacts/...) named by any manifest's artifacts or edits"""
+        with self.lock:
+            manifests = list(self.manifests.values())
+        found: Set[str] = set()
+        stack = [[m.get('artifacts'), m.get('edits')] for m in manifests]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if key in ARTIFACT_FILE_KEYS and isinstance(value, str) and value.startswith('/artifacts/'):
+                        found.add(value)
+                    elif isinstance(value, (dict, list)):
+                        stack.append(value)
+            elif isinstance(node, list):
+                stack.extend(v for v in node if isinstance(v, (dict, list)))
+        return found
+
+    def list(self, subject: Optional[str] = None, since: Optional[str] = None,
+             until: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Manifest summaries, newest first; since/until compare ISO created_at strings"""
+        subject = (subject or '').strip().lower()
+        with self.lock:
+            items = list(self.manifests.items())
+        out = []
+        for job_id, m in items:
+            prompt = m.get('prompt') or {}
+            subj = str(prompt.get('subject') or (m.get('plan') or {}).get('subject') or '')
+            created = m.get('created_at') or ''
+            if subject and subject not in subj.lower():
+                continue
+            if (since and created < since) or (until and created > until):
+                continue
+            artifacts = m.get('artifacts') or {}
+            out.append({
+                'jobId': job_id,
+                'subject': subj,
+                'created_at': created,
+                'lods': sorted(int(k) for k in (artifacts.get('lods') or {})),
+                'edits': len(m.get('edits') or []),
+            })
+        out.sort(key=lambda s: s['created_at'], reverse=True)
+        return out[:max(0, limit)]
@@ -0,0 +1,123 @@
+"""
+JSON serialization layer
+Single place for JSON encode/decode: orjson when it is installed, the
+stdlib json module otherwise (SERIALIZER=json forces stdlib). canonical()
+returns exactly the bytes of json.dumps(sort_keys=True, separators=(',', ':'))
+with either backend, so content hashes do not depend on what is installed.
+"""
+
+from typing import Any, Union
+import json
+import os
+import re
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+if os.getenv('SERIALIZER', 'auto') == 'json':
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# orjson output that may differ from the stdlib's canonical form: exponent
+# floats (1e16 vs 1e+16), tiny floats it prints positionally (0.00001 vs
+# 1e-05) and NaN/Infinity, which it writes as null
+_EXPONENT = re.compile(rb'[eE][-+]?\d')
+_NUMBER_CHARS = frozenset(b'0123456789.-')
+_VALUE_START = frozenset(b':,[')
+
+
+def _has_exponent_float(out: bytes) -> bool:
+    # an exponent belongs to a number only if the token before it is numeric
+    # and starts a value; hex colors like "#8e5b3d" inside strings do not
+    for m in _EXPONENT.finditer(out):
+        i = m.start() - 1
+        if i < 0 or out[i] not in _NUMBER_CHARS:
+            continue
+        while i >= 0 and out[i] in _NUMBER_CHARS:
+            i -= 1
+        if i < 0 or out[i] in _VALUE_START:
+            return True
+    return False
+
+
+def _maybe_not_canonical(out: bytes) -> bool:
+    return (not out.isascii() or b'0.0000' in out
+            or b':null' in out or b',null' in out or b'[null' in out or out == b'null'
+            or _has_exponent_float(out))
+
+
+if orjson is not None:
+    _DUMPS_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    # responses keep Flask's HTTP-date format for dates (orjson would write RFC 3339)
+    _RESPONSE_OPTS = _DUMPS_OPTS | orjson.OPT_PASSTHROUGH_DATETIME
+    _JSON_ERRORS = (TypeError, orjson.JSONEncodeError)
+else:
+    _DUMPS_OPTS = _RESPONSE_OPTS = 0
+    _JSON_ERRORS = (TypeError,)
+
+
+def _stdlib_dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    return json.dumps(obj, sort_keys=sort_keys, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """Compact UTF-8 JSON"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_DUMPS_OPTS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+        except _JSON_ERRORS:
+            # e.g. ints beyond 64 bits; the stdlib handles (or rejects) them as before
+            pass
+    return _stdlib_dumps(obj, sort_keys=sort_keys)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def canonical(obj: Any) -> bytes:
+    """Sorted-key, ASCII-escaped compact JSON, byte-identical to the stdlib encoder"""
+    if orjson is not None:
+        try:
+            out = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except _JSON_ERRORS:
+            out = None
+        # non-ASCII output would need \u escapes; anything else suspicious goes to the stdlib
+        if out is not None and not _maybe_not_canonical(out):
+            return out
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider (jsonify, request.get_json) backed by this module.
+    Output matches DefaultJSONProvider's, including HTTP-date datetimes.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return self._encode(obj).decode('utf-8')
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return loads(s)
+
+    def _encode(self, obj: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default,
+                                    option=_RESPONSE_OPTS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0))
+            except _JSON_ERRORS:
+                pass
+        return json.dumps(obj, default=self.default, sort_keys=self.sort_keys,
+                          separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def response(self, *args: Any, **kwargs: Any):
+        # hand Flask the bytes directly instead of a str it would encode again
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj), mimetype=self.mimetype)
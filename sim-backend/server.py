@@ -0,0 +1,11 @@
+"""
+Server entry point: python server.py
+Process-pool part workers (PART_BACKEND=process) start with forkserver or
+spawn, and both re-import the launching script in every worker. This script
+imports app only when run as the main program, so workers skip the app's
+startup (job registry, caches, thread pools, agent system).
+"""
+
+if __name__ == "__main__":
+    from app import main
+    main()
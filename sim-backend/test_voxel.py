@@ -0,0 +1,1217 @@
+"""
+Tests for the voxel engine used by the job pipeline
+"""
+
+import sys
+import os
+import atexit
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# importing app opens the job log and the LOD cache index under ARTIFACT_ROOT; keep them out of the tree
+if 'ARTIFACT_ROOT' not in os.environ:
+    os.environ['ARTIFACT_ROOT'] = tempfile.mkdtemp(prefix='voxel-tests-')
+    atexit.register(shutil.rmtree, os.environ['ARTIFACT_ROOT'], True)
+
+from voxel.raster import rasterize_part
+from voxel.grid import merge_parts, pack_keys, unpack_keys
+from voxel.plan import supervisor_plan
+
+
+def _dragon_plan(res):
+    plan = supervisor_plan({'subject': 'dragon', 'resolution': res})
+    plan['resolution'] = res
+    return plan
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """app module with artifacts, manifests and the LOD cache redirected to tmp_path"""
+    import app as backend
+    from voxel.cache import ArtifactCache
+    from job_registry import JobRegistry
+    from manifest_index import ManifestIndex
+    from edit_sessions import EditSessionManager
+    monkeypatch.setattr(backend, 'VOXEL_DIR', str(tmp_path))
+    manifests = tmp_path / 'manifests'
+    manifests.mkdir()
+    monkeypatch.setattr(backend, 'MANIFEST_DIR', str(manifests))
+    (tmp_path / 'glb').mkdir()
+    monkeypatch.setattr(backend, 'GLB_DIR', str(tmp_path / 'glb'))
+    monkeypatch.setattr(backend, 'artifact_cache', ArtifactCache(str(tmp_path / 'cache_index.json'), resolve=backend._artifact_file,
+                                                                   remove=backend._remove_artifact_file,
+                                                                   referenced=backend._referenced_artifacts))
+    monkeypatch.setattr(backend, 'job_registry', JobRegistry(str(tmp_path / 'jobs.sqlite3')))
+    monkeypatch.setattr(backend, 'manifest_index', ManifestIndex(str(manifests)))
+    monkeypatch.setattr(backend, 'edit_indexes', type(backend.edit_indexes)())
+    monkeypatch.setattr(backend, 'edit_sessions', EditSessionManager(close=backend._close_session,
+                                                                     shared=backend._is_indexed))
+    return backend
+
+
+def _reference_part_voxels(part, plan, cap=200000):
+    """Original per-cell procedural fill, kept as the oracle for the rasterizer"""
+    bbox = part['bbox']
+    res = plan['resolution']
+    mn = bbox['min']; mx = bbox['max']
+    cx = (mn[0]+mx[0])/2; cy = (mn[1]+mx[1])/2; cz = (mn[2]+mx[2])/2
+    sx = max(1, mx[0]-mn[0]); sy = max(1, mx[1]-mn[1]); sz = max(1, mx[2]-mn[2])
+    rx = max(1, sx/2); ry = max(1, sy/2); rz = max(1, sz/2)
+    vox = []
+    step = max(1, int(res/512))
+    pid = part['id']
+    def add_if(x,y,z,c):
+        vox.append([int(x),int(y),int(z),int(c%8)])
+    if pid in ('left_wing','right_wing'):
+        thickness = max(2, int(0.25*sy))
+        for x in range(mn[0], mx[0], step):
+            for z in range(mn[2], mx[2], step):
+                for y in range(int(cy - thickness/2), int(cy + thickness/2)+1, max(1, step)):
+                    add_if(x,y,z,4)
+                    if (x - mn[0]) % max(step*3, 3) == 0:
+                        add_if(x,y,z,5)
+                    if len(vox)>=cap: return vox
+    elif pid in ('left_leg','right_leg','neck'):
+        r_cyl = max(2, int(min(rx, rz)*0.45))
+        for y in range(mn[1], mx[1], step):
+            for x in range(mn[0], mx[0], step):
+                for z in range(mn[2], mx[2], step):
+                    if (x-cx)**2 + (z-cz)**2 <= r_cyl*r_cyl:
+                        add_if(x,y,z,6)
+                        if len(vox)>=cap: return vox
+    elif pid == 'tail':
+        length = max(1, sx)
+        for x in range(mn[0], mx[0], step):
+            t = (x - mn[0]) / max(1, length)
+            r_now = max(2, int(rz * (1.0 - 0.6*t)))
+            for y in range(mn[1], mx[1], step):
+                for z in range(mn[2], mx[2], step):
+                    if (z-cz)**2 + (y-cy)**2 <= r_now*r_now:
+                        add_if(x,y,z,1)
+                        if len(vox)>=cap: return vox
+    elif pid in ('horns','spikes'):
+        for x in range(mn[0], mx[0], max(1, step*2)):
+            for y in range(int(cy), mx[1], max(1, step)):
+                add_if(x,y,int(cz),3)
+                if len(vox)>=cap: return vox
+    else:
+        for x in range(mn[0], mx[0], step):
+            for y in range(mn[1], mx[1], step):
+                for z in range(mn[2], mx[2], step):
+                    dx=(x-cx)/rx; dy=(y-cy)/ry; dz=(z-cz)/rz
+                    if dx*dx + dy*dy + dz*dz <= 1.0:
+                        add_if(x,y,z,2)
+                        if len(vox)>=cap: return vox
+    return vox
+
+
+def test_rasterizer_matches_reference():
+    """Rasterized parts are identical (values and order) to the per-cell loops"""
+    for res in (32, 64, 96, 128):
+        plan = _dragon_plan(res)
+        for part in plan['parts']:
+            got = rasterize_part(part, plan)
+            want = np.asarray(_reference_part_voxels(part, plan), dtype=np.int32).reshape(-1, 4)
+            assert got.dtype == np.int32
+            assert np.array_equal(got, want), f"{part['id']} differs at LOD {res}"
+
+
+def test_rasterizer_cap_and_stride():
+    """Voxel cap cuts at the same cell as the loops, including wing accent pairs"""
+    plan = _dragon_plan(128)
+    for cap in (1, 7, 500, 1001):
+        for part in plan['parts']:
+            got = rasterize_part(part, plan, cap=cap)
+            want = np.asarray(_reference_part_voxels(part, plan, cap=cap), dtype=np.int32).reshape(-1, 4)
+            assert np.array_equal(got, want), f"{part['id']} differs with cap {cap}"
+
+    # LOD 1024 samples every second cell
+    plan = _dragon_plan(1024)
+    horns = next(p for p in plan['parts'] if p['id'] == 'horns')
+    got = rasterize_part(horns, plan)
+    want = np.asarray(_reference_part_voxels(horns, plan), dtype=np.int32).reshape(-1, 4)
+    assert np.array_equal(got, want)
+
+
+def test_rasterizer_empty_bbox():
+    """Degenerate boxes produce an empty (0,4) array"""
+    part = {'id': 'body', 'bbox': {'min': [5, 5, 5], 'max': [5, 5, 5]}}
+    got = rasterize_part(part, {'resolution': 64})
+    assert got.shape == (0, 4)
+
+
+
+def test_process_rasterizer_matches_threads():
+    """Process backend returns the same voxels and releases its shared-memory blocks"""
+    from voxel.workers import ProcessRasterizer
+    plan = _dragon_plan(128)
+    pool = ProcessRasterizer(2)
+    try:
+        futures = {part['id']: pool.submit(part, plan) for part in plan['parts']}
+        for part in plan['parts']:
+            np.testing.assert_array_equal(futures[part['id']].result(timeout=60), rasterize_part(part, plan))
+        empty = dict(plan['parts'][0], bbox={'min': [5, 5, 5], 'max': [5, 5, 5]})
+        assert pool.submit(empty, plan).result(timeout=60).shape == (0, 4)
+    finally:
+        pool.shutdown()
+    if os.path.isdir('/dev/shm'):
+        assert not [n for n in os.listdir('/dev/shm') if n.startswith('psm_')]
+
+def test_merge_parts_first_writer_wins():
+    """Bulk merge matches the set-based dedupe: first color wins, first-seen order"""
+    plan = _dragon_plan(96)
+    parts = [rasterize_part(p, plan) for p in plan['parts']]
+    seen = set()
+    want = []
+    for vox in parts:
+        for v in vox.tolist():
+            key = (v[0], v[1], v[2])
+            if key in seen:
+                continue
+            seen.add(key)
+            want.append(v)
+    merged, stats = merge_parts(parts)
+    assert merged.tolist() == want
+    assert stats['voxels'] == len(want)
+    assert stats['input_voxels'] == sum(len(p) for p in parts)
+    assert stats['peak_bytes'] > 0
+
+
+def test_pack_keys_roundtrip():
+    """Packed keys survive negative and large coordinates"""
+    xyz = np.array([[0, 0, 0], [-5, 3, 2047], [1023, -1, 7], [2047, 2047, 2047]], dtype=np.int32)
+    assert np.array_equal(unpack_keys(pack_keys(xyz)), xyz)
+    merged, stats = merge_parts([])
+    assert merged.shape == (0, 4) and stats['voxels'] == 0
+
+
+
+def test_content_hash_is_stable_and_structural():
+    """Artifact names depend only on plan/meta and the voxel rows, not on input form or chunking"""
+    import voxel.grid as grid
+    from voxel import content_hash
+    vox = np.array([[0, 0, 0, 1], [1, 2, 3, 4]], dtype=np.int32)
+    golden = 'b96644e1c9c4b5fda07261a854d744de685970e4f2b92bff39b181e3841dd94a'
+    assert content_hash(vox, {'res': 64}) == golden
+    assert content_hash([{'x': 0, 'y': 0, 'z': 0, 'c': 1}, {'x': 1, 'y': 2, 'z': 3, 'c': 4}], {'res': 64}) == golden
+    assert content_hash(vox.astype(np.int64), {'res': 64}) == golden
+    assert content_hash(vox, {'res': 128}) != golden
+    assert content_hash(vox[::-1], {'res': 64}) != golden
+    assert content_hash(vox, {'res': 64}, {}) != golden
+
+    big = np.arange(40000, dtype=np.int32).reshape(-1, 4)
+    whole = content_hash(big)
+    old = grid.HASH_CHUNK_ROWS
+    try:
+        grid.HASH_CHUNK_ROWS = 7
+        assert content_hash(big) == whole
+    finally:
+        grid.HASH_CHUNK_ROWS = old
+
+def test_binary_codec_roundtrip():
+    """.bvox round-trips scenes exactly and is far smaller than the JSON"""
+    import json
+    from voxel.codec import encode_scene, decode_scene
+    from voxel.grid import voxels_to_dicts
+    plan = _dragon_plan(64)
+    merged, _ = merge_parts(rasterize_part(p, plan) for p in plan['parts'])
+    scene = {'res': 64, 'origin': [0, 0, 0], 'palette': ['#c62828', '#ef4444'], 'voxels': voxels_to_dicts(merged)}
+    for compression in ('zlib', 'none'):
+        data = encode_scene(scene, compression=compression)
+        assert decode_scene(data) == scene
+    size_json = len(json.dumps(scene, separators=(',', ':')))
+    assert len(encode_scene(scene)) * 10 <= size_json
+
+    # negative coordinates from edits survive via the bias
+    odd = {'res': 8, 'voxels': [{'x': -3, 'y': 0, 'z': 9, 'c': 7}, {'x': 4, 'y': -1, 'z': 0, 'c': 0}]}
+    assert decode_scene(encode_scene(odd)) == odd
+    assert decode_scene(encode_scene({'res': 8, 'voxels': []}), as_array=True)['voxels'].shape == (0, 4)
+
+
+def test_artifact_content_negotiation(tmp_path, monkeypatch):
+    """/artifacts/voxels serves JSON by default and .bvox when asked for it"""
+    import app as backend
+    from voxel.codec import decode_scene, BINARY_MEDIA_TYPE
+    monkeypatch.setattr(backend, 'VOXEL_DIR', str(tmp_path))
+    scene = {'res': 4, 'origin': [0, 0, 0], 'palette': ['#000000'], 'voxels': [{'x': 1, 'y': 2, 'z': 3, 'c': 0}]}
+    backend.write_json(str(tmp_path / 'abc.json'), scene)
+    client = backend.app.test_client()
+
+    resp = client.get('/artifacts/voxels/abc.json')
+    assert resp.status_code == 200 and resp.get_json() == scene
+    resp = client.get('/artifacts/voxels/abc.json', headers={'Accept': '*/*'})
+    assert resp.get_json() == scene
+
+    resp = client.get('/artifacts/voxels/abc.json', headers={'Accept': f'{BINARY_MEDIA_TYPE}, application/json;q=0.5'})
+    assert resp.status_code == 200
+    assert resp.mimetype == BINARY_MEDIA_TYPE
+    assert resp.headers['Vary'] == 'Accept, Accept-Encoding'
+    assert decode_scene(resp.data) == scene
+    assert (tmp_path / 'abc.bvox').exists()
+
+    # concurrent lazy conversions of one artifact each write through their own temp file
+    import threading
+    backend.write_json(str(tmp_path / 'def.json'), scene)
+    codes = []
+    get = lambda: codes.append(backend.app.test_client().get('/artifacts/voxels/def.bvox').status_code)
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert codes == [200] * 8 and not list(tmp_path.glob('*.tmp'))
+
+
+def test_artifact_etag_precompressed_and_ranges(tmp_path, monkeypatch):
+    """Hashed artifacts are immutable, revalidate to 304, serve .gz siblings and byte ranges"""
+    import gzip
+    import app as backend
+    from artifact_writer import ArtifactWriter
+    monkeypatch.setattr(backend, 'VOXEL_DIR', str(tmp_path))
+    monkeypatch.setattr(backend, 'GLB_DIR', str(tmp_path))
+    monkeypatch.setattr(backend, 'artifact_writer', ArtifactWriter(background=False))
+    scene = {'res': 64, 'palette': ['#000000'], 'voxels': [{'x': i, 'y': 0, 'z': 0, 'c': 0} for i in range(64)]}
+    scene_hash = 'ab' * 32
+    backend.write_voxel_artifact(scene_hash, scene)
+    assert (tmp_path / f'{scene_hash}.json.gz').exists()
+    client = backend.app.test_client()
+    url = f'/artifacts/voxels/{scene_hash}.json'
+
+    resp = client.get(url)
+    assert resp.get_json() == scene and 'Content-Encoding' not in resp.headers
+    assert resp.headers['Cache-Control'] == backend.IMMUTABLE_CACHE_CONTROL
+    etag = resp.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    resp = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip' and resp.mimetype == 'application/json'
+    assert backend.serializer.loads(gzip.decompress(resp.data)) == scene
+    assert resp.headers['ETag'] != etag
+    assert client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': resp.headers['ETag']}).status_code == 304
+
+    # GLBs written by an exporter: siblings on demand, ranges always address identity bytes
+    glb = bytes(range(256)) * 16
+    (tmp_path / 'shapee_0123456789ab.glb').write_bytes(glb)
+    resp = client.get('/artifacts/glb/shapee_0123456789ab.glb', headers={'Accept-Encoding': 'gzip'})
+    assert resp.data == glb and (tmp_path / 'shapee_0123456789ab.glb.gz').exists()
+    resp = client.get('/artifacts/glb/shapee_0123456789ab.glb',
+                      headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=100-199'})
+    assert resp.status_code == 206 and resp.data == glb[100:200]
+    assert 'Content-Encoding' not in resp.headers
+
+    (tmp_path / 'scratch.json').write_bytes(b'{}')
+    assert client.get('/artifacts/voxels/scratch.json').headers['Cache-Control'] == 'no-cache'
+
+
+def _as_set(vox):
+    return {tuple(v) for v in np.asarray(vox).tolist()}
+
+
+def test_brick_store_lookup_and_roundtrip():
+    """Brick store holds the merged scene exactly and answers point lookups"""
+    from voxel.store import BrickStore
+    plan = _dragon_plan(96)
+    merged, _ = merge_parts(rasterize_part(p, plan) for p in plan['parts'])
+    store = BrickStore.from_array(merged)
+    assert len(store) == len(merged)
+    assert _as_set(store.to_array()) == _as_set(merged)
+    x, y, z, c = merged[len(merged) // 2].tolist()
+    assert store.get(x, y, z) == c
+    assert store.get(-50, 0, 0) is None
+
+    store.set(-1, -1, -1, 5)
+    assert store.get(-1, -1, -1) == 5 and len(store) == len(merged) + 1
+    assert store.remove(-1, -1, -1) and not store.remove(-1, -1, -1)
+    assert len(store) == len(merged)
+    for key, block in store.iter_bricks():
+        assert ((block[:, :3] >> store.shift) == np.array(key)).all()
+
+
+def test_brick_store_tiles_keep_memory_sparse():
+    """Solid single-color regions collapse into tiles; writes into a tile split it"""
+    from voxel.store import BrickStore
+    g = np.indices((64, 64, 64)).reshape(3, -1).T
+    solid = np.concatenate([g, np.full((len(g), 1), 2)], axis=1)
+    store = BrickStore.from_array(solid)
+    assert len(store) == 64 ** 3
+    assert len(store.bricks) == 0 and len(store.tiles) == 512
+    assert store.nbytes < solid.nbytes // 100
+    store.set(3, 3, 3, 7)
+    assert store.get(3, 3, 3) == 7 and store.get(3, 3, 4) == 2
+    assert len(store.bricks) == 1 and len(store) == 64 ** 3
+
+
+def test_voxel_edits_use_store():
+    """Add/remove/paint instructions keep their previous semantics"""
+    from app import _apply_voxel_edit
+    scene = {'res': 16, 'palette': ['#c62828', '#ef4444', '#f59e0b', '#facc15', '#22c55e', '#60a5fa'],
+             'voxels': [{'x': 1, 'y': 1, 'z': 1, 'c': 0}, {'x': 2, 'y': 1, 'z': 1, 'c': 0}, {'x': 9, 'y': 9, 'z': 9, 'c': 0}]}
+    out = _apply_voxel_edit(dict(scene), 'add block at 4,4,4 color blue')
+    assert {'x': 4, 'y': 4, 'z': 4, 'c': 5} in out['voxels'] and len(out['voxels']) == 4
+    out = _apply_voxel_edit(out, 'remove block at 4,4,4')
+    assert len(out['voxels']) == 3
+    out = _apply_voxel_edit(out, 'paint near 1,1,1 color green radius 1')
+    colors = {(v['x'], v['y'], v['z']): v['c'] for v in out['voxels']}
+    assert colors == {(1, 1, 1): 4, (2, 1, 1): 4, (9, 9, 9): 0}
+    out = _apply_voxel_edit(out, 'make the tail longer')
+    assert (10, 9, 9) in {(v['x'], v['y'], v['z']) for v in out['voxels']}
+
+
+def test_brick_store_region_ops_touch_only_overlapping_bricks(monkeypatch):
+    """paint/erase/fill match a brute-force scan and read only bricks inside the region bbox"""
+    from voxel import BrickStore
+    from voxel.region import Box, Sphere, Diamond
+    plan = _dragon_plan(128)
+    merged, _ = merge_parts(rasterize_part(p, plan) for p in plan['parts'])
+    store = BrickStore.from_array(merged)
+    read = []
+    original = store._brick_voxels
+    monkeypatch.setattr(store, '_brick_voxels', lambda key: read.append(key) or original(key))
+    center = merged[len(merged) // 2, :3].tolist()
+
+    region = Diamond(center, 3)
+    expected = merged[np.abs(merged[:, :3] - center).sum(axis=1) <= 3]
+    assert store.paint(region, 6) == len(expected) > 0
+    assert len(read) <= 8
+    assert all(store.get(*v[:3]) == 6 for v in expected.tolist())
+
+    before = len(store)
+    inside = int((((merged[:, :3] - center) ** 2).sum(axis=1) <= 16).sum())
+    assert store.erase(Sphere(center, 4)) == inside and len(store) == before - inside
+    assert store.get(*center) is None
+
+    assert store.fill(Box([0, 0, 0], [3, 3, 3]), 2) == 64
+    assert all(store.get(x, y, z) == 2 for x in range(4) for y in range(4) for z in range(4))
+    assert len(store) == len(store.to_array())
+
+
+def test_region_edits_stay_inside_grid(monkeypatch):
+    """Region ops are clipped to [0, res); oversized fills and out-of-grid adds are rejected"""
+    import app as backend
+    from voxel import BrickStore
+    store = BrickStore(meta={'res': 32, 'palette': ['#ff0000']})
+    fill = {'op': 'fill', 'region': {'shape': 'box', 'min': [-5, -5, 30], 'max': [70000, 1, 70000]}, 'c': 0}
+    assert backend.apply_voxel_op(store, fill) == 32 * 2 * 2
+    vox = store.to_array()
+    assert vox[:, :3].min() == 0 and vox[:, :3].max() == 31
+    monkeypatch.setattr(backend, 'EDIT_REGION_MAX_CELLS', 1000)
+    huge = {'op': 'fill', 'region': {'shape': 'box', 'min': [0, 0, 0], 'max': [2000, 2000, 10]}, 'c': 0}
+    with pytest.raises(ValueError):
+        backend.apply_voxel_op(store, huge)
+    with pytest.raises(ValueError):
+        backend.apply_voxel_op(store, {'op': 'add', 'at': [0, 32, 0], 'c': 0})
+    assert len(store) == 128
+    client = backend.app.test_client()
+    resp = client.post('/edit', json={'voxel': {'res': 8, 'voxels': []}, 'instruction': 'add block at 9,0,0'})
+    assert resp.status_code == 400
+    scene = {'res': 8, 'voxels': [{'x': 1, 'y': 1, 'z': 1, 'c': 2}]}
+    ops = [{'op': 'add', 'at': [0, 0, 0], 'c': 3}, 'remove block at 1,1,1']
+    body = client.post('/edit', json={'voxel': scene, 'ops': ops}).get_json()
+    assert 'voxel' not in body and body['changes'] == {'removed': [[1, 1, 1]], 'set': [{'x': 0, 'y': 0, 'z': 0, 'c': 3}]}
+    body = client.post('/edit?voxels=1', json={'voxel': scene, 'ops': ops}).get_json()
+    assert body['voxel']['voxels'] == [{'x': 0, 'y': 0, 'z': 0, 'c': 3}]
+
+
+def test_parse_voxel_edit_region_instructions():
+    """Region instructions parse into structured ops; unknown text is a no-op"""
+    from app import parse_voxel_edit
+    palette = ['#c62828', '#ef4444', '#f59e0b', '#facc15', '#22c55e', '#60a5fa']
+    assert parse_voxel_edit('fill box 0,0,0 to 3,3,3 color green', palette) == \
+        {'op': 'fill', 'region': {'shape': 'box', 'min': [0, 0, 0], 'max': [3, 3, 3]}, 'c': 4}
+    assert parse_voxel_edit('erase sphere at 5,5,5 radius 3', palette) == \
+        {'op': 'erase', 'region': {'shape': 'sphere', 'center': [5, 5, 5], 'radius': 3}}
+    assert parse_voxel_edit('paint near 1,1,1 color blue r 1', palette)['region'] == \
+        {'shape': 'near', 'center': [1, 1, 1], 'radius': 1}
+    assert parse_voxel_edit('paint sphere at 1,1,1', palette) is None
+    assert parse_voxel_edit('make it prettier', palette) is None
+
+
+def test_extrude_and_stretch_parts():
+    """Extrusion repeats (and tapers) the outer layer; stretching scales a part without gaps"""
+    from voxel.extrude import extrude, stretch
+    bar = np.array([[x, y, z, 3] for x in range(4) for y in range(5) for z in range(5)])
+    grown = extrude(bar, 0, -1, 3)
+    assert sorted(set(grown[:, 0].tolist())) == [-3, -2, -1] and len(grown) == 75 and set(grown[:, 3]) == {3}
+    tapered = extrude(bar, 0, 1, 4, taper=1.0)
+    per_layer = [int((tapered[:, 0] == x).sum()) for x in range(4, 8)]
+    assert per_layer == sorted(per_layer, reverse=True) and per_layer[-1] == 1
+
+    longer = stretch(bar, 0, 1, 2.0)
+    assert sorted(set(longer[:, 0].tolist())) == list(range(8)) and len(longer) == 2 * len(bar)
+    shorter = stretch(bar, 0, -1, 0.5)
+    assert sorted(set(shorter[:, 0].tolist())) == [2, 3]
+    # with res, only what fits in the grid is ever built
+    assert extrude(bar, 0, 1, 200000, res=10)[:, 0].max() == 9 and len(extrude(bar, 0, -1, 5, res=10)) == 0
+    assert stretch(bar, 0, 1, 5000.0, res=10)[:, 0].max() == 9
+
+
+def test_part_words_and_scale_factor_validation():
+    """Part names match whole words only; non-positive scale factors are rejected"""
+    import app as backend
+    from voxel import BrickStore
+    assert backend._part_from_text('go ahead and make it longer') is None
+    assert backend._part_from_text('somebody stretch it') is None
+    assert backend._part_from_text('make the head bigger') == 'head'
+    assert backend._part_from_text('the left wings') == 'left_wing'
+    store = BrickStore.from_array(np.array([[x, 0, 0, 1] for x in range(8)]), meta={'res': 16})
+    for factor in (0, -2, float('nan'), float('inf')):
+        with pytest.raises(ValueError):
+            backend.apply_voxel_op(store, {'op': 'scale', 'part': 'tail', 'factor': factor})
+    assert len(store) == 8
+
+
+def test_part_edits_follow_plan_bbox():
+    """"make the tail longer" grows the tail away from the body, leaving the rest of the model alone"""
+    from app import _apply_voxel_edit, parse_voxel_edit, VOXEL_PALETTE
+    plan = _dragon_plan(64)
+    merged, _ = merge_parts(rasterize_part(p, plan) for p in plan['parts'])
+    scene = {'res': 64, 'palette': list(VOXEL_PALETTE), 'voxels': [dict(zip('xyzc', v)) for v in merged.tolist()]}
+    before = {(v['x'], v['y'], v['z']) for v in scene['voxels']}
+    tail = next(p['bbox'] for p in plan['parts'] if p['id'] == 'tail')
+    out = _apply_voxel_edit(dict(scene), 'make the tail much longer', plan)
+    added = {(v['x'], v['y'], v['z']) for v in out['voxels']} - before
+    tail_min_x = min(x for x, y, z in before if tail['min'][1] <= y <= tail['max'][1] and x <= tail['max'][0]
+                     and tail['min'][2] <= z <= tail['max'][2])
+    # three layers past the tail tip, clipped at the grid edge
+    assert added and {x for x, _, _ in added} == {x for x in range(tail_min_x - 3, tail_min_x) if x >= 0}
+    assert all(tail['min'][1] <= y <= tail['max'][1] and tail['min'][2] <= z <= tail['max'][2] for _, y, z in added)
+    assert parse_voxel_edit('stretch the left wing by 1.5x', VOXEL_PALETTE) == \
+        {'op': 'scale', 'part': 'left_wing', 'factor': 1.5}
+    assert parse_voxel_edit('scale the tail 150%', VOXEL_PALETTE)['factor'] == 1.5
+    assert parse_voxel_edit('stretch tail 2 blocks by 1.5', VOXEL_PALETTE)['factor'] == 1.5
+    # a number that is not marked as a factor is not one
+    assert parse_voxel_edit('stretch the tail 2 blocks', VOXEL_PALETTE) is None
+
+
+    # a body cell inside the tail bbox stays put when the tail is scaled
+    from app import apply_voxel_op
+    from voxel import BrickStore
+    small = {'resolution': 16, 'parts': [{'id': 'tail', 'bbox': {'min': [8, 0, 0], 'max': [11, 3, 3]}}]}
+    store = BrickStore.from_array(np.array([[x, 1, 1, 1] for x in range(8, 12)] + [[9, 2, 2, 2]]), meta={'res': 16})
+    apply_voxel_op(store, {'op': 'scale', 'part': 'tail', 'factor': 2, 'axis': 0, 'direction': 1}, small)
+    cells = {tuple(v[:3]): v[3] for v in store.to_array().tolist()}
+    assert {cell for cell, c in cells.items() if c == 2} == {(9, 2, 2)}
+    assert sorted(x for (x, y, z), c in cells.items() if c == 1) == list(range(8, 16))
+
+
+def test_downsample_majority_and_first():
+    """Majority picks the dominant color per coarse cell; first keeps the first writer"""
+    from voxel.lod import downsample, build_pyramid
+    vox = np.array([
+        [0, 0, 0, 3], [1, 0, 0, 5], [0, 1, 0, 5], [1, 1, 1, 3],   # cell (0,0,0): 3 vs 5 tie -> 3
+        [2, 0, 0, 1], [3, 0, 0, 6], [3, 1, 0, 6],                 # cell (1,0,0): 6 wins
+    ], dtype=np.int32)
+    assert downsample(vox, 4, 2).tolist() == [[0, 0, 0, 3], [1, 0, 0, 6]]
+    assert downsample(vox, 4, 2, mode='first').tolist() == [[0, 0, 0, 3], [1, 0, 0, 1]]
+
+    plan = _dragon_plan(128)
+    merged, _ = merge_parts(rasterize_part(p, plan) for p in plan['parts'])
+    levels = build_pyramid(merged, plan['lods'])
+    assert sorted(levels) == plan['lods']
+    for lod, level in levels.items():
+        assert level[:, :3].min() >= 0 and level[:, :3].max() < lod
+    assert len(levels[32]) < len(levels[64]) < len(levels[128])
+
+
+def test_run_job_pyramid_exports_every_lod(backend, tmp_path):
+    """Pyramid jobs generate parts once and still export one artifact per LOD"""
+    backend.run_job('job_pyramid', {'mode': 'voxel', 'resolution': 128, 'subject': 'dragon'})
+    job = backend.jobs.pop('job_pyramid')
+    assert job['status'] == 'completed'
+    assert sorted(int(k) for k in job['artifacts']['lods']) == [32, 64, 96, 128]
+    generated = [p for p in job['progress'] if p['msg'].startswith('Part ')]
+    assert len(generated) == len(job['plan']['parts'])
+    lod32 = backend.read_json(str(tmp_path / os.path.basename(job['artifacts']['lods']['32']['path'])))
+    assert lod32['res'] == 32 and lod32['scale'] == 4.0
+    assert max(max(v['x'], v['y'], v['z']) for v in lod32['voxels']) < 32
+
+    lod128 = job['artifacts']['lods']['128']
+    assert lod128['triangles'] > 0 and (tmp_path / 'glb' / os.path.basename(lod128['glb'])).exists()
+    assert backend.manifest_index.get('job_pyramid')['artifacts']['lods']['128']['glb'] == lod128['glb']
+
+    stage_names = {s['stage'] for s in job['stages']}
+    assert {'plan', 'generate', 'assemble', 'downsample', 'materials', 'validate', 'mesh', 'export'} <= stage_names
+    assert {s['status'] for s in job['stages'] if s['stage'] in ('references', 'optimize')} == {'skipped'}
+    assert all(ms >= 0 for ms in job['stage_ms'].values())
+    writes = [s for s in job['stages'] if s['stage'] == 'write']
+    assert sorted(s['lod'] for s in writes) == sorted(int(l) for l in job['artifacts']['lods'])
+    exported = [e for e in job['progress'] if e['msg'].startswith('Exported LOD')]
+    assert exported and all(e['write_ms'] >= 0 for e in exported)
+
+
+def test_failed_lower_lod_waits_for_queued_writes(backend, monkeypatch):
+    """A LOD failing validation after the top LOD's writes were queued fails the job only once they landed"""
+    import threading
+    from concurrent.futures import Future
+    original_scene, original_write = backend.build_voxel_scene, backend.manifest_index.write
+
+    def _scene(vox, lod, **kw):
+        scene = original_scene(vox, lod, **kw)
+        return dict(scene, voxels=[]) if lod == 32 else scene
+
+    def _slow_write(job_id, manifest):
+        inner, out = original_write(job_id, manifest), Future()
+        threading.Timer(0.3, lambda: out.set_result(inner.result())).start()
+        return out
+
+    monkeypatch.setattr(backend, 'build_voxel_scene', _scene)
+    monkeypatch.setattr(backend.manifest_index, 'write', _slow_write)
+    backend.run_job('job_lowfail', {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False})
+    job = backend.jobs.pop('job_lowfail')
+    events = [(e.get('event'), e.get('lod'), e.get('status')) for e in job['progress']]
+    assert events[-1] == ('status', None, 'failed') and job['error'] == 'Empty geometry after generation'
+    assert events.index(('lod_ready', 64, None)) < len(events) - 1
+    assert not any(lod == 32 for kind, lod, _ in events if kind == 'lod_ready')
+
+
+def test_regenerated_lods_use_their_own_grid(backend):
+    """Regenerate mode writes every LOD in its own grid, so edits on a lower LOD see all of it"""
+    backend.run_job('job_regen', {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False,
+                                  'lod_mode': 'regenerate'})
+    backend.jobs.pop('job_regen')
+    low = backend.manifest_index.voxel_artifact('job_regen', 32)
+    scene = backend.load_voxel_artifact(low)
+    assert scene['res'] == 32 and scene['voxels']
+    assert max(max(v['x'], v['y'], v['z']) for v in scene['voxels']) < 32
+    client = backend.app.test_client()
+    resp = client.post('/jobs/job_regen/edits', json={'lod': 32, 'ops': [
+        'add block at 31,31,31 color blue', 'make the tail longer',
+        {'op': 'erase', 'region': {'shape': 'box', 'min': [0, 0, 0], 'max': [31, 31, 31]}}]})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert all(r['applied'] for r in body['results'])
+    # erasing the whole 32^3 grid reaches every voxel of the LOD
+    assert body['changes']['set'] == [] and len(body['changes']['removed']) == len(scene['voxels'])
+    assert client.get(body['artifact']['path']).get_json()['voxels'] == []
+
+
+def test_repeat_job_reuses_cached_lods(backend):
+    """A second job with the same plan is served entirely from the LOD cache"""
+    prompt = {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon'}
+    backend.run_job('job_cache_1', prompt)
+    first = backend.jobs.pop('job_cache_1')
+    backend.run_job('job_cache_2', prompt)
+    second = backend.jobs.pop('job_cache_2')
+    assert second['status'] == 'completed'
+    assert second['cache'] == {'hits': 2, 'misses': 0}
+    assert not any(s['stage'] == 'generate' for s in second['stages'])
+    for lod, artifact in first['artifacts']['lods'].items():
+        assert second['artifacts']['lods'][lod]['hash'] == artifact['hash']
+        assert second['artifacts']['lods'][lod]['cached'] is True
+    stats = backend.artifact_cache.stats()
+    assert stats['hits'] == 2 and stats['misses'] == 2
+
+    # bypassing the cache regenerates
+    backend.run_job('job_cache_3', dict(prompt, cache=False))
+    third = backend.jobs.pop('job_cache_3')
+    assert any(s['stage'] == 'generate' for s in third['stages'])
+
+    # a job without the GLB export keeps its own entries and does not shadow the meshed ones
+    backend.run_job('job_cache_4', dict(prompt, glb=False))
+    assert backend.jobs.pop('job_cache_4')['cache'] == {'hits': 0, 'misses': 2}
+    backend.run_job('job_cache_5', prompt)
+    fifth = backend.jobs.pop('job_cache_5')
+    assert fifth['cache'] == {'hits': 2, 'misses': 0}
+    assert all(a.get('glb') for a in fifth['artifacts']['lods'].values())
+
+
+def test_job_stream_progressive_and_replay(backend, monkeypatch):
+    """Parts stream as brick chunks before their LOD is written; finished jobs replay the artifact"""
+    import json
+    from voxel.stream import VoxelStream
+    runs = []
+    monkeypatch.setattr(backend, 'VoxelStream', lambda: runs.append(VoxelStream()) or runs[-1])
+    backend.run_job('job_stream', {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False})
+    job = backend.jobs.pop('job_stream')
+    assert job['status'] == 'completed' and job['ttfv_ms'] > 0
+    stream = runs[0]
+    assert stream.closed and 'job_stream' not in backend.job_streams
+    types = [e['type'] for e in stream.entries]
+    # every voxel chunk of a LOD comes before that LOD is published
+    assert types[0] == 'voxels' and types.index('lod_ready') > max(i for i, t in enumerate(types) if t == 'voxels')
+    streamed = {tuple(v[:3]) for e in stream.entries if e['type'] == 'voxels' for v in e['voxels'].tolist()}
+    final = backend.load_voxel_artifact(job['artifacts']['lods']['64'])
+    assert streamed == {(v['x'], v['y'], v['z']) for v in final['voxels']}
+
+    client = backend.app.test_client()
+    resp = client.get('/jobs/job_stream/stream?lod=64')
+    assert resp.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in resp.data.splitlines()]
+    assert lines[0]['type'] == 'meta' and lines[-1] == {'type': 'end', 'status': 'completed'}
+    replayed = [v for line in lines if line['type'] == 'voxels' for v in line['voxels']]
+    assert sorted(map(tuple, replayed)) == sorted((v['x'], v['y'], v['z'], v['c']) for v in final['voxels'])
+
+    # live stream: resume after a seq, filter by LOD
+    live = VoxelStream()
+    backend.job_streams['job_live'] = live
+    live.add_voxels(32, 'body', np.array([[0, 0, 0, 1]]))
+    live.add_voxels(64, 'body', np.array([[1, 1, 1, 2], [9, 9, 9, 3]]))
+    live.close('completed')
+    lines = [json.loads(line) for line in client.get('/jobs/job_live/stream?lod=64&since=0').data.splitlines()]
+    assert [line['type'] for line in lines] == ['meta', 'voxels', 'end']
+    assert lines[1]['seq'] == 2 and len(lines[1]['voxels']) == 2
+    lines = [json.loads(line) for line in client.get('/jobs/job_live/stream?since=2').data.splitlines()]
+    assert [line['type'] for line in lines] == ['meta', 'end']
+    backend.job_streams.pop('job_live')
+    assert client.get('/jobs/nope/stream').status_code == 404
+
+
+def test_greedy_mesh_merges_faces_and_encodes_glb():
+    """Coplanar same-color faces merge into quads covering every exposed face once"""
+    import json
+    import struct
+    from voxel.mesh import greedy_quads, exposed_faces, encode_glb
+    one = np.array([[0, 0, 0, 1]])
+    assert len(greedy_quads(one)) == 6
+    cube = np.array([[x, y, z, 2] for x in range(4) for y in range(4) for z in range(4)])
+    assert len(greedy_quads(cube)) == 6
+    striped = cube.copy()
+    striped[striped[:, 0] == 0, 3] = 5
+    quads = greedy_quads(striped)
+    # x=0 slab and the rest differ in color: 1 + 1 end caps, 4 sides split in two
+    assert len(quads) == 2 + 4 * 2
+
+    plan = _dragon_plan(64)
+    merged, _ = merge_parts(rasterize_part(p, plan) for p in plan['parts'])
+    quads = greedy_quads(merged)
+    area = int(((quads[:, 4] - quads[:, 3]) * (quads[:, 6] - quads[:, 5])).sum())
+    assert area == sum(len(f) for _, _, f in exposed_faces(merged))
+
+    glb, stats = encode_glb(merged, ['#c62828'] * 8, scale=0.5)
+    assert stats['triangles'] == 2 * len(quads) and stats['triangles'] < stats['naive_triangles'] // 3
+    magic, version, total = struct.unpack_from('<III', glb)
+    assert (magic, version, total) == (0x46546C67, 2, len(glb))
+    json_len, _ = struct.unpack_from('<II', glb, 12)
+    gltf = json.loads(glb[20:20 + json_len])
+    prims = gltf['meshes'][0]['primitives']
+    assert len(prims) == len(np.unique(merged[:, 3])) == len(gltf['materials'])
+    assert sum(gltf['accessors'][p['indices']]['count'] for p in prims) == 3 * stats['triangles']
+    assert gltf['accessors'][0]['max'][0] <= 32.0
+
+
+def test_artifact_cache_lru_eviction(tmp_path):
+    """Index is LRU bounded, persisted, deletes evicted files and drops entries whose files vanished"""
+    from voxel.cache import ArtifactCache
+    for name in ('a', 'b', 'c', 'd'):
+        (tmp_path / f'{name}.json').write_text('{}')
+    index = str(tmp_path / 'index.json')
+    resolve = lambda p: str(tmp_path / os.path.basename(p))
+    cache = ArtifactCache(index, max_entries=2, resolve=resolve)
+    cache.put('ka', {'path': '/artifacts/voxels/a.json'})
+    cache.put('kb', {'path': '/artifacts/voxels/b.json'})
+    assert cache.get('ka') is not None          # ka becomes most recent
+    cache.put('kc', {'path': '/artifacts/voxels/c.json'})
+    assert cache.get('kb') is None and cache.stats()['evictions'] == 1
+    assert not (tmp_path / 'b.json').exists()
+
+    reloaded = ArtifactCache(index, max_entries=2, resolve=resolve)
+    assert set(reloaded.entries) == {'ka', 'kc'}
+    os.remove(tmp_path / 'c.json')
+    assert reloaded.get('kc') is None and set(reloaded.entries) == {'ka'}
+
+    # files another entry still names survive; the byte bound applies to disk too
+    reloaded.put('ka2', {'path': '/artifacts/voxels/a.json'})
+    reloaded.put('kd', {'path': '/artifacts/voxels/d.json'})
+    assert set(reloaded.entries) == {'ka2', 'kd'} and (tmp_path / 'a.json').exists()
+    tiny = ArtifactCache(str(tmp_path / 'tiny.json'), max_bytes=1, resolve=resolve)
+    tiny.put('kd', {'path': '/artifacts/voxels/d.json'})
+    assert not tiny.entries and not (tmp_path / 'd.json').exists()
+
+
+def test_artifact_cache_keeps_files_manifests_use(backend, tmp_path):
+    """Evicting an entry leaves files a job manifest still names; hits do not rewrite the index"""
+    from voxel.cache import ArtifactCache
+    backend.run_job('job_evict', {'mode': 'voxel', 'resolution': 32, 'subject': 'cube', 'cache': False})
+    backend.jobs.pop('job_evict')
+    artifact = backend.manifest_index.voxel_artifact('job_evict')
+    (tmp_path / 'orphan.json').write_text('{}')
+    index = tmp_path / 'small_index.json'
+    cache = ArtifactCache(str(index), max_entries=1, resolve=backend._artifact_file,
+                          remove=backend._remove_artifact_file, referenced=backend._referenced_artifacts)
+    cache.put('kjob', artifact)
+    cache.put('korphan', {'path': '/artifacts/voxels/orphan.json'})
+    cache.put('kjob', artifact)
+    assert os.path.exists(backend._artifact_file(artifact['path']))
+    assert not (tmp_path / 'orphan.json').exists()
+    client = backend.app.test_client()
+    assert client.post('/jobs/job_evict/edit', json={'instruction': 'add block at 1,1,1'}).status_code == 200
+
+    before = index.read_bytes()
+    assert cache.get('kjob') is not None and cache.dirty and index.read_bytes() == before
+    cache.flush()
+    assert not cache.dirty and index.read_bytes() != before
+
+
+def test_identical_jobs_coalesce(backend, monkeypatch):
+    """Identical in-flight submissions share one job; a finished job does not absorb new ones"""
+    submitted = []
+
+    class _Recorder:
+        def submit(self, fn, *args):
+            submitted.append((fn, args))
+
+    monkeypatch.setattr(backend.scheduler, 'jobs', _Recorder())
+    client = backend.app.test_client()
+    body = {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon'}
+    first = client.post('/jobs', json=body).get_json()
+    second = client.post('/jobs', json=dict(body, subject='  Dragon ')).get_json()
+    assert second['jobId'] == first['jobId'] and second['coalesced'] is True
+    assert len(submitted) == 1
+    assert backend.jobs[first['jobId']]['subscribers'] == 2
+
+    fn, args = submitted[0]
+    fn(*args)
+    job = backend.jobs.pop(first['jobId'])
+    assert job['status'] == 'completed', job.get('error')
+    assert job['subscribers'] == 2
+    assert job['prompt_key'] not in backend.inflight_jobs
+
+    third = client.post('/jobs', json=body).get_json()
+    assert 'coalesced' not in third and len(submitted) == 2
+    backend.jobs.pop(third['jobId'])
+    backend.inflight_jobs.clear()
+
+
+def test_job_admission_is_bounded(backend, monkeypatch):
+    """Past workers + queue_limit, /jobs answers 429; queued jobs report their position"""
+    submitted = []
+
+    class _Recorder:
+        def submit(self, fn, *args):
+            submitted.append((fn, args))
+
+    sched = backend.JobScheduler(workers=1, part_workers=2, queue_limit=1)
+    sched.jobs = _Recorder()
+    monkeypatch.setattr(backend, 'scheduler', sched)
+    client = backend.app.test_client()
+    first = client.post('/jobs', json={'subject': 'cube'}).get_json()
+    second = client.post('/jobs', json={'subject': 'sphere'}).get_json()
+    assert (first['queuePosition'], second['queuePosition']) == (0, 1)
+    resp = client.post('/jobs', json={'subject': 'cone'})
+    assert resp.status_code == 429 and resp.headers['Retry-After']
+    assert client.get(f"/jobs/{second['jobId']}").get_json()['queuePosition'] == 1
+
+    # unknown LOD options are rejected before admission
+    assert client.post('/jobs', json={'subject': 'cone', 'lod_mode': 'pyramids'}).status_code == 400
+    assert client.post('/jobs', json={'subject': 'cone', 'lod_downsample': 'mean'}).status_code == 400
+    assert client.post('/jobs', json={'subject': 'cone', 'cache': 'maybe'}).status_code == 400
+    assert backend._flag_arg('false', True) is False and backend._flag_arg(None, True) is True
+    stats = client.get('/scheduler/stats').get_json()
+    assert stats['queued'] == 2 and stats['rejected'] == 1 and stats['admitted'] == 2
+    # once a job leaves the queue there is room again
+    sched.waiting.remove(first['jobId'])
+    assert client.post('/jobs', json={'subject': 'cone'}).status_code == 200
+    for job_id in list(sched.waiting):
+        backend.jobs.pop(job_id, None)
+    backend.inflight_jobs.clear()
+
+
+def test_job_submit_after_shutdown_fails_cleanly(backend, monkeypatch):
+    """A shut-down job pool answers 503 and leaves no queued job or in-flight entry behind"""
+    sched = backend.JobScheduler(workers=1, part_workers=1, queue_limit=1)
+    sched.jobs.shutdown()
+    monkeypatch.setattr(backend, 'scheduler', sched)
+    client = backend.app.test_client()
+    resp = client.post('/jobs', json={'subject': 'cube'})
+    assert resp.status_code == 503
+    job_id = resp.get_json()['jobId']
+    assert backend.jobs[job_id]['status'] == 'failed'
+    assert backend.job_registry.state(job_id)['status'] == 'failed'
+    assert not backend.inflight_jobs and not sched.waiting
+    # the part backlog is counted by the scheduler itself
+    assert sched.submit_part(lambda x: x + 1, 1).result() == 2
+    assert sched.stats()['part_backlog'] == 0
+    sched.parts.shutdown()
+    backend.jobs.pop(job_id)
+
+
+def test_job_events_stream_and_resume(backend):
+    """Subscribers get numbered progress, LOD-ready and status events; a resume replays only what was missed"""
+    job_id = 'job_stream'
+    backend.jobs[job_id] = {'id': job_id, 'status': 'queued', 'progress': []}
+    live = backend.socketio.test_client(backend.app)
+    live.get_received()
+    live.emit('subscribe_job', {'job_id': job_id})
+    backend.run_job(job_id, {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False})
+    received = [(m['name'], m['args'][0]) for m in live.get_received()]
+    events = [(name, payload) for name, payload in received if name.startswith('job_') and name != 'job_subscribed']
+    seqs = [payload['seq'] for _, payload in events]
+    assert seqs == list(range(1, len(seqs) + 1))
+    names = [name for name, _ in events]
+    assert names.count('job_lod_ready') == len(backend.jobs[job_id]['artifacts']['lods'])
+    assert names[-1] == 'job_status' and events[-1][1]['status'] == 'completed'
+
+    cursor = seqs[len(seqs) // 2]
+    late = backend.socketio.test_client(backend.app)
+    late.get_received()
+    late.emit('subscribe_job', {'job_id': job_id, 'since': cursor})
+    replay = late.get_received()
+    assert [m['args'][0]['seq'] for m in replay[:-1]] == seqs[len(seqs) // 2 + 1:]
+    assert replay[-1]['name'] == 'job_subscribed' and replay[-1]['args'][0]['seq'] == seqs[-1]
+    live.disconnect()
+    late.disconnect()
+    backend.jobs.pop(job_id)
+
+
+def test_get_job_since_cursor_and_summary(backend):
+    """?since returns only newer progress entries; view=summary stays fixed-size"""
+    job_id = 'job_cursor'
+    backend.run_job(job_id, {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False})
+    client = backend.app.test_client()
+    full = client.get(f'/jobs/{job_id}').get_json()
+    seq = full['seq']
+    assert [e['seq'] for e in full['progress']] == list(range(1, seq + 1))
+
+    tail = client.get(f'/jobs/{job_id}?since={seq - 2}').get_json()
+    assert [e['seq'] for e in tail['progress']] == [seq - 1, seq]
+    assert client.get(f'/jobs/{job_id}?since={seq}').get_json()['progress'] == []
+
+    summary = client.get(f'/jobs/{job_id}?view=summary').get_json()
+    assert summary['status'] == 'completed' and summary['percent'] == 100 and summary['seq'] == seq
+    assert summary['stage']['name'] == 'export' and 'progress' not in summary
+    lods = full['artifacts']['lods']
+    # the finest LOD, although the pyramid publishes it first
+    assert summary['artifact']['hash'] == lods[str(max(map(int, lods)))]['hash']
+    assert not {'prompt_key', 'subscribers'} & set(full)
+    delta = client.get(f'/jobs/{job_id}?view=summary&since={seq - 1}').get_json()
+    assert [e['seq'] for e in delta['progress']] == [seq]
+    backend.jobs.pop(job_id)
+
+
+def test_job_registry_evicts_and_recovers(backend, monkeypatch, tmp_path):
+    """Finished jobs leave memory but stay readable; interrupted jobs are re-queued or failed on restart"""
+    from job_registry import JobRegistry
+    registry = JobRegistry(str(tmp_path / 'jobs.sqlite3'), max_finished=1)
+    monkeypatch.setattr(backend, 'job_registry', registry)
+    prompt = {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False}
+    backend.run_job('job_reg_1', prompt)
+    backend.run_job('job_reg_2', prompt)
+    assert 'job_reg_1' not in backend.jobs and 'job_reg_2' in backend.jobs
+    client = backend.app.test_client()
+    evicted = client.get('/jobs/job_reg_1').get_json()
+    assert evicted['status'] == 'completed' and evicted['attempt'] == 1 and evicted['artifacts']['lods']
+    assert client.get('/jobs/job_reg_1?view=summary').get_json()['percent'] == 100
+    backend.jobs.pop('job_reg_2')
+
+    # simulate a crash: two jobs still queued, one that already ran out of attempts
+    registry.record('job_crash_q', 'queued', prompt=prompt, created_at='t0')
+    registry.record('job_crash_d', 'queued', prompt=dict(prompt, subject='sphere'), created_at='t0')
+    registry.record('job_crash_r', 'queued', prompt=dict(prompt, subject='cube'), created_at='t0')
+    registry.record('job_crash_r', 'running', attempt=registry.max_attempts)
+    restarted = JobRegistry(str(tmp_path / 'jobs.sqlite3'))
+    monkeypatch.setattr(backend, 'job_registry', restarted)
+    submitted = []
+
+    class _Recorder:
+        def submit(self, fn, *args):
+            submitted.append((fn, args))
+
+    # room for one job: the other stays queued until the first finishes
+    sched = backend.JobScheduler(workers=1, part_workers=2, queue_limit=0)
+    sched.jobs = _Recorder()
+    sched.on_finish = backend.resume_recovered_jobs
+    monkeypatch.setattr(backend, 'scheduler', sched)
+    assert backend.recover_jobs() == {'requeued': 1, 'deferred': 1, 'failed': 1}
+    assert backend.jobs['job_crash_r']['status'] == 'failed'
+    assert backend.jobs['job_crash_d']['status'] == 'queued' and len(submitted) == 1
+    fn, args = submitted[0]
+    fn(*args)
+    assert backend.jobs['job_crash_q']['status'] == 'completed'
+    assert restarted.state('job_crash_q')['attempt'] == 1 and len(submitted) == 2
+    fn, args = submitted[1]
+    fn(*args)
+    assert backend.jobs['job_crash_d']['status'] == 'completed' and restarted.interrupted() == []
+    assert not backend.recovery_backlog
+    sched.parts.shutdown()
+    for job_id in ('job_crash_q', 'job_crash_d', 'job_crash_r'):
+        backend.jobs.pop(job_id)
+
+
+def test_first_request_recovers_jobs_once(backend, monkeypatch):
+    """Hosts that import app without main() recover on their first request, once per process"""
+    calls = []
+    monkeypatch.setattr(backend, 'recovered_once', False)
+    monkeypatch.setattr(backend, 'recover_jobs', lambda: calls.append(1) or {'requeued': 0})
+    client = backend.app.test_client()
+    client.get('/jobs/job_none')
+    client.get('/jobs/job_none')
+    assert calls == [1] and backend.recovered_once
+
+
+def test_manifest_index_lookup_list_and_edit(backend, monkeypatch):
+    """Manifests are served from the index; edits resolve the top LOD artifact without a voxel_json entry"""
+    from manifest_index import ManifestIndex
+    backend.run_job('job_idx_dragon', {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False})
+    backend.jobs.pop('job_idx_dragon')
+    backend.manifest_index.write('job_idx_cube', {'jobId': 'job_idx_cube', 'prompt': {'subject': 'Cube'},
+                                                  'artifacts': {}, 'created_at': '2000-01-01T00:00:00'})
+    client = backend.app.test_client()
+    listed = client.get('/jobs?subject=DRAG').get_json()['jobs']
+    assert [j['jobId'] for j in listed] == ['job_idx_dragon'] and listed[0]['lods']
+    assert [j['jobId'] for j in client.get('/jobs?until=2001').get_json()['jobs']] == ['job_idx_cube']
+
+    top = max(listed[0]['lods'])
+    resp = client.post('/jobs/job_idx_dragon/edit', json={'instruction': 'add block at 0,0,0 color blue'})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    # only the changed cells come back unless the scene is asked for
+    assert 'voxel' not in body and body['res'] == top
+    assert body['changes'] == {'removed': [], 'set': [{'x': 0, 'y': 0, 'z': 0, 'c': 5}]}
+    assert client.post('/jobs/job_idx_cube/edit', json={'instruction': 'x'}).status_code == 400
+    # edits chain: the next one starts from the indexed state of the first without decoding anything
+    monkeypatch.setattr(backend, 'load_voxel_artifact', None)
+    body = client.post('/jobs/job_idx_dragon/edit?voxels=1', json={'instruction': 'erase near 1,1,1 radius 0'}).get_json()
+    assert {'x': 0, 'y': 0, 'z': 0} in [{k: v[k] for k in 'xyz'} for v in body['voxel']['voxels']]
+
+    # a fresh index rebuilt from disk sees the same manifests, including the edit
+    reloaded = ManifestIndex(backend.MANIFEST_DIR)
+    assert len(reloaded.get('job_idx_dragon')['edits']) == 2
+    assert reloaded.list(subject='cube')[0]['jobId'] == 'job_idx_cube'
+
+
+def test_batch_edit_one_artifact_one_manifest_entry(backend, monkeypatch):
+    """A batch of mixed ops is applied to one working copy and recorded once"""
+    backend.run_job('job_batch', {'mode': 'voxel', 'resolution': 32, 'subject': 'dragon', 'cache': False})
+    backend.jobs.pop('job_batch')
+    client = backend.app.test_client()
+    writes = []
+    original = backend.write_voxel_artifact
+    monkeypatch.setattr(backend, 'write_voxel_artifact', lambda h, scene: writes.append(h) or original(h, scene))
+    ops = [
+        'add block at 0,0,0 color blue',
+        {'op': 'fill', 'region': {'shape': 'box', 'min': [0, 31, 0], 'max': [1, 31, 1]}, 'color': 'green'},
+        {'op': 'erase', 'region': {'shape': 'sphere', 'center': [0, 31, 0], 'radius': 0}},
+        'sing a song',
+    ]
+    resp = client.post('/jobs/job_batch/edits?voxels=1', json={'ops': ops})
+    assert resp.status_code == 200 and writes == []
+    body = resp.get_json()
+    assert [r['applied'] for r in body['results']] == [True, True, True, False]
+    cells = {(v['x'], v['y'], v['z']): v['c'] for v in body['voxel']['voxels']}
+    assert cells[(0, 0, 0)] == 5 and (0, 31, 0) not in cells and cells[(1, 31, 1)] == 4
+    edits = backend.manifest_index.get('job_batch')['edits']
+    assert len(edits) == 1 and edits[0]['ops'] == ops and edits[0]['delta']['bytes'] > 0
+
+    bad = client.post('/jobs/job_batch/edits', json={'ops': ['add block at 1,1,1', {'op': 'add'}]})
+    assert bad.status_code == 400 and 'op 1' in bad.get_json()['error']
+    assert client.post('/jobs/job_batch/edits', json={'ops': []}).status_code == 400
+    # malformed LODs are client errors on every route that takes one
+    for lod in ('big', -32, 32.5, True, [32]):
+        assert client.post('/jobs/job_batch/edits', json={'ops': ops[:1], 'lod': lod}).status_code == 400
+        assert client.post('/jobs/job_batch/sessions', json={'lod': lod}).status_code == 400
+    assert client.post('/jobs/job_batch/edit', json={'instruction': ops[0], 'lod': 'x'}).status_code == 400
+    assert client.get('/jobs/job_batch/stream?lod=abc').status_code == 400
+    assert len(backend.manifest_index.get('job_batch')['edits']) == 1
+
+
+def test_store_diff_and_delta_roundtrip():
+    """diff() reports only changed cells of written bricks; the .vdelta codec round-trips them"""
+    from voxel.store import BrickStore
+    from voxel.delta import encode_delta, decode_delta, apply_delta, VoxelDeltaError
+    base = BrickStore.from_array(np.array([[x, y, 0, 1] for x in range(16) for y in range(16)]))
+    edited = base.copy()
+    edited.set(0, 0, 0, 1)  # unchanged color: touched but not different
+    edited.set(3, 3, 0, 2)
+    edited.remove(15, 15, 0)
+    edited.set_many(np.array([[x, 0, 5, 4] for x in range(10)]))
+    removed, upserts = edited.diff(base)
+    assert removed.tolist() == [[15, 15, 0]]
+    assert sorted(map(tuple, upserts.tolist())) == sorted([(3, 3, 0, 2)] + [(x, 0, 5, 4) for x in range(10)])
+    data = encode_delta(removed, upserts)
+    r2, u2 = decode_delta(data)
+    assert r2.tolist() == removed.tolist() and sorted(map(tuple, u2.tolist())) == sorted(map(tuple, upserts.tolist()))
+    replay = base.copy()
+    apply_delta(replay, r2, u2)
+    assert sorted(map(tuple, replay.to_array().tolist())) == sorted(map(tuple, edited.to_array().tolist()))
+    with pytest.raises(VoxelDeltaError):
+        decode_delta(b'B3DV' + data[4:])
+
+
+def test_edit_history_deltas_keyframes_and_reconstruction(backend, monkeypatch):
+    """Edits store small deltas chained from the LOD; keyframes bound replay; any state is rebuilt on demand"""
+    monkeypatch.setattr(backend, 'EDIT_KEYFRAME_EVERY', 3)
+    backend.run_job('job_hist', {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False})
+    backend.jobs.pop('job_hist')
+    client = backend.app.test_client()
+    base = backend.manifest_index.voxel_artifact('job_hist')
+    full_bytes = os.path.getsize(backend._artifact_file(base['binary']))
+    states = []
+    for i in range(4):
+        body = client.post('/jobs/job_hist/edit?voxels=1',
+                           json={'instruction': f'add block at {i},0,0 color blue'}).get_json()
+        states.append(sorted((v['x'], v['y'], v['z'], v['c']) for v in body['voxel']['voxels']))
+    edits = backend.manifest_index.get('job_hist')['edits']
+    assert [e['delta']['set'] for e in edits] == [1, 1, 1, 1]
+    assert all(e['delta']['bytes'] < full_bytes / 20 for e in edits)
+    assert [e['parent'] for e in edits[1:]] == [e['hash'] for e in edits[:-1]] and edits[0]['parent'] == base['hash']
+    assert [bool(e['keyframe']) for e in edits] == [False, False, True, False]
+    assert client.get(edits[0]['delta']['path']).status_code == 200
+
+    # rebuilt from disk: the base plus deltas for edit 1, the keyframe plus one delta for edit 3
+    backend.edit_indexes.clear()
+    loads = []
+    original = backend.load_voxel_artifact
+    monkeypatch.setattr(backend, 'load_voxel_artifact', lambda a: loads.append(a['hash']) or original(a))
+    for n in (1, 3):
+        resp = client.get(edits[n]['artifact']['path'])
+        assert resp.status_code == 200 and resp.headers['Cache-Control'].endswith('immutable')
+        got = sorted((v['x'], v['y'], v['z'], v['c']) for v in resp.get_json()['voxels'])
+        assert got == states[n]
+    assert loads == [base['hash'], edits[2]['hash']]
+    etag = client.get(edits[3]['artifact']['path']).headers['ETag']
+    assert client.get(edits[3]['artifact']['path'], headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/jobs/job_hist/edits/9/voxels').status_code == 404
+
+
+def test_edit_session_deltas_commit_and_eviction(backend, monkeypatch):
+    """Sessions edit a pinned working copy, broadcast only changed cells and commit once (explicitly or on idle)"""
+    import time
+    backend.run_job('job_sess', {'mode': 'voxel', 'resolution': 64, 'subject': 'dragon', 'cache': False})
+    backend.jobs.pop('job_sess')
+    client = backend.app.test_client()
+    sio = backend.socketio.test_client(backend.app, flask_test_client=client)
+    opened = client.post('/jobs/job_sess/sessions', json={}).get_json()
+    sid = opened['sessionId']
+    assert client.post('/jobs/job_sess/sessions', json={}).get_json()['sessionId'] == sid
+    sio.emit('join_edit_session', {'session_id': sid})
+    sio.get_received()
+
+    base = backend.BrickStore.from_scene(client.get(opened['artifact']['path']).get_json())
+    out = client.post(f'/jobs/job_sess/sessions/{sid}/ops', json={'instruction': 'add block at 0,0,0 color blue'}).get_json()
+    assert out['version'] == 1 and out['set'] == [[0, 0, 0, 5]] and out['removed'] == []
+    sio.emit('edit_session_ops', {'session_id': sid, 'ops': [
+        {'op': 'fill', 'region': {'shape': 'box', 'min': [0, 0, 1], 'max': [1, 1, 1]}, 'color': 'green'}]})
+    received = sio.get_received()
+    deltas = [e['args'][0] for e in received if e['name'] == 'edit_delta']
+    events = {e['name']: e['args'][0] for e in received}
+    assert [d['version'] for d in deltas] == [1, 2] and events['edit_delta']['version'] == 2 and len(events['edit_delta']['set']) == 4
+    assert events['edit_session_applied']['results'][0]['applied']
+    # a client joining now gets the working copy, pending edits included, and the version it contains
+    joined = client.post('/jobs/job_sess/sessions', json={}).get_json()
+    assert joined['artifact'] == opened['artifact']
+    resp = client.get(joined['voxels']['path'])
+    assert resp.headers['X-Edit-Session-Version'] == '2'
+    assert backend.BrickStore.from_scene(resp.get_json()).get(0, 0, 0) == 5
+    # a failing batch is rolled back and leaves no trace
+    bad = client.post(f'/jobs/job_sess/sessions/{sid}/ops', json={'ops': ['add block at 5,5,5 color red', {'op': 'add'}]})
+    assert bad.status_code == 400 and client.get(f'/jobs/job_sess/sessions/{sid}').get_json()['pending'] == 2
+    assert backend.manifest_index.get('job_sess').get('edits') is None
+
+    edit = client.post(f'/jobs/job_sess/sessions/{sid}/commit').get_json()['edit']
+    assert edit['session'] == sid and edit['delta']['set'] == 5
+    # replaying the broadcast deltas on the opening state gives the committed state
+    for d in deltas:
+        base.remove_many(np.array(d['removed'], dtype=np.int32).reshape(-1, 3))
+        base.set_many(np.array(d['set'], dtype=np.int32).reshape(-1, 4))
+    committed = client.get(edit['artifact']['path']).get_json()
+    assert backend.BrickStore.from_scene(committed).get(5, 5, 5) is None
+    assert sorted(map(tuple, base.to_array().tolist())) == \
+        sorted((v['x'], v['y'], v['z'], v['c']) for v in committed['voxels'])
+
+    # an edit outside the session moves the chain; the next commit replays the session's ops on top of
+    # it and resyncs clients. An idle commit that fails keeps the session and its edits.
+    local = backend.BrickStore.from_scene(client.get(f'/jobs/job_sess/sessions/{sid}/voxels').get_json())
+    sio.get_received()
+    client.post('/jobs/job_sess/edit', json={'instruction': 'add block at 2,0,0 color red'})
+    client.post(f'/jobs/job_sess/sessions/{sid}/ops', json={'instruction': 'remove block at 0,0,0'})
+    later = time.monotonic() + backend.edit_sessions.idle_s
+    record_edit = backend._record_edit
+
+    def broken(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(backend, '_record_edit', broken)
+    assert backend.edit_sessions.sweep(now=later) == []
+    assert backend.edit_sessions.get(sid).ops and backend.edit_sessions.failed_closes == 1
+    monkeypatch.setattr(backend, '_record_edit', record_edit)
+    assert backend.edit_sessions.sweep(now=later) == [(sid, 'idle')]
+    assert backend.edit_sessions.get(sid) is None and backend.edit_sessions.evicted['idle'] == 1
+    received = sio.get_received()
+    names = [e['name'] for e in received]
+    assert 'edit_session_error' in names and 'edit_session_closed' in names
+    deltas = [e['args'][0] for e in received if e['name'] == 'edit_delta']
+    assert [d.get('resync', False) for d in deltas] == [False, True]
+    for d in deltas:
+        local.remove_many(np.array(d['removed'], dtype=np.int32).reshape(-1, 3))
+        local.set_many(np.array(d['set'], dtype=np.int32).reshape(-1, 4))
+    edits = backend.manifest_index.get('job_sess')['edits']
+    assert len(edits) == 3 and edits[2]['parent'] == edits[1]['hash']
+    final = backend.BrickStore.from_scene(client.get(edits[2]['artifact']['path']).get_json())
+    assert final.get(0, 0, 0) is None and final.get(2, 0, 0) is not None
+    assert sorted(map(tuple, local.to_array().tolist())) == sorted(map(tuple, final.to_array().tolist()))
+    assert client.post(f'/jobs/job_sess/sessions/{sid}/ops', json={'instruction': 'x'}).status_code == 404
+
+    # memory pressure closes the least recently used session, never the one just opened
+    backend.edit_sessions.max_bytes = 1
+    first = client.post('/jobs/job_sess/sessions', json={}).get_json()['sessionId']
+    backend.run_job('job_sess2', {'mode': 'voxel', 'resolution': 32, 'subject': 'cube', 'cache': False})
+    backend.jobs.pop('job_sess2')
+    second = client.post('/jobs/job_sess2/sessions', json={}).get_json()['sessionId']
+    assert backend.edit_sessions.get(first) is None and backend.edit_sessions.get(second) is not None
+    assert backend.edit_sessions.evicted['memory'] == 1
+    # the head counts against the budget once the edit index no longer holds it
+    session = backend.edit_sessions.get(second)
+    assert backend.edit_sessions.pinned(session) == session.nbytes - session.head.nbytes
+    backend.edit_indexes.clear()
+    assert backend.edit_sessions.pinned(session) == session.nbytes > session.store.nbytes
+
+
+def test_artifact_writer_atomic_and_coalesced(tmp_path):
+    """Failed renders leave the old file intact; pending writes to one path coalesce to the last"""
+    import threading
+    from artifact_writer import ArtifactWriter, atomic_write
+    target = tmp_path / 'm.json'
+    atomic_write(str(target), b'old')
+
+    def boom():
+        raise RuntimeError('serializer crashed')
+
+    writer = ArtifactWriter()
+    assert writer.submit(str(target), boom).exception(timeout=5) is not None
+    assert target.read_bytes() == b'old'
+    assert [p.name for p in tmp_path.iterdir()] == ['m.json']
+
+    gate = threading.Event()
+    blocker = writer.submit(str(tmp_path / 'blocker'), lambda: gate.wait(5) and b'x')
+    futures = [writer.submit(str(target), (lambda i=i: b'v%d' % i), coalesce=True) for i in range(5)]
+    gate.set()
+    writer.flush()
+    assert blocker.result() >= 0 and len({id(f) for f in futures}) == 1
+    assert target.read_bytes() == b'v4'
+    stats = writer.stats()
+    assert stats['coalesced'] == 4 and stats['pending'] == 0
+
+
+def test_serializer_canonical_matches_stdlib():
+    """hash_dict bytes do not depend on whether the fast backend is installed"""
+    import json
+    import serializer
+    cases = [
+        {'plan': {'resolution': 64, 'scale': 0.5, 'subject': 'dragon'}, 'palette': ['#8e5b3d', '#ef4444']},
+        [1e16, 1.5e-05, 1e-4, -1e300, 0.1, 1 / 3, -0.0, 2 ** 70],
+        {'nan': float('nan'), 'inf': float('inf'), 'none': None, 'text': 'café 1e5 ,null'},
+        {1: 'int key'}, 'top level', 1e22,
+    ]
+    for case in cases:
+        assert serializer.canonical(case) == json.dumps(case, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    payload = {'b': [1, 2], 'a': {'y': 'café', 'x': None}}
+    assert serializer.loads(serializer.dumps(payload)) == payload
+    assert serializer.dumps(payload, sort_keys=True).startswith(b'{"a":')
+
+
+def test_json_provider_matches_flask_default():
+    """jsonify keeps Flask's output, e.g. HTTP-date datetimes rather than orjson's RFC 3339"""
+    from datetime import date, datetime, timezone
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    import serializer
+    app = Flask(__name__)
+    fast, default = serializer.FastJSONProvider(app), DefaultJSONProvider(app)
+    obj = {'at': datetime(2024, 5, 6, 7, 8, 9, tzinfo=timezone.utc), 'day': date(2024, 5, 6),
+           'naive': datetime(2024, 5, 6, 7, 8, 9), 'n': [1, 2.5, None]}
+    assert serializer.loads(fast.dumps(obj)) == serializer.loads(default.dumps(obj))
+    assert serializer.loads(fast.dumps(obj))['at'] == 'Mon, 06 May 2024 07:08:09 GMT'
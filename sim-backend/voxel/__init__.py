@@ -0,0 +1,27 @@
+"""
+Voxel engine for the generation pipeline
+Rasterization, sparse storage and scene helpers used by the orchestration endpoints in app.py
+"""
+
+from .raster import rasterize_part, lod_step, MAX_PART_VOXELS
+from .grid import pack_keys, unpack_keys, as_voxel_array, voxels_to_dicts, merge_parts, content_hash
+from .store import BrickStore
+from .stream import VoxelStream, brick_chunks
+from .mesh import encode_glb, greedy_quads
+
+__all__ = [
+    'rasterize_part',
+    'lod_step',
+    'MAX_PART_VOXELS',
+    'pack_keys',
+    'unpack_keys',
+    'as_voxel_array',
+    'voxels_to_dicts',
+    'merge_parts',
+    'content_hash',
+    'BrickStore',
+    'VoxelStream',
+    'brick_chunks',
+    'encode_glb',
+    'greedy_quads'
+]
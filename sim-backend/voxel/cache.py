@@ -0,0 +1,154 @@
+"""
+Content-addressed LOD artifact cache
+Maps a deterministic plan key to an already written voxel artifact so
+repeat jobs reuse it instead of regenerating. The index lives on disk next
+to the artifacts and is bounded by entry count and artifact bytes (LRU);
+evicting an entry deletes the files nothing else references.
+"""
+
+from typing import Dict, Any, Iterable, Optional, Callable
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+# artifact entry keys that name files on disk (all must exist for a hit)
+ARTIFACT_FILE_KEYS = ('path', 'binary', 'glb')
+
+
+class ArtifactCache:
+    """
+    LRU index of plan key -> artifact entry ({'path', 'binary', 'glb', 'hash', 'res', ...}).
+    Eviction removes the entry's files with remove(path) (default os.remove)
+    unless another entry or referenced() (artifact URL paths still in use,
+    e.g. by job manifests) names them. Hits only reorder the index in memory;
+    it is written on put() and flush().
+    """
+
+    def __init__(self, index_path: str, max_entries: int = 512, max_bytes: int = 2 * 1024 ** 3,
+                 resolve: Optional[Callable[[str], str]] = None,
+                 remove: Optional[Callable[[str], Any]] = None,
+                 referenced: Optional[Callable[[], Iterable[str]]] = None):
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # maps an artifact URL path (/artifacts/voxels/x.json) to a filesystem path
+        self.resolve = resolve or (lambda p: p)
+        self.remove = remove or os.remove
+        self.referenced = referenced
+        self.dirty = False
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # stored oldest -> newest
+        for key, entry in data.get('entries', []):
+            self.entries[key] = entry
+            self.total_bytes += int(entry.get('bytes', 0))
+        self._evict()
+
+    def _save(self):
+        tmp = f'{self.index_path}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'entries': list(self.entries.items())}, f, separators=(',', ':'))
+            os.replace(tmp, self.index_path)
+            self.dirty = False
+        except OSError:
+            pass
+
+    def flush(self):
+        """Persist LRU order changes from hits"""
+        with self.lock:
+            if self.dirty:
+                self._save()
+
+    def _files(self, artifact: Dict[str, Any]):
+        return {self.resolve(artifact[k]) for k in ARTIFACT_FILE_KEYS if artifact.get(k)}
+
+    def _evict(self):
+        evicted = []
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= int(entry.get('bytes', 0))
+            self.evictions += 1
+            evicted.append(entry)
+        if not evicted:
+            return
+        # content-addressed files can be shared by entries (e.g. with and without a GLB)
+        live = set()
+        for entry in self.entries.values():
+            live |= self._files(entry['artifact'])
+        if self.referenced is not None:
+            live |= {self.resolve(p) for p in self.referenced()}
+        for entry in evicted:
+            for path in self._files(entry['artifact']) - live:
+                try:
+                    self.remove(path)
+                except OSError:
+                    pass
+
+    def _files_exist(self, entry: Dict[str, Any]) -> bool:
+        return all(os.path.exists(self.resolve(entry[k])) for k in ARTIFACT_FILE_KEYS if entry.get(k))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Artifact entry for a key, or None; a hit refreshes its LRU position"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and not self._files_exist(entry['artifact']):
+                # artifact was removed from disk; forget it
+                self.entries.pop(key)
+                self.total_bytes -= int(entry.get('bytes', 0))
+                self.dirty = True
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            entry['last_used'] = time.time()
+            entry['hits'] = int(entry.get('hits', 0)) + 1
+            self.dirty = True
+            return dict(entry['artifact'])
+
+    def put(self, key: str, artifact: Dict[str, Any]):
+        size = 0
+        for k in ARTIFACT_FILE_KEYS:
+            if artifact.get(k):
+                try:
+                    size += os.path.getsize(self.resolve(artifact[k]))
+                except OSError:
+                    pass
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= int(old.get('bytes', 0))
+            self.entries[key] = {'artifact': dict(artifact), 'bytes': size, 'last_used': time.time(), 'hits': 0}
+            self.total_bytes += size
+            self._evict()
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
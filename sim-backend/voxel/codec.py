@@ -0,0 +1,123 @@
+"""
+Binary voxel artifact codec (.bvox)
+Compact alternative to the JSON voxel files written for every LOD.
+
+Layout (little endian):
+    header   '<4sBBBBIiiiI'  magic, version, flags, codec, reserved,
+                             voxel count, coordinate bias x/y/z, meta length
+    meta     UTF-8 JSON with every scene key except 'voxels' (res, origin, palette, ...)
+    payload  x[n], y[n], z[n] as uint16 offsets from the bias, then c[n] as uint8,
+             optionally delta coded and zlib/zstd compressed
+"""
+
+from typing import Dict, Any, Optional
+import json
+import struct
+import zlib
+import numpy as np
+
+from .grid import as_voxel_array, voxels_to_dicts
+
+try:
+    import zstandard  # type: ignore
+except ImportError:
+    zstandard = None
+
+BINARY_MAGIC = b'B3DV'
+BINARY_VERSION = 1
+BINARY_EXT = '.bvox'
+BINARY_MEDIA_TYPE = 'application/vnd.brew3d.voxels'
+
+FLAG_DELTA = 0x01
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+_CODECS = {'none': CODEC_NONE, 'zlib': CODEC_ZLIB, 'zstd': CODEC_ZSTD}
+
+_HEADER = struct.Struct('<4sBBBBIiiiI')
+
+
+class VoxelCodecError(ValueError):
+    """Raised for malformed or unsupported .bvox payloads"""
+
+
+def _compress(raw: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZLIB:
+        return zlib.compress(raw, 6)
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return raw
+
+
+def _decompress(payload: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise VoxelCodecError('zstd payload but zstandard is not installed')
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == CODEC_NONE:
+        return payload
+    raise VoxelCodecError(f'unknown codec {codec}')
+
+
+def encode_scene(scene: Dict[str, Any], compression: Optional[str] = 'zlib', delta: bool = True) -> bytes:
+    """Encode a voxel scene ({'res','origin','palette','voxels'}) into .bvox bytes"""
+    codec = _CODECS.get(compression or 'none', CODEC_ZLIB)
+    if codec == CODEC_ZSTD and zstandard is None:
+        codec = CODEC_ZLIB
+    vox = as_voxel_array(scene.get('voxels', []))
+    n = len(vox)
+    bias = vox[:, :3].min(axis=0) if n else np.zeros(3, dtype=np.int32)
+    coords = vox[:, :3] - bias
+    if n and int(coords.max()) > 0xFFFF:
+        raise VoxelCodecError('voxel extent exceeds 65535 cells')
+    axes = coords.astype(np.uint16).T.copy()
+    flags = 0
+    if delta and n:
+        # row order is preserved; deltas wrap mod 2**16 and undo with a uint16 cumsum
+        axes[:, 1:] = np.diff(axes, axis=1)
+        flags |= FLAG_DELTA
+    raw = axes.tobytes() + vox[:, 3].astype(np.uint8).tobytes()
+    meta = json.dumps({k: v for k, v in scene.items() if k != 'voxels'},
+                      separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    header = _HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags, codec, 0, n,
+                          int(bias[0]), int(bias[1]), int(bias[2]), len(meta))
+    return header + meta + _compress(raw, codec)
+
+
+def decode_scene(data: bytes, as_array: bool = False) -> Dict[str, Any]:
+    """
+    Decode .bvox bytes back into a scene dict.
+    Voxels come back as the JSON list of dicts, or an (N,4) int32 array with as_array=True.
+    """
+    if len(data) < _HEADER.size:
+        raise VoxelCodecError('truncated header')
+    magic, version, flags, codec, _, n, bx, by, bz, meta_len = _HEADER.unpack_from(data, 0)
+    if magic != BINARY_MAGIC:
+        raise VoxelCodecError('not a .bvox payload')
+    if version != BINARY_VERSION:
+        raise VoxelCodecError(f'unsupported .bvox version {version}')
+    start = _HEADER.size
+    try:
+        scene = json.loads(data[start:start + meta_len].decode('utf-8'))
+    except Exception as e:
+        raise VoxelCodecError(f'bad metadata: {e}')
+    raw = _decompress(data[start + meta_len:], codec)
+    if len(raw) != n * 7:
+        raise VoxelCodecError('payload size does not match voxel count')
+    axes = np.frombuffer(raw, dtype=np.uint16, count=3 * n).reshape(3, n)
+    if flags & FLAG_DELTA:
+        axes = np.cumsum(axes, axis=1, dtype=np.uint16)
+    vox = np.empty((n, 4), dtype=np.int32)
+    vox[:, :3] = axes.T
+    vox[:, :3] += np.array([bx, by, bz], dtype=np.int32)
+    vox[:, 3] = np.frombuffer(raw, dtype=np.uint8, offset=6 * n, count=n)
+    scene['voxels'] = vox if as_array else voxels_to_dicts(vox)
+    return scene
+
+
+def read_scene(path: str, as_array: bool = False) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        return decode_scene(f.read(), as_array=as_array)
@@ -0,0 +1,116 @@
+"""
+Voxel edit deltas (.vdelta)
+An edit is stored as the cells it removed and the cells it set (added or
+recolored) instead of a full copy of the scene. Cells are written as runs of
+consecutive packed keys, so contiguous strokes and fills cost a few bytes.
+
+Layout (little endian):
+    header   '<4sBBHIIII'  magic, version, codec, reserved,
+                           removed cells, removed runs, set cells, set runs
+    payload  removed run starts int64[], lengths uint32[],
+             set run starts int64[], lengths uint32[], set colors uint8[],
+             zlib compressed
+"""
+
+from typing import Tuple
+import hashlib
+import struct
+import zlib
+import numpy as np
+
+from .grid import pack_keys, unpack_keys
+
+DELTA_MAGIC = b'B3DD'
+DELTA_VERSION = 1
+DELTA_EXT = '.vdelta'
+DELTA_MEDIA_TYPE = 'application/vnd.brew3d.voxel-delta'
+# state hash personalization: a state is addressed by its parent state and the delta bytes
+DELTA_PERSON = b'brew3d.delta.1'
+
+_HEADER = struct.Struct('<4sBBHIIII')
+
+
+class VoxelDeltaError(ValueError):
+    """Raised for malformed or unsupported .vdelta payloads"""
+
+
+def _runs(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(starts, lengths) of runs of consecutive values in sorted keys"""
+    if not len(keys):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint32)
+    breaks = np.flatnonzero(np.diff(keys) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    lengths = np.diff(np.append(starts, len(keys)))
+    return keys[starts].astype(np.int64), lengths.astype(np.uint32)
+
+
+def _expand(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    if not len(starts):
+        return np.empty(0, dtype=np.int64)
+    lengths = lengths.astype(np.int64)
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+def encode_delta(removed: np.ndarray, upserts: np.ndarray) -> bytes:
+    """Encode removed (K,>=3) cells and set (L,4) voxels"""
+    removed = np.asarray(removed, dtype=np.int32)
+    rkeys = np.unique(pack_keys(removed)) if len(removed) else np.empty(0, dtype=np.int64)
+    upserts = np.asarray(upserts, dtype=np.int32).reshape(-1, 4)
+    skeys = pack_keys(upserts) if len(upserts) else np.empty(0, dtype=np.int64)
+    order = np.argsort(skeys, kind='stable')
+    skeys = skeys[order]
+    colors = upserts[order, 3].astype(np.uint8) if len(upserts) else np.empty(0, dtype=np.uint8)
+    r_starts, r_lengths = _runs(rkeys)
+    s_starts, s_lengths = _runs(skeys)
+    payload = b''.join([
+        r_starts.astype('<i8').tobytes(), r_lengths.astype('<u4').tobytes(),
+        s_starts.astype('<i8').tobytes(), s_lengths.astype('<u4').tobytes(),
+        colors.tobytes(),
+    ])
+    header = _HEADER.pack(DELTA_MAGIC, DELTA_VERSION, 1, 0, len(rkeys), len(r_starts), len(skeys), len(s_starts))
+    return header + zlib.compress(payload, 6)
+
+
+def decode_delta(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """(removed (K,3) int32, set (L,4) int32) from .vdelta bytes"""
+    if len(data) < _HEADER.size:
+        raise VoxelDeltaError('truncated delta header')
+    magic, version, codec, _, n_removed, r_runs, n_set, s_runs = _HEADER.unpack_from(data)
+    if magic != DELTA_MAGIC:
+        raise VoxelDeltaError('not a voxel delta')
+    if version != DELTA_VERSION or codec != 1:
+        raise VoxelDeltaError(f'unsupported delta version {version} / codec {codec}')
+    try:
+        raw = zlib.decompress(data[_HEADER.size:])
+    except zlib.error as e:
+        raise VoxelDeltaError(f'corrupt delta payload: {e}') from e
+    sizes = [8 * r_runs, 4 * r_runs, 8 * s_runs, 4 * s_runs, n_set]
+    if len(raw) != sum(sizes):
+        raise VoxelDeltaError('delta payload size mismatch')
+    parts, pos = [], 0
+    for size, dtype in zip(sizes, ('<i8', '<u4', '<i8', '<u4', 'u1')):
+        parts.append(np.frombuffer(raw, dtype=dtype, count=size // np.dtype(dtype).itemsize, offset=pos))
+        pos += size
+    rkeys = _expand(parts[0], parts[1])
+    skeys = _expand(parts[2], parts[3])
+    if len(rkeys) != n_removed or len(skeys) != n_set:
+        raise VoxelDeltaError('delta run lengths do not match the header')
+    upserts = np.empty((n_set, 4), dtype=np.int32)
+    upserts[:, :3] = unpack_keys(skeys)
+    upserts[:, 3] = parts[4]
+    return unpack_keys(rkeys), upserts
+
+
+def delta_hash(parent: str, data: bytes) -> str:
+    """Hex address of the state reached by applying delta bytes to the parent state"""
+    h = hashlib.blake2b(digest_size=32, person=DELTA_PERSON)
+    h.update(parent.encode('utf-8'))
+    h.update(data)
+    return h.hexdigest()
+
+
+def apply_delta(store, removed: np.ndarray, upserts: np.ndarray):
+    """Replay a decoded delta onto a BrickStore"""
+    store.remove_many(removed)
+    store.set_many(upserts, overwrite=True)
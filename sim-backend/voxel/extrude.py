@@ -0,0 +1,90 @@
+"""
+Bulk part reshaping
+Array operators behind "make the tail longer" style edits. Both work on an
+(N,4) voxel array holding one part (typically a brick-store query of the
+part's bbox) and build their output for all steps/layers in a few NumPy
+passes instead of re-adding voxels one by one.
+"""
+
+from typing import Optional
+import numpy as np
+
+from .grid import pack_keys, as_voxel_array
+
+_OTHER_AXES = {0: (1, 2), 1: (2, 0), 2: (0, 1)}
+
+
+def _first_unique(vox: np.ndarray) -> np.ndarray:
+    if not len(vox):
+        return vox
+    _, first = np.unique(pack_keys(vox), return_index=True)
+    return vox[np.sort(first)]
+
+
+def clip_to_grid(vox: np.ndarray, res: Optional[int]) -> np.ndarray:
+    """Drop voxels outside [0, res) on any axis (no-op when res is None)"""
+    if res is None or not len(vox):
+        return vox
+    return vox[np.all((vox[:, :3] >= 0) & (vox[:, :3] < res), axis=1)]
+
+
+def extrude(part: np.ndarray, axis: int, direction: int, steps: int, taper: float = 0.0,
+            res: Optional[int] = None) -> np.ndarray:
+    """
+    New voxels continuing a part past its outermost layer along axis.
+    The outer cross-section is repeated `steps` times; with taper > 0 it
+    shrinks linearly toward its centroid, reaching (1 - taper) of its size
+    at the last step. Colors carry over from the cross-section. With res,
+    only the layers that still fit in [0, res) along axis are built.
+    """
+    part = as_voxel_array(part)
+    if not len(part) or steps <= 0:
+        return np.empty((0, 4), dtype=np.int32)
+    direction = 1 if direction >= 0 else -1
+    ua, va = _OTHER_AXES[axis]
+    edge = int(part[:, axis].max() if direction > 0 else part[:, axis].min())
+    cap = part[part[:, axis] == edge]
+    n = steps if res is None else min(steps, res - 1 - edge if direction > 0 else edge)
+    if n <= 0:
+        return np.empty((0, 4), dtype=np.int32)
+    # the taper profile stays that of the full `steps`, cut off at the grid edge
+    s = np.arange(1, n + 1)
+    k = 1.0 - min(max(float(taper), 0.0), 1.0) * s / steps
+    uv = cap[:, [ua, va]].astype(np.float64)
+    center = uv.mean(axis=0)
+    # (n, cap, 2): every layer's cross-section in one broadcast
+    layers = np.rint(center + (uv - center)[None] * k[:, None, None]).astype(np.int32)
+    out = np.empty((n, len(cap), 4), dtype=np.int32)
+    out[:, :, axis] = (edge + direction * s)[:, None]
+    out[:, :, ua] = layers[:, :, 0]
+    out[:, :, va] = layers[:, :, 1]
+    out[:, :, 3] = cap[:, 3]
+    return _first_unique(out.reshape(-1, 4))
+
+
+def stretch(part: np.ndarray, axis: int, direction: int, factor: float, res: Optional[int] = None) -> np.ndarray:
+    """
+    A part scaled by `factor` along axis, anchored at its inner end (the end
+    opposite `direction`). Each source layer maps to the run of target layers
+    it covers, so stretching leaves no gaps and shrinking merges layers.
+    With res, factor is capped so the result ends inside [0, res) along axis.
+    """
+    part = as_voxel_array(part)
+    if not len(part) or not factor > 0:
+        return np.empty((0, 4), dtype=np.int32)
+    direction = 1 if direction >= 0 else -1
+    anchor = int(part[:, axis].min() if direction > 0 else part[:, axis].max())
+    if res is not None:
+        length = int(part[:, axis].max() - part[:, axis].min()) + 1
+        room = res - anchor if direction > 0 else anchor + 1
+        factor = min(factor, max(room, 1) / length)
+    offset = (part[:, axis].astype(np.int64) - anchor) * direction
+    lo = np.floor(offset * factor).astype(np.int64)
+    hi = np.maximum(lo + 1, np.floor((offset + 1) * factor).astype(np.int64))
+    counts = hi - lo
+    src = np.repeat(np.arange(len(part)), counts)
+    # position of each output row within its source's run
+    within = np.arange(len(src)) - np.repeat(np.cumsum(counts) - counts, counts)
+    out = part[src].copy()
+    out[:, axis] = anchor + direction * (lo[src] + within)
+    return _first_unique(out)
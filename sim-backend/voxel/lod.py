@@ -0,0 +1,69 @@
+"""
+LOD pyramid helpers
+Lower LODs are derived from the top-resolution scene by downsampling
+instead of being regenerated part by part.
+"""
+
+from typing import Dict, List
+import numpy as np
+
+from .grid import pack_keys, unpack_keys, as_voxel_array
+
+DOWNSAMPLE_MODES = ('majority', 'first')
+
+
+def downsample(vox, src_res: int, dst_res: int, mode: str = 'majority') -> np.ndarray:
+    """
+    Map an (N,4) voxel array from a src_res grid onto a dst_res grid.
+    'majority' keeps the most common color per target cell (ties go to the lower
+    palette index) and returns cells in x, y, z order; 'first' keeps the color
+    of the first source voxel and first-seen order.
+    """
+    if mode not in DOWNSAMPLE_MODES:
+        raise ValueError(f'unknown downsample mode: {mode}')
+    vox = as_voxel_array(vox)
+    if dst_res >= src_res or not len(vox):
+        return vox.copy()
+    xyz = (vox[:, :3].astype(np.int64) * dst_res) // src_res
+    keys = pack_keys(xyz)
+    colors = vox[:, 3]
+
+    if mode == 'first':
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        out = np.empty((len(first), 4), dtype=np.int32)
+        out[:, :3] = xyz[first]
+        out[:, 3] = colors[first]
+        return out
+
+    # runs of identical (cell, color) after sorting by cell then color
+    order = np.lexsort((colors, keys))
+    k = keys[order]
+    c = colors[order]
+    starts = np.flatnonzero(np.r_[True, (k[1:] != k[:-1]) | (c[1:] != c[:-1])])
+    counts = np.diff(np.r_[starts, len(k)])
+    run_keys = k[starts]
+    run_colors = c[starts]
+    # per cell: highest count first, then lowest color
+    pick = np.lexsort((run_colors, -counts, run_keys))
+    picked = run_keys[pick]
+    winners = pick[np.flatnonzero(np.r_[True, picked[1:] != picked[:-1]])]
+    out = np.empty((len(winners), 4), dtype=np.int32)
+    out[:, :3] = unpack_keys(run_keys[winners])
+    out[:, 3] = run_colors[winners]
+    return out
+
+
+def build_pyramid(vox, lods: List[int], mode: str = 'majority') -> Dict[int, np.ndarray]:
+    """
+    Derive every LOD from the voxels of the largest one.
+    Each level is downsampled from the next finer level, so the cost is
+    dominated by the top LOD.
+    """
+    levels = sorted(set(int(l) for l in lods), reverse=True)
+    if not levels:
+        return {}
+    out = {levels[0]: as_voxel_array(vox)}
+    for finer, coarser in zip(levels, levels[1:]):
+        out[coarser] = downsample(out[finer], finer, coarser, mode=mode)
+    return out
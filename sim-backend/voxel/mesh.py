@@ -0,0 +1,208 @@
+"""
+Greedy voxel meshing and GLB export
+Exposed faces are found with packed-key lookups, then merged into quads in
+two sorted passes per face direction: consecutive faces along one axis
+become runs, and identical runs on consecutive rows become rectangles. The
+result is written as a single binary glTF with one primitive per palette
+color, sharing one vertex buffer.
+"""
+
+from typing import Dict, Any, List, Tuple
+import json
+import struct
+import time
+import numpy as np
+
+from .grid import pack_keys, as_voxel_array
+
+# (normal axis, sign) for the six face directions; (u, v, axis) stays right-handed
+FACE_DIRS = [(axis, sign) for axis in range(3) for sign in (1, -1)]
+_UV_AXES = {0: (1, 2), 1: (2, 0), 2: (0, 1)}
+
+GLB_MAGIC = 0x46546C67  # 'glTF'
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+_FLOAT, _UINT16, _UINT32 = 5126, 5123, 5125
+_ARRAY_BUFFER, _ELEMENT_ARRAY_BUFFER = 34962, 34963
+
+
+def _runs(keys: np.ndarray, step: np.ndarray) -> np.ndarray:
+    """Start flags of runs in sorted rows: a new run wherever the group key changes or step breaks"""
+    start = np.ones(len(step), dtype=bool)
+    if len(step) > 1:
+        start[1:] = np.any(keys[1:] != keys[:-1], axis=1) | (step[1:] != step[:-1] + 1)
+    return start
+
+
+def exposed_faces(vox: Any) -> List[Tuple[int, int, np.ndarray]]:
+    """(axis, sign, (M,4) voxels whose face in that direction borders empty space) per direction"""
+    vox = as_voxel_array(vox)
+    keys = np.sort(pack_keys(vox))
+    out = []
+    for axis, sign in FACE_DIRS:
+        if not len(vox):
+            out.append((axis, sign, vox))
+            continue
+        nb = vox[:, :3].copy()
+        nb[:, axis] += sign
+        nkeys = pack_keys(nb)
+        pos = np.minimum(np.searchsorted(keys, nkeys), len(keys) - 1)
+        out.append((axis, sign, vox[keys[pos] != nkeys]))
+    return out
+
+
+def greedy_quads(vox: Any, faces: List[Tuple[int, int, np.ndarray]] = None) -> np.ndarray:
+    """
+    Merge coplanar same-color faces into rectangles (faces: exposed_faces(vox)
+    when already computed). Returns an (Q,8) int32 array of
+    (axis, sign, plane, u0, u1, v0, v1, color); u1/v1 are exclusive and plane
+    is the face's coordinate along axis.
+    """
+    quads = []
+    for axis, sign, faces in (faces if faces is not None else exposed_faces(vox)):
+        if not len(faces):
+            continue
+        ua, va = _UV_AXES[axis]
+        plane = faces[:, axis] + (1 if sign > 0 else 0)
+        u, v, c = faces[:, ua], faces[:, va], faces[:, 3]
+        # pass 1: runs along u within each (plane, color, v) row
+        order = np.lexsort((u, v, c, plane))
+        group = np.stack([plane[order], c[order], v[order]], axis=1)
+        us = u[order]
+        start = _runs(group, us)
+        idx = np.flatnonzero(start)
+        ends = np.append(idx[1:], len(us)) - 1
+        runs = np.stack([group[idx, 0], group[idx, 1], group[idx, 2], us[idx], us[ends] + 1], axis=1)
+        # pass 2: stack identical runs (same plane, color, u span) on consecutive rows
+        order = np.lexsort((runs[:, 2], runs[:, 4], runs[:, 3], runs[:, 1], runs[:, 0]))
+        runs = runs[order]
+        group = runs[:, [0, 1, 3, 4]]
+        vs = runs[:, 2]
+        start = _runs(group, vs)
+        idx = np.flatnonzero(start)
+        ends = np.append(idx[1:], len(vs)) - 1
+        q = np.empty((len(idx), 8), dtype=np.int32)
+        q[:, 0] = axis
+        q[:, 1] = sign
+        q[:, 2] = group[idx, 0]
+        q[:, 3] = group[idx, 2]
+        q[:, 4] = group[idx, 3]
+        q[:, 5] = vs[idx]
+        q[:, 6] = vs[ends] + 1
+        q[:, 7] = group[idx, 1]
+        quads.append(q)
+    if not quads:
+        return np.empty((0, 8), dtype=np.int32)
+    return np.concatenate(quads)
+
+
+def quad_geometry(quads: np.ndarray, scale: float = 1.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(positions (4Q,3) float32, normals (4Q,3) float32, triangle indices (Q,6) uint32)"""
+    n = len(quads)
+    positions = np.empty((n, 4, 3), dtype=np.float32)
+    normals = np.zeros((n, 4, 3), dtype=np.float32)
+    for axis in range(3):
+        sel = quads[:, 0] == axis
+        if not sel.any():
+            continue
+        q = quads[sel]
+        ua, va = _UV_AXES[axis]
+        corners = np.empty((len(q), 4, 3), dtype=np.float32)
+        corners[:, :, axis] = q[:, 2, None]
+        # counter-clockwise seen from +axis
+        corners[:, :, ua] = np.stack([q[:, 3], q[:, 4], q[:, 4], q[:, 3]], axis=1)
+        corners[:, :, va] = np.stack([q[:, 5], q[:, 5], q[:, 6], q[:, 6]], axis=1)
+        positions[sel] = corners
+        normals[sel, :, axis] = q[:, 1, None]
+    base = (np.arange(n, dtype=np.uint32) * 4)[:, None]
+    front = np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)
+    back = np.array([0, 2, 1, 0, 3, 2], dtype=np.uint32)
+    indices = base + np.where((quads[:, 1] > 0)[:, None], front, back)
+    if scale != 1.0:
+        positions *= scale
+    return positions.reshape(-1, 3), normals.reshape(-1, 3), indices.astype(np.uint32)
+
+
+def _linear_rgb(hex_color: str) -> List[float]:
+    h = hex_color.lstrip('#')
+    if len(h) == 3:
+        h = ''.join(ch * 2 for ch in h)
+    try:
+        srgb = [int(h[i:i + 2], 16) / 255.0 for i in (0, 2, 4)]
+    except ValueError:
+        srgb = [0.5, 0.5, 0.5]
+    # glTF baseColorFactor is linear
+    return [round(c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4, 6) for c in srgb]
+
+
+def _pad(data: bytes, fill: bytes) -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+def encode_glb(vox: Any, palette: List[str], scale: float = 1.0) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Greedy-meshed GLB of a voxel array. Returns (glb bytes, stats) where
+    stats counts exposed faces, merged quads and triangles.
+    """
+    t0 = time.perf_counter()
+    vox = as_voxel_array(vox)
+    faces = exposed_faces(vox)
+    quads = greedy_quads(vox, faces)
+    # group by color so each material's triangles are one contiguous index range
+    quads = quads[np.argsort(quads[:, 7], kind='stable')]
+    positions, normals, indices = quad_geometry(quads, scale)
+    small = len(positions) <= 0xFFFF
+    index_bytes = indices.astype(np.uint16 if small else np.uint32).tobytes()
+    index_size = 2 if small else 4
+
+    pos_bytes = positions.tobytes()
+    norm_bytes = normals.tobytes()
+    blob = pos_bytes + norm_bytes + _pad(index_bytes, b'\0')
+    buffer_views = [
+        {'buffer': 0, 'byteOffset': 0, 'byteLength': len(pos_bytes), 'target': _ARRAY_BUFFER},
+        {'buffer': 0, 'byteOffset': len(pos_bytes), 'byteLength': len(norm_bytes), 'target': _ARRAY_BUFFER},
+        {'buffer': 0, 'byteOffset': len(pos_bytes) + len(norm_bytes), 'byteLength': len(index_bytes),
+         'target': _ELEMENT_ARRAY_BUFFER},
+    ]
+    accessors: List[Dict[str, Any]] = []
+    primitives: List[Dict[str, Any]] = []
+    materials: List[Dict[str, Any]] = []
+    if len(positions):
+        accessors.append({'bufferView': 0, 'componentType': _FLOAT, 'count': len(positions), 'type': 'VEC3',
+                          'min': positions.min(axis=0).tolist(), 'max': positions.max(axis=0).tolist()})
+        accessors.append({'bufferView': 1, 'componentType': _FLOAT, 'count': len(normals), 'type': 'VEC3'})
+        colors, starts, counts = np.unique(quads[:, 7], return_index=True, return_counts=True)
+        for color, start, count in zip(colors.tolist(), starts.tolist(), counts.tolist()):
+            hex_color = palette[color] if 0 <= color < len(palette) else '#808080'
+            materials.append({'name': f'palette_{color}', 'pbrMetallicRoughness': {
+                'baseColorFactor': _linear_rgb(hex_color) + [1.0], 'metallicFactor': 0.0, 'roughnessFactor': 1.0}})
+            accessors.append({'bufferView': 2, 'byteOffset': start * 6 * index_size,
+                              'componentType': _UINT16 if small else _UINT32, 'count': count * 6, 'type': 'SCALAR'})
+            primitives.append({'attributes': {'POSITION': 0, 'NORMAL': 1}, 'indices': len(accessors) - 1,
+                               'material': len(materials) - 1})
+    gltf: Dict[str, Any] = {
+        'asset': {'version': '2.0', 'generator': 'brew3d greedy mesher'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}] if primitives else [{}],
+    }
+    chunks = []
+    if primitives:
+        # an empty scene has no buffers at all (glTF forbids zero-length ones)
+        gltf.update({'buffers': [{'byteLength': len(blob)}], 'bufferViews': buffer_views, 'accessors': accessors,
+                     'meshes': [{'name': 'voxels', 'primitives': primitives}], 'materials': materials})
+        chunks.append(struct.pack('<II', len(blob), _CHUNK_BIN) + blob)
+    json_chunk = _pad(json.dumps(gltf, separators=(',', ':')).encode('utf-8'), b' ')
+    chunks.insert(0, struct.pack('<II', len(json_chunk), _CHUNK_JSON) + json_chunk)
+    total = 12 + sum(len(c) for c in chunks)
+    glb = struct.pack('<III', GLB_MAGIC, 2, total) + b''.join(chunks)
+    stats = {
+        'voxels': int(len(vox)),
+        'quads': int(len(quads)),
+        'triangles': int(len(quads) * 2),
+        # one quad (two triangles) per exposed face without merging
+        'naive_triangles': int(sum(len(f) for _, _, f in faces) * 2),
+        'bytes': len(glb),
+        'mesh_ms': round((time.perf_counter() - t0) * 1000, 2),
+    }
+    return glb, stats
@@ -0,0 +1,93 @@
+"""
+Job plans
+Splits a generation prompt into staged LODs and per-part bounding boxes.
+Kept free of server state so benchmarks and worker processes can build
+plans without importing app.py.
+"""
+
+from typing import Dict, Any
+import math
+
+# 'pyramid': generate the top LOD once and downsample; 'regenerate': build every LOD from scratch
+LOD_MODES = ('pyramid', 'regenerate')
+
+
+def supervisor_plan(prompt: Dict[str, Any]) -> Dict[str, Any]:
+    subject = prompt.get('subject', 'object')
+    mode = prompt.get('mode', 'voxel')
+    target_res = int(prompt.get('resolution', 64))
+    # staged LODs up to 2048; filter by requested target
+    cap_target = min(2048, max(32, target_res))
+    staged = [32, 64, 96, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048]
+    lods = [r for r in staged if r <= cap_target]
+    if not lods:
+        lods = [64]
+    res = lods[-1]
+    style = prompt.get('style', '')
+    pose = prompt.get('pose', '')
+    seed = int(prompt.get('seed', 12345))
+    quality = prompt.get('quality', 'high')
+    lod_mode = prompt.get('lod_mode', 'pyramid')
+    lod_downsample = prompt.get('lod_downsample', 'majority')
+    # simple template-driven decomposition for dragon
+    parts = [
+        {'id': 'head'}, {'id': 'neck'}, {'id': 'body'},
+        {'id': 'left_wing'}, {'id': 'right_wing'},
+        {'id': 'tail'}, {'id': 'left_leg'}, {'id': 'right_leg'},
+        {'id': 'horns'}, {'id': 'spikes'}
+    ] if 'dragon' in subject.lower() else [ {'id': 'body'} ]
+
+    # allocate bounding boxes within res^3 (coarse layout)
+    # coordinates are inclusive min,max in grid space [0,res)
+    def bbox(x0,y0,z0,x1,y1,z1):
+        return {'min':[x0,y0,z0],'max':[x1,y1,z1]}
+
+    if 'dragon' in subject.lower():
+        r = res
+        layout = {
+            # Broader Y coverage to avoid flat mid-slice look
+            'body': bbox(int(0.25*r), int(0.2*r), int(0.25*r), int(0.75*r), int(0.8*r), int(0.75*r)),
+            'head': bbox(int(0.72*r), int(0.6*r), int(0.42*r), int(0.92*r), int(0.92*r), int(0.58*r)),
+            'neck': bbox(int(0.62*r), int(0.5*r), int(0.42*r), int(0.72*r), int(0.75*r), int(0.58*r)),
+            'left_wing': bbox(int(0.05*r), int(0.45*r), int(0.15*r), int(0.35*r), int(0.75*r), int(0.85*r)),
+            'right_wing': bbox(int(0.65*r), int(0.45*r), int(0.15*r), int(0.95*r), int(0.75*r), int(0.85*r)),
+            'tail': bbox(int(0.02*r), int(0.25*r), int(0.45*r), int(0.28*r), int(0.55*r), int(0.55*r)),
+            'left_leg': bbox(int(0.38*r), int(0.02*r), int(0.45*r), int(0.46*r), int(0.28*r), int(0.55*r)),
+            'right_leg': bbox(int(0.54*r), int(0.02*r), int(0.45*r), int(0.62*r), int(0.28*r), int(0.55*r)),
+            'horns': bbox(int(0.78*r), int(0.85*r), int(0.46*r), int(0.92*r), int(0.98*r), int(0.54*r)),
+            'spikes': bbox(int(0.28*r), int(0.72*r), int(0.48*r), int(0.72*r), int(0.86*r), int(0.52*r)),
+        }
+    else:
+        layout = {'body': {'min':[0,0,0],'max':[res-1,res-1,res-1]}}
+
+    return {
+        'mode': mode,
+        'target_resolution': target_res,
+        'resolution': res,
+        'lods': lods,
+        'lod_mode': lod_mode,
+        'lod_downsample': lod_downsample,
+        'subject': subject,
+        'style': style,
+        'pose': pose,
+        'seed': seed,
+        'quality': quality,
+        'parts': [{ 'id': p['id'], 'bbox': layout[p['id']] } for p in parts if p['id'] in layout]
+    }
+
+
+def scale_bbox(bbox: Dict[str, Any], src_res: int, dst_res: int) -> Dict[str, Any]:
+    """Inclusive bbox of a src_res grid as the cells it covers in a dst_res grid"""
+    f = dst_res / float(src_res)
+    mn = [min(dst_res - 1, int(math.floor(v * f))) for v in bbox['min']]
+    mx = [min(dst_res - 1, int(math.ceil((v + 1) * f)) - 1) for v in bbox['max']]
+    return {'min': mn, 'max': [max(a, b) for a, b in zip(mn, mx)]}
+
+
+def plan_at_lod(plan: Dict[str, Any], lod: int) -> Dict[str, Any]:
+    """The plan with its resolution set to lod and part bboxes moved into the lod grid"""
+    src = int(plan['resolution'])
+    stage_plan = dict(plan, resolution=lod)
+    if lod != src:
+        stage_plan['parts'] = [dict(p, bbox=scale_bbox(p['bbox'], src, lod)) for p in plan.get('parts', [])]
+    return stage_plan
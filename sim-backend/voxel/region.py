@@ -0,0 +1,88 @@
+"""
+Edit regions
+Shapes that region edits (paint, erase, fill) operate on. Each region has an
+inclusive integer bounding box, used to pick the bricks it can touch, and a
+vectorized membership test for the cells inside those bricks.
+"""
+
+from typing import Any, Dict, List, Sequence
+import copy
+import math
+import numpy as np
+
+
+class Region:
+    """Inclusive bbox (mn, mx) plus contains((N,3) coords) -> bool mask"""
+
+    mn: List[int]
+    mx: List[int]
+
+    def contains(self, xyz: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def cells(self) -> np.ndarray:
+        """Every cell inside the region as an (N,3) int32 array"""
+        axes = [np.arange(lo, hi + 1, dtype=np.int32) for lo, hi in zip(self.mn, self.mx)]
+        grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+        return grid[self.contains(grid)]
+
+    def clip(self, res: int) -> 'Region':
+        """Copy whose bbox is limited to the grid [0, res) on every axis"""
+        out = copy.copy(self)
+        out.mn = [max(int(v), 0) for v in self.mn]
+        out.mx = [min(int(v), res - 1) for v in self.mx]
+        return out
+
+    @property
+    def volume(self) -> int:
+        """Cells in the bbox (an upper bound on cells())"""
+        return math.prod(max(0, b - a + 1) for a, b in zip(self.mn, self.mx))
+
+
+class Box(Region):
+    def __init__(self, a: Sequence[int], b: Sequence[int]):
+        self.mn = [int(min(p, q)) for p, q in zip(a, b)]
+        self.mx = [int(max(p, q)) for p, q in zip(a, b)]
+
+    def contains(self, xyz: np.ndarray) -> np.ndarray:
+        return np.all((xyz[:, :3] >= self.mn) & (xyz[:, :3] <= self.mx), axis=1)
+
+
+class Sphere(Region):
+    """Euclidean ball: |p - center| <= radius"""
+
+    def __init__(self, center: Sequence[int], radius: float):
+        self.center = np.asarray(center[:3], dtype=np.int64)
+        self.radius = float(radius)
+        r = int(np.floor(self.radius))
+        self.mn = [int(c) - r for c in self.center]
+        self.mx = [int(c) + r for c in self.center]
+
+    def contains(self, xyz: np.ndarray) -> np.ndarray:
+        d = xyz[:, :3].astype(np.int64) - self.center
+        return (d * d).sum(axis=1) <= self.radius * self.radius
+
+
+class Diamond(Region):
+    """Manhattan ball: |dx| + |dy| + |dz| <= radius (what "paint near" has always used)"""
+
+    def __init__(self, center: Sequence[int], radius: int):
+        self.center = np.asarray(center[:3], dtype=np.int64)
+        self.radius = int(radius)
+        self.mn = [int(c) - self.radius for c in self.center]
+        self.mx = [int(c) + self.radius for c in self.center]
+
+    def contains(self, xyz: np.ndarray) -> np.ndarray:
+        return np.abs(xyz[:, :3].astype(np.int64) - self.center).sum(axis=1) <= self.radius
+
+
+def region_from_dict(spec: Dict[str, Any]) -> Region:
+    """{"shape": "box", "min": [..], "max": [..]} or {"shape": "sphere"|"near", "center": [..], "radius": r}"""
+    shape = str(spec.get('shape', 'box')).lower()
+    if shape == 'box':
+        return Box(spec['min'], spec['max'])
+    if shape == 'sphere':
+        return Sphere(spec['center'], spec.get('radius', 2))
+    if shape in ('near', 'diamond'):
+        return Diamond(spec['center'], spec.get('radius', 2))
+    raise ValueError(f'unknown region shape: {shape}')
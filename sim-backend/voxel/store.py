@@ -0,0 +1,367 @@
+"""
+Sparse brick voxel store
+VDB-style layout: the grid is split into fixed-size bricks (8^3 by default)
+keyed by brick coordinate. Only bricks that contain voxels are allocated,
+and fully occupied single-color bricks collapse into one-byte tiles, so
+memory follows the occupied surface rather than the bounding volume.
+"""
+
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+import itertools
+import numpy as np
+
+from .grid import pack_keys, unpack_keys, as_voxel_array, voxels_to_dicts
+from .region import Region
+
+BrickKey = Tuple[int, int, int]
+
+# rough per-entry cost of a dict slot + key tuple, used for memory reporting
+_ENTRY_OVERHEAD = 120
+
+
+class BrickStore:
+    """
+    Sparse voxel grid with O(1) lookup and per-brick iteration.
+    Cells hold palette index + 1; 0 means empty.
+    """
+
+    def __init__(self, brick_size: int = 8, meta: Optional[Dict[str, Any]] = None):
+        if brick_size < 2 or brick_size & (brick_size - 1):
+            raise ValueError('brick_size must be a power of two')
+        self.brick_size = brick_size
+        self.shift = brick_size.bit_length() - 1
+        self.mask = brick_size - 1
+        self.bricks: Dict[BrickKey, np.ndarray] = {}
+        self.tiles: Dict[BrickKey, int] = {}
+        self.count = 0
+        # bricks written since construction/copy/mark_clean -> their cells before the
+        # first write (array, tile color, or None when empty), for diff() and revert()
+        self.dirty: Dict[BrickKey, Any] = {}
+        # scene keys other than voxels (res, origin, palette, ...)
+        self.meta: Dict[str, Any] = dict(meta or {})
+        cells = np.indices((brick_size,) * 3).reshape(3, -1).T
+        self._cells = cells.astype(np.int32)
+
+    # ---- construction ----
+
+    @classmethod
+    def from_array(cls, vox: Any, brick_size: int = 8, meta: Optional[Dict[str, Any]] = None) -> 'BrickStore':
+        store = cls(brick_size=brick_size, meta=meta)
+        store.set_many(vox, overwrite=False)
+        store.compact()
+        store.mark_clean()
+        return store
+
+    @classmethod
+    def from_scene(cls, scene: Dict[str, Any], brick_size: int = 8) -> 'BrickStore':
+        meta = {k: v for k, v in scene.items() if k != 'voxels'}
+        return cls.from_array(scene.get('voxels', []), brick_size=brick_size, meta=meta)
+
+    def copy(self) -> 'BrickStore':
+        other = BrickStore(brick_size=self.brick_size, meta=self.meta)
+        other.bricks = {k: v.copy() for k, v in self.bricks.items()}
+        other.tiles = dict(self.tiles)
+        other.count = self.count
+        return other
+
+    # ---- single voxel access ----
+
+    def _key(self, x: int, y: int, z: int) -> BrickKey:
+        s = self.shift
+        return (x >> s, y >> s, z >> s)
+
+    def _writable(self, key: BrickKey) -> np.ndarray:
+        arr = self.bricks.get(key)
+        if key not in self.dirty:
+            self.dirty[key] = arr.copy() if arr is not None else self.tiles.get(key)
+        if arr is not None:
+            return arr
+        n = self.brick_size
+        tile = self.tiles.pop(key, None)
+        if tile is None:
+            arr = np.zeros((n, n, n), dtype=np.uint8)
+        else:
+            arr = np.full((n, n, n), tile + 1, dtype=np.uint8)
+        self.bricks[key] = arr
+        return arr
+
+    def get(self, x: int, y: int, z: int) -> Optional[int]:
+        """Palette index at a cell, or None when empty"""
+        key = self._key(x, y, z)
+        arr = self.bricks.get(key)
+        if arr is None:
+            return self.tiles.get(key)
+        m = self.mask
+        v = int(arr[x & m, y & m, z & m])
+        return v - 1 if v else None
+
+    def __contains__(self, xyz) -> bool:
+        return self.get(*xyz) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def set(self, x: int, y: int, z: int, c: int):
+        key = self._key(x, y, z)
+        if self.tiles.get(key) == c:
+            return
+        arr = self._writable(key)
+        m = self.mask
+        cell = (x & m, y & m, z & m)
+        if arr[cell] == 0:
+            self.count += 1
+        arr[cell] = (int(c) % 255) + 1
+
+    def remove(self, x: int, y: int, z: int) -> bool:
+        key = self._key(x, y, z)
+        if key not in self.bricks and key not in self.tiles:
+            return False
+        arr = self._writable(key)
+        m = self.mask
+        cell = (x & m, y & m, z & m)
+        if arr[cell] == 0:
+            return False
+        arr[cell] = 0
+        self.count -= 1
+        if not arr.any():
+            del self.bricks[key]
+        return True
+
+    # ---- bulk access ----
+
+    def _group(self, vox: np.ndarray) -> Iterator[Tuple[BrickKey, np.ndarray]]:
+        """Yield (brick key, row indices) for an (N,4) array, one entry per brick"""
+        bkeys = pack_keys(vox[:, :3] >> self.shift)
+        order = np.argsort(bkeys, kind='stable')
+        uniq, starts = np.unique(bkeys[order], return_index=True)
+        bounds = np.append(starts, len(order))
+        coords = unpack_keys(uniq)
+        for i, (bx, by, bz) in enumerate(coords.tolist()):
+            yield (bx, by, bz), order[bounds[i]:bounds[i + 1]]
+
+    def set_many(self, vox: Any, overwrite: bool = True):
+        """
+        Write an (N,4) array of voxels brick by brick.
+        overwrite=False keeps existing cells and the first duplicate (first-writer-wins);
+        overwrite=True lets later rows win.
+        """
+        vox = as_voxel_array(vox)
+        if not len(vox):
+            return
+        keys = pack_keys(vox)
+        if overwrite:
+            # last occurrence of each cell
+            _, last = np.unique(keys[::-1], return_index=True)
+            vox = vox[len(vox) - 1 - last]
+        else:
+            _, first = np.unique(keys, return_index=True)
+            vox = vox[np.sort(first)]
+        local = vox[:, :3] & self.mask
+        vals = (vox[:, 3] % 255 + 1).astype(np.uint8)
+        for key, rows in self._group(vox):
+            if not overwrite and key in self.tiles:
+                continue
+            arr = self._writable(key)
+            lx, ly, lz = local[rows, 0], local[rows, 1], local[rows, 2]
+            prev = arr[lx, ly, lz]
+            if overwrite:
+                self.count += int(np.count_nonzero(prev == 0))
+                arr[lx, ly, lz] = vals[rows]
+            else:
+                free = prev == 0
+                self.count += int(np.count_nonzero(free))
+                arr[lx[free], ly[free], lz[free]] = vals[rows][free]
+
+    def remove_many(self, xyz: Any) -> int:
+        """Clear the cells of an (N,>=3) array; returns how many were occupied"""
+        vox = np.asarray(xyz, dtype=np.int32)
+        if not len(vox):
+            return 0
+        removed = 0
+        local = vox[:, :3] & self.mask
+        for key, rows in self._group(vox):
+            if key not in self.bricks and key not in self.tiles:
+                continue
+            arr = self._writable(key)
+            lx, ly, lz = local[rows, 0], local[rows, 1], local[rows, 2]
+            hit = arr[lx, ly, lz] != 0
+            # duplicate rows hit the same cell; count each cell once
+            removed += len(np.unique(pack_keys(vox[rows][hit])))
+            arr[lx, ly, lz] = 0
+            if not arr.any():
+                del self.bricks[key]
+        self.count -= removed
+        return removed
+
+    def compact(self):
+        """Collapse full single-color bricks into tiles"""
+        for key in list(self.bricks.keys()):
+            arr = self.bricks[key]
+            first = arr.flat[0]
+            if first and (arr == first).all():
+                self.tiles[key] = int(first) - 1
+                del self.bricks[key]
+
+    # ---- region queries ----
+
+    def bricks_in_box(self, mn: List[int], mx: List[int]) -> List[BrickKey]:
+        """Occupied bricks overlapping the inclusive cell box [mn, mx]"""
+        s = self.shift
+        lo = [int(v) >> s for v in mn]
+        hi = [int(v) >> s for v in mx]
+        span = (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1) * (hi[2] - lo[2] + 1)
+        if span <= len(self.bricks) + len(self.tiles):
+            # small region: probe its bricks instead of scanning the model
+            cand = itertools.product(*(range(a, b + 1) for a, b in zip(lo, hi)))
+            return [k for k in cand if k in self.bricks or k in self.tiles]
+        return [k for k in itertools.chain(self.bricks, self.tiles)
+                if lo[0] <= k[0] <= hi[0] and lo[1] <= k[1] <= hi[1] and lo[2] <= k[2] <= hi[2]]
+
+    def query(self, region: Region) -> np.ndarray:
+        """Occupied voxels inside a region as (N,4); reads only the bricks its bbox overlaps"""
+        blocks = []
+        for key in self.bricks_in_box(region.mn, region.mx):
+            vox = self._brick_voxels(key)
+            blocks.append(vox[region.contains(vox)])
+        if not blocks:
+            return np.empty((0, 4), dtype=np.int32)
+        return np.concatenate(blocks)
+
+    def paint(self, region: Region, c: int) -> int:
+        """Recolor occupied cells inside a region; returns the number recolored"""
+        hit = self.query(region)
+        hit[:, 3] = c
+        self.set_many(hit, overwrite=True)
+        return len(hit)
+
+    def erase(self, region: Region) -> int:
+        """Clear every occupied cell inside a region; returns the number removed"""
+        return self.remove_many(self.query(region))
+
+    def fill(self, region: Region, c: int) -> int:
+        """Set every cell inside a region (occupied or not) to c; returns the region's cell count"""
+        cells = region.cells()
+        vox = np.empty((len(cells), 4), dtype=np.int32)
+        vox[:, :3] = cells
+        vox[:, 3] = c
+        self.set_many(vox, overwrite=True)
+        return len(vox)
+
+    # ---- change tracking ----
+
+    def mark_clean(self):
+        self.dirty = {}
+
+    def _full(self, tile: Optional[int]) -> np.ndarray:
+        n = self.brick_size
+        return np.full((n, n, n), 0 if tile is None else tile + 1, dtype=np.uint8)
+
+    def _dense(self, key: BrickKey) -> np.ndarray:
+        """Brick cells (palette index + 1, 0 empty) as an n^3 array"""
+        arr = self.bricks.get(key)
+        return arr if arr is not None else self._full(self.tiles.get(key))
+
+    def _before(self, key: BrickKey) -> np.ndarray:
+        """Brick cells as of the last mark_clean()"""
+        if key not in self.dirty:
+            return self._dense(key)
+        cells = self.dirty[key]
+        return cells if isinstance(cells, np.ndarray) else self._full(cells)
+
+    def diff(self, base: Optional['BrickStore'] = None,
+             keys: Optional[Iterable[BrickKey]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cells changed since the last mark_clean(), or versus base when given,
+        looking only at the given bricks (default: those written since
+        mark_clean). Returns (removed (K,3) int32, set (L,4) int32) where set
+        holds added and recolored voxels.
+        """
+        s = self.shift
+        removed, upserts = [], []
+        for key in sorted(self.dirty if keys is None else keys):
+            now = self._dense(key)
+            was = base._dense(key) if base is not None else self._before(key)
+            changed = now != was
+            if not changed.any():
+                continue
+            origin = np.array(key, dtype=np.int32) << s
+            gone = changed & (now == 0)
+            if gone.any():
+                removed.append(np.argwhere(gone).astype(np.int32) + origin)
+            put = changed & (now != 0)
+            if put.any():
+                idx = np.argwhere(put).astype(np.int32)
+                rows = np.empty((len(idx), 4), dtype=np.int32)
+                rows[:, :3] = idx + origin
+                rows[:, 3] = now[put].astype(np.int32) - 1
+                upserts.append(rows)
+        removed = np.concatenate(removed) if removed else np.empty((0, 3), dtype=np.int32)
+        upserts = np.concatenate(upserts) if upserts else np.empty((0, 4), dtype=np.int32)
+        return removed, upserts
+
+    def revert(self):
+        """Undo every write since the last mark_clean()"""
+        for key, cells in self.dirty.items():
+            self.count -= int(np.count_nonzero(self._dense(key)))
+            self.bricks.pop(key, None)
+            self.tiles.pop(key, None)
+            if isinstance(cells, np.ndarray):
+                self.bricks[key] = cells
+            elif cells is not None:
+                self.tiles[key] = cells
+            self.count += int(np.count_nonzero(self._dense(key)))
+        self.dirty = {}
+
+    # ---- iteration ----
+
+    def _brick_voxels(self, key: BrickKey) -> np.ndarray:
+        s = self.shift
+        c = self.tiles.get(key)
+        if c is not None:
+            out = np.empty((len(self._cells), 4), dtype=np.int32)
+            out[:, :3] = self._cells + (np.array(key, dtype=np.int32) << s)
+            out[:, 3] = c
+            return out
+        arr = self.bricks[key]
+        lx, ly, lz = np.nonzero(arr)
+        out = np.empty((len(lx), 4), dtype=np.int32)
+        bx, by, bz = key
+        out[:, 0] = lx + (bx << s)
+        out[:, 1] = ly + (by << s)
+        out[:, 2] = lz + (bz << s)
+        out[:, 3] = arr[lx, ly, lz].astype(np.int32) - 1
+        return out
+
+    def iter_bricks(self) -> Iterator[Tuple[BrickKey, np.ndarray]]:
+        """Yield (brick key, (N,4) int32 voxels) for every occupied brick"""
+        for key in self.tiles:
+            yield key, self._brick_voxels(key)
+        for key in self.bricks:
+            yield key, self._brick_voxels(key)
+
+    def to_array(self) -> np.ndarray:
+        blocks = [v for _, v in self.iter_bricks()]
+        if not blocks:
+            return np.empty((0, 4), dtype=np.int32)
+        return np.concatenate(blocks)
+
+    def to_scene(self) -> Dict[str, Any]:
+        scene = dict(self.meta)
+        scene['voxels'] = voxels_to_dicts(self.to_array())
+        return scene
+
+    # ---- reporting ----
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.bricks.values()) + \
+            (len(self.bricks) + len(self.tiles)) * _ENTRY_OVERHEAD
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'voxels': self.count,
+            'bricks': len(self.bricks),
+            'tiles': len(self.tiles),
+            'brick_size': self.brick_size,
+            'bytes': self.nbytes,
+        }
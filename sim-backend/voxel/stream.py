@@ -0,0 +1,100 @@
+"""
+Progressive voxel streams
+A running job publishes each part's voxels here as soon as the part is
+rasterized, so viewers can render before the LOD is merged, hashed and
+written. Entries form an append-only log; readers follow it from any
+position and block until new entries arrive or the stream is closed.
+"""
+
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import threading
+import time
+import numpy as np
+
+from .grid import pack_keys, as_voxel_array
+
+# voxels per streamed chunk (one NDJSON line on the wire)
+STREAM_CHUNK_VOXELS = 4096
+
+
+def brick_chunks(vox: Any, brick_size: int = 8, max_voxels: int = STREAM_CHUNK_VOXELS) -> List[np.ndarray]:
+    """Split voxels into chunks of at most max_voxels, ordered brick by brick"""
+    vox = as_voxel_array(vox)
+    if not len(vox):
+        return []
+    shift = brick_size.bit_length() - 1
+    # neighbouring cells land in the same chunk, so each chunk is a compact region
+    order = np.argsort(pack_keys(vox[:, :3] >> shift), kind='stable')
+    vox = vox[order]
+    return [vox[i:i + max_voxels] for i in range(0, len(vox), max_voxels)]
+
+
+class VoxelStream:
+    """
+    Append-only entry log of one job run. Entries are dicts with a 'type'
+    ('voxels', 'lod_ready', ...); their 1-based position is the seq that
+    readers resume from. Tracks time-to-first-voxel from construction.
+    """
+
+    def __init__(self):
+        self.entries: List[Dict[str, Any]] = []
+        self.cond = threading.Condition()
+        self.status: Optional[str] = None
+        self.started = time.perf_counter()
+        self.first_voxel_ms: Optional[float] = None
+
+    @property
+    def closed(self) -> bool:
+        return self.status is not None
+
+    def mark_first_voxel(self) -> Optional[float]:
+        """Record time-to-first-voxel; returns it the first time only"""
+        with self.cond:
+            if self.first_voxel_ms is not None:
+                return None
+            self.first_voxel_ms = round((time.perf_counter() - self.started) * 1000, 2)
+            return self.first_voxel_ms
+
+    def add(self, entry: Dict[str, Any]):
+        with self.cond:
+            self.entries.append(entry)
+            self.cond.notify_all()
+
+    def add_voxels(self, lod: int, part: str, vox: Any) -> Optional[float]:
+        """
+        Append a part's voxels as brick-ordered chunks. Returns the
+        time-to-first-voxel in ms when these are the stream's first voxels.
+        """
+        chunks = brick_chunks(vox)
+        if not chunks:
+            return None
+        with self.cond:
+            self.entries.extend({'type': 'voxels', 'lod': lod, 'part': part, 'voxels': c} for c in chunks)
+            self.cond.notify_all()
+        return self.mark_first_voxel()
+
+    def close(self, status: str):
+        with self.cond:
+            self.status = status
+            self.cond.notify_all()
+
+    def follow(self, since: int = 0, timeout: float = 15.0) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+        """
+        Yield (seq, entry) for every entry after `since`, waiting for new ones
+        until the stream is closed. Yields (seq, None) after `timeout` seconds
+        without news so callers can send a keepalive.
+        """
+        seq = max(0, since)
+        while True:
+            with self.cond:
+                if seq >= len(self.entries) and not self.closed:
+                    self.cond.wait(timeout)
+                batch = self.entries[seq:]
+                closed = self.closed
+            if not batch and not closed:
+                yield seq, None
+            for entry in batch:
+                seq += 1
+                yield seq, entry
+            if closed:
+                return
@@ -0,0 +1,81 @@
+"""
+Process-pool part rasterization
+The procedural fill is CPU bound, so threads serialize on the GIL between
+NumPy calls. Workers here rasterize in child processes and hand voxels back
+through a shared-memory block: only (block name, voxel count) crosses the
+pipe, and the parent copies the block once instead of unpickling an array.
+"""
+
+from typing import Dict, Any, Optional, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context, get_all_start_methods, resource_tracker, shared_memory
+import threading
+import numpy as np
+
+from .raster import rasterize_part, MAX_PART_VOXELS, EMPTY
+
+
+def _rasterize_to_shm(part: Dict[str, Any], plan: Dict[str, Any], cap: int) -> Tuple[Optional[str], int]:
+    """Worker side: rasterize and publish the (N,4) int32 result as a shared-memory block"""
+    vox = rasterize_part(part, plan, cap=cap)
+    if not len(vox):
+        return None, 0
+    shm = shared_memory.SharedMemory(create=True, size=vox.nbytes)
+    np.ndarray(vox.shape, dtype=np.int32, buffer=shm.buf)[:] = vox
+    shm.close()
+    return shm.name, len(vox)
+
+
+def _take_shm(name: Optional[str], n: int) -> np.ndarray:
+    """Parent side: copy a published block out and release it"""
+    if name is None:
+        return EMPTY.copy()
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray((n, 4), dtype=np.int32, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class ProcessRasterizer:
+    """
+    rasterize_part on a lazily started process pool.
+    submit() returns a Future resolving to the part's (N,4) int32 array,
+    so callers can mix it with thread-pool futures in as_completed.
+    """
+
+    def __init__(self, workers: int, start_method: Optional[str] = None):
+        self.workers = workers
+        # forkserver avoids forking the threaded server process itself
+        methods = get_all_start_methods()
+        self.start_method = start_method or ('forkserver' if 'forkserver' in methods else 'spawn')
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # children share the parent's tracker, so unlinking here unregisters their blocks
+                resource_tracker.ensure_running()
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context(self.start_method))
+            return self._pool
+
+    def submit(self, part: Dict[str, Any], plan: Dict[str, Any], cap: int = MAX_PART_VOXELS) -> Future:
+        out: Future = Future()
+        inner = self._get_pool().submit(_rasterize_to_shm, part, plan, cap)
+
+        def _done(f: Future):
+            try:
+                out.set_result(_take_shm(*f.result()))
+            except BaseException as e:
+                out.set_exception(e)
+
+        inner.add_done_callback(_done)
+        return out
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
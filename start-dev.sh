@@ -111,7 +111,7 @@ trap cleanup SIGINT SIGTERM
 print_status "Starting Flask backend (sim-backend) on :5069..."
 cd sim-backend
 source venv/bin/activate
-python app.py &
+python server.py &
 BACKEND_PID=$!
 cd ..
 